@@ -0,0 +1,271 @@
+"""
+Latency and throughput of the API hot paths, measured in-process.
+
+Seeds a throwaway SQLite database through models.py, drives the app over
+httpx's ASGI transport (no sockets, no server) and prints a JSON report with
+p50/p95/p99 latency and throughput per scenario. With --baseline, the report
+is compared against an earlier one and the exit status is 1 on a regression.
+
+    python benchmarks/bench.py --output results.json
+    python benchmarks/bench.py --baseline results.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+## the same password for every seeded user, hashed once
+PASSWORD = "benchmark-password"
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=10, help="seeded users, each one a concurrent client")
+    parser.add_argument("--projects", type=int, default=10, help="seeded projects per user")
+    parser.add_argument("--tasks", type=int, default=100, help="seeded tasks per project")
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--logins", type=int, default=20, help="requests of the login scenario (password hashing is slow)")
+    parser.add_argument("--concurrency", type=int, default=10, help="requests in flight at once")
+    parser.add_argument("--async-routers", action="store_true", help="serve the app with the async routers")
+    parser.add_argument("--database", help="new SQLite file to seed and keep (default: a temporary one)")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed p95 slowdown against the baseline")
+    return parser.parse_args(argv)
+
+
+def configure_environment(args: argparse.Namespace, workdir: str) -> None:
+    """Point the app at the benchmark database, must run before the app is imported"""
+    ## relative to where the benchmark was started, before the chdir below
+    database = os.path.abspath(args.database) if args.database else os.path.join(workdir, "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{database}"
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    os.environ["ASYNC_ROUTERS"] = "true" if args.async_routers else "false"
+    ## every simulated client shares one address
+    os.environ["RATE_LIMIT_ENABLED"] = "false"
+    ## main.py logs to ./app.log
+    os.chdir(workdir)
+    sys.path.insert(0, str(REPO_ROOT))
+
+
+def seed(args: argparse.Namespace) -> Dict[str, List[int]]:
+    """Users, projects and tasks inserted in bulk, returns the project ids of every user by email"""
+    from sqlalchemy import insert
+
+    from database import SessionLocal, engine, init_db
+    from hashing import hash_password
+    from models import Project, Task, User, project_user
+    from ranking import rank_unranked_tasks
+
+    init_db()
+    salt = os.urandom(32).hex()
+    password_hash = hash_password(PASSWORD, salt)
+    statuses = ["pending", "in_progress", "completed", "failed", "stashed"]
+
+    with SessionLocal() as db:
+        emails = [f"user{i}@bench.local" for i in range(args.users)]
+        user_ids = db.scalars(insert(User).returning(User.id), [
+            {"name": email.split("@")[0], "email": email, "password_hash": password_hash, "password_salt": salt}
+            for email in emails
+        ]).all()
+        projects_of = {}
+        for email, user_id in zip(emails, sorted(user_ids)):
+            project_ids = db.scalars(insert(Project).returning(Project.id), [
+                {"name": f"project {user_id}-{i}", "description": "benchmark"} for i in range(args.projects)
+            ]).all()
+            projects_of[email] = list(project_ids)
+            db.execute(insert(project_user), [{"project_id": pid, "user_id": user_id} for pid in project_ids])
+            if args.tasks:
+                db.execute(insert(Task), [
+                    {"title": f"task {i}", "description": "seeded", "status": statuses[i % len(statuses)], "project_id": pid}
+                    for pid in project_ids for i in range(args.tasks)
+                ])
+        db.commit()
+    rank_unranked_tasks(engine)
+    return projects_of
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> dict:
+    values = sorted(latencies)
+    milliseconds = lambda seconds: round(seconds * 1000, 3)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "p50_ms": milliseconds(percentile(values, 0.50)),
+        "p95_ms": milliseconds(percentile(values, 0.95)),
+        "p99_ms": milliseconds(percentile(values, 0.99)),
+        "mean_ms": milliseconds(sum(values) / len(values)) if values else 0.0,
+        "max_ms": milliseconds(values[-1]) if values else 0.0,
+        "throughput_rps": round(len(values) / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+
+
+async def run_scenario(calls: List[Callable[[], Awaitable]], concurrency: int) -> dict:
+    """Run the calls with at most `concurrency` in flight; a call returns a response, anything but 2xx is an error"""
+    latencies: List[float] = []
+    errors = 0
+    queue = iter(calls)
+
+    async def worker():
+        nonlocal errors
+        for call in queue:
+            start = time.perf_counter()
+            response = await call()
+            latencies.append(time.perf_counter() - start)
+            if not response.is_success:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+async def run_benchmarks(args: argparse.Namespace, projects_of: Dict[str, List[int]]) -> dict:
+    import httpx
+
+    import main
+
+    ## request logging would dominate the timings
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    emails = list(projects_of)
+    results = {}
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        ## one client (cookie jar) per user, request i is made by user i % users
+        clients = [httpx.AsyncClient(transport=transport, base_url="http://bench") for _ in emails]
+        client_of = lambda i: clients[i % len(clients)]
+        project_of = lambda i: projects_of[emails[i % len(emails)]][(i // len(emails)) % args.projects]
+        credentials = lambda i: {"email": emails[i % len(emails)], "password": PASSWORD}
+
+        async def login(i):
+            ## a fresh client, a logged in one is answered without checking the password
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                return await client.post("/auth/login", json=credentials(i))
+
+        try:
+            for i in range(len(emails)):
+                (await client_of(i).post("/auth/login", json=credentials(i))).raise_for_status()
+            results["login"] = await run_scenario([lambda i=i: login(i) for i in range(args.logins)], args.concurrency)
+
+            results["list_projects"] = await run_scenario(
+                [lambda i=i: client_of(i).get("/projects/") for i in range(args.requests)], args.concurrency,
+            )
+            results["list_projects_compact"] = await run_scenario(
+                [lambda i=i: client_of(i).get("/projects/?compact=true") for i in range(args.requests)], args.concurrency,
+            )
+
+            created = []
+
+            async def create_task(i):
+                response = await client_of(i).post(f"/projects/{project_of(i)}/tasks", json={"title": f"bench {i}"})
+                if response.is_success:
+                    created.append((i, project_of(i), response.json()["id"]))
+                return response
+
+            results["create_task"] = await run_scenario([lambda i=i: create_task(i) for i in range(args.requests)], args.concurrency)
+            created.sort()
+            results["get_task"] = await run_scenario(
+                [lambda i=i, p=p, t=t: client_of(i).get(f"/projects/{p}/tasks/{t}") for i, p, t in created], args.concurrency,
+            )
+            results["list_tasks"] = await run_scenario(
+                [lambda i=i, p=p: client_of(i).get(f"/projects/{p}/tasks?limit=50") for i, p, _ in created], args.concurrency,
+            )
+            results["update_task"] = await run_scenario(
+                [lambda i=i, p=p, t=t: client_of(i).put(f"/projects/{p}/tasks/{t}", json={"status": "completed"}) for i, p, t in created],
+                args.concurrency,
+            )
+            results["delete_task"] = await run_scenario(
+                [lambda i=i, p=p, t=t: client_of(i).delete(f"/projects/{p}/tasks/{t}") for i, p, t in created], args.concurrency,
+            )
+            ## whole projects, each seeded project at most once
+            deletions = list(range(min(args.requests, len(emails) * args.projects)))
+            results["delete_project"] = await run_scenario(
+                [lambda i=i: client_of(i).delete(f"/projects/{project_of(i)}") for i in deletions], args.concurrency,
+            )
+        finally:
+            for client in clients:
+                await client.aclose()
+    return results
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> bool:
+    """Print p95 changes against the baseline to stderr, False when a scenario got slower than allowed"""
+    ok = True
+    if baseline.get("config") != report["config"]:
+        print(f"warning: the baseline was run with different settings: {baseline.get('config')}", file=sys.stderr)
+    print(f"{'scenario':<24}{'baseline p95':>14}{'p95':>12}{'change':>10}", file=sys.stderr)
+    for name, result in report["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None or not previous["p95_ms"]:
+            print(f"{name:<24}{'-':>14}{result['p95_ms']:>12.2f}{'new':>10}", file=sys.stderr)
+            continue
+        change = result["p95_ms"] / previous["p95_ms"] - 1
+        regressed = change > tolerance
+        ok = ok and not regressed
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<24}{previous['p95_ms']:>14.2f}{result['p95_ms']:>12.2f}{change:>+10.1%}{flag}", file=sys.stderr)
+    return ok
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else None
+    output = Path(args.output).resolve() if args.output else None
+
+    with tempfile.TemporaryDirectory(prefix="kanban-bench-") as workdir:
+        configure_environment(args, workdir)
+        projects_of = seed(args)
+        scenarios = asyncio.run(run_benchmarks(args, projects_of))
+
+    import fastapi, sqlalchemy
+    report = {
+        "config": {
+            "users": args.users,
+            "projects_per_user": args.projects,
+            "tasks_per_project": args.tasks,
+            "requests": args.requests,
+            "logins": args.logins,
+            "concurrency": args.concurrency,
+            "async_routers": args.async_routers,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "fastapi": fastapi.__version__,
+            "sqlalchemy": sqlalchemy.__version__,
+        },
+        "scenarios": scenarios,
+    }
+    text = json.dumps(report, indent=2)
+    if output:
+        output.write_text(text + "\n")
+    else:
+        print(text)
+
+    if baseline is not None and not compare(report, baseline, args.tolerance):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import time
+from typing import Iterable, List, Optional
+
+from sqlalchemy import delete, event, func, insert, literal, select
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import SessionLocal, engine
+from models import ChangeLog, project_user
+
+logger = logging.getLogger(__name__)
+
+## ChangeLog.entity
+PROJECT = "project"
+TASK = "task"
+MEMBER = "member"
+
+## ChangeLog.op
+UPSERT = "upsert"
+DELETE = "delete"
+
+
+## /sync hands out max(ChangeLog.id) as its cursor, which is only safe if rows commit in id
+## order. SQLite has one writer at a time. On Postgres ids come from a sequence, and a row
+## committed after a reader took its cursor could have a smaller id and never be synced, so
+## transactions take this lock before their first change log row and keep it until they end.
+CHANGE_LOG_LOCK = 0x6368616E6765  ## any bigint no other advisory lock uses
+
+def serialize_change_log_writers(orm_execute_state) -> None:
+    statement = orm_execute_state.statement
+    if orm_execute_state.is_insert and statement.table.name == ChangeLog.__tablename__:
+        orm_execute_state.session.execute(select(func.pg_advisory_xact_lock(CHANGE_LOG_LOCK)))
+
+if engine.dialect.name == "postgresql":
+    ## on every Session, so the sessions of the async routers count too
+    event.listen(Session, "do_orm_execute", serialize_change_log_writers)
+
+def changes_statement(project_id: int, entity: str, entity_ids: Iterable[int], op: str = UPSERT):
+    """One multi-row INSERT into the change log, None when there is nothing to record"""
+    now = time.time()
+    rows = [
+        {"project_id": project_id, "entity": entity, "entity_id": entity_id, "op": op, "created_at": now}
+        for entity_id in dict.fromkeys(entity_ids)
+    ]
+    if not rows:
+        return None
+    return insert(ChangeLog).values(rows)
+
+def record_changes(db: Session, project_id: int, entity: str, entity_ids: Iterable[int], op: str = UPSERT) -> None:
+    """Log changes in the caller's transaction"""
+    statement = changes_statement(project_id, entity, entity_ids, op)
+    if statement is not None:
+        db.execute(statement)
+
+def project_deletion_statements(project_ids: List[int]) -> list:
+    """
+    Tombstones for deleted projects and for every membership they had,
+    must run before the memberships are deleted
+    """
+    now = time.time()
+    columns = ["project_id", "entity", "entity_id", "op", "created_at"]
+    return [
+        insert(ChangeLog).from_select(
+            columns,
+            select(project_user.c.project_id, literal(MEMBER), project_user.c.user_id, literal(DELETE), literal(now))
+            .where(project_user.c.project_id.in_(project_ids)),
+        ),
+        insert(ChangeLog).values([
+            {"project_id": project_id, "entity": PROJECT, "entity_id": project_id, "op": DELETE, "created_at": now}
+            for project_id in project_ids
+        ]),
+    ]
+
+def oldest_valid_cursor(db: Session) -> Optional[int]:
+    """Cursors below this one may have missed compacted changes, None while the log is empty"""
+    oldest = db.scalar(select(func.min(ChangeLog.id)))
+    return None if oldest is None else oldest - 1
+
+def compact_change_log(db: Session, retention_seconds: float) -> int:
+    """
+    Drop changes older than the retention window, always keeping the newest row so
+    oldest_valid_cursor can tell which cursors are still complete. Nothing is committed.
+    """
+    cutoff = time.time() - retention_seconds
+    newest = select(func.max(ChangeLog.id)).scalar_subquery()
+    result = db.execute(delete(ChangeLog).where(ChangeLog.created_at < cutoff, ChangeLog.id < newest))
+    return result.rowcount
+
+def run_compaction() -> int:
+    with SessionLocal() as db:
+        removed = compact_change_log(db, settings.change_log_retention_days * 86400)
+        db.commit()
+    return removed
+
+async def compact_periodically() -> None:
+    """Lifespan task: compact the change log every CHANGE_LOG_COMPACT_INTERVAL seconds"""
+    while True:
+        try:
+            removed = await asyncio.to_thread(run_compaction)
+            if removed:
+                logger.info(f"Compacted {removed} change log rows")
+        except Exception:
+            logger.exception("Change log compaction failed")
+        await asyncio.sleep(settings.change_log_compact_interval)
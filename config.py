@@ -0,0 +1,114 @@
+import os
+from typing import Literal
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    """Application settings, read from environment variables (or a .env file)"""
+
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
+    ## Database engine
+    database_url: str = "sqlite:///./kanban_clone.db"
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0
+    db_pool_pre_ping: bool = True
+    db_echo: bool = False  # log every SQL statement
+
+    ## Read replicas for the routes that only read, e.g. ["sqlite:///file:kanban_clone.db?mode=ro&uri=true"]
+    database_read_urls: list[str] = []
+    read_your_writes_seconds: float = 5.0  # a user's reads go to the primary this long after their last write
+    read_your_writes_cache_size: int = 10000  # users whose recent writes a worker remembers itself
+
+    ## Skip schema creation at startup when the schema_version table says it is current
+    schema_version_check: bool = True
+
+    ## SQLite connection pragmas
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    sqlite_foreign_keys: bool = True
+
+    ## Serve auth and project routes with the async (AsyncSession) routers
+    async_routers: bool = False
+    async_database_url: str | None = None  # derived from database_url when unset
+
+    ## Largest page the listing endpoints hand out
+    max_page_size: int = 500
+
+    ## Most operations accepted by one batch request
+    max_batch_size: int = 1000
+
+    ## Project export/import: rows per fetch when exporting, per INSERT when importing
+    transfer_chunk_size: int = 1000
+    ## Longest line an import accepts (413 beyond), and how much of an import body is
+    ## buffered in memory before the rest goes to a temporary file
+    transfer_max_line_bytes: int = 1024 * 1024
+    transfer_spool_memory_bytes: int = 4 * 1024 * 1024
+
+    ## Projects with more tasks than this are deleted by a background job, in chunks
+    project_delete_background_threshold: int = 5000
+    delete_chunk_size: int = 1000
+
+    ## Rendered JSON of project reads, keyed by project version (0 disables it)
+    response_cache_size: int = 1024
+    response_cache_ttl: float = 300.0
+
+    ## Project change events pushed over WebSockets
+    event_backend: str = "events:LocalEventBackend"  # "module:Class" of an events.EventBackend
+    event_queue_size: int = 100  # events a connection may fall behind before it is dropped
+
+    ## State shared by the workers of one host (see shared.py), set up by serve.py when running several
+    shared_state_backend: str = "shared:LocalSharedState"  # "module:Class" of a shared.SharedState
+    shared_state_path: str = "shared_state.db"  # SQLite file of shared:SQLiteSharedState
+    shared_state_poll_interval: float = 0.05  # seconds between checks for published messages
+    shared_state_message_retention: float = 60.0  # seconds published messages are kept
+    shared_state_sweep_interval: float = 60.0  # seconds between evictions of expired keys
+
+    ## Token-bucket rate limits ("<count>/<second|minute|hour|day>"), see ratelimit.py
+    rate_limit_enabled: bool = True
+    rate_limit_backend: str = "ratelimit:MemoryRateLimitBackend"  # "module:Class" of a ratelimit.RateLimitBackend
+    rate_limit_ip: str = "600/minute"  # every request, per client IP
+    rate_limit_user: str = "300/minute"  # requests with a valid token, per user
+    rate_limit_routes: dict[str, str] = {  # "METHOD /path/template", per user (or IP when anonymous)
+        "POST /auth/login": "10/minute",
+        "POST /users/": "5/minute",
+    }
+    rate_limit_trust_forwarded: bool = False  # take the client IP from X-Forwarded-For (behind a proxy only)
+    rate_limit_forwarded_hops: int = 1  # proxies in front of the app, each appends the address it got the request from
+    rate_limit_sweep_interval: float = 60.0  # seconds between evictions of full buckets
+
+    ## Logging: JSON (or text) records written by a background thread to the console and a rotating file
+    log_level: str = "INFO"
+    log_format: Literal["json", "text"] = "json"
+    log_file: str = "app.log"  # empty to only log to the console, "{pid}" is replaced by the process id
+    log_max_bytes: int = 10 * 1024 * 1024
+    log_backup_count: int = 5
+    log_access: bool = True  # one record per request
+    log_client_error_sample_rate: float = 1.0  # share of requests whose 4xx records are kept
+
+    ## Prometheus metrics at /metrics, with per-request SQL statistics
+    metrics_enabled: bool = True
+
+    ## Task ranks longer than this make their column get rebalanced (see ranking.py)
+    task_rank_max_length: int = 32
+
+    ## Change log read by /sync, older changes are compacted away
+    change_log_retention_days: float = 30.0
+    change_log_compact_interval: float = 3600.0  # seconds between compactions
+
+    ## Verified-principal cache used by routers.auth
+    principal_cache_size: int = 10000
+    principal_cache_ttl: float = 300.0
+
+    ## Argon2 hashing pool used by login and user creation
+    hash_workers: int = min(4, os.cpu_count() or 1)
+    hash_queue_limit: int = 16
+    hash_executor: Literal["thread", "process"] = "thread"
+    hash_retry_after: int = 1
+
+
+settings = Settings()
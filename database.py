@@ -1,26 +1,280 @@
 
+import hashlib
+import itertools
+import logging
 import sqlalchemy
-from sqlalchemy import create_engine
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import create_engine, delete, event, insert, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import CreateColumn, CreateIndex, CreateTable
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.sql.dml import UpdateBase
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 
 from pydantic import BaseModel, ConfigDict
 
-from fastapi import Depends
+from fastapi import Depends, Request
 from sqlalchemy.orm import Session
 from typing import Annotated
 
-URL_DATABASE = "sqlite:///./kanban_clone.db"
+from cache import TTLCache
+from config import settings
+import metrics
+from logs import get_user_id
 
-engine = create_engine(URL_DATABASE, echo=True)
+logger = logging.getLogger(__name__)
+
+URL_DATABASE = settings.database_url
+
+## async drivers to use for a sync URL when ASYNC_DATABASE_URL isn't set
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+def get_async_database_url() -> str:
+    """Async counterpart of URL_DATABASE"""
+    if settings.async_database_url:
+        return settings.async_database_url
+    url = make_url(URL_DATABASE)
+    backend = url.get_backend_name()
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS.get(backend, url.get_driver_name())}").render_as_string(hide_password=False)
+
+def is_sqlite_memory(url) -> bool:
+    url = make_url(url)
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+class TimedCheckout:
+    """Pool mixin reporting how long each checkout waited for a connection to the metrics"""
+    engine_label = ""
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            metrics.observe_checkout_wait(self.engine_label, time.perf_counter() - start)
+
+class TimedQueuePool(TimedCheckout, QueuePool):
+    engine_label = "sync"
+
+class TimedAsyncQueuePool(TimedCheckout, AsyncAdaptedQueuePool):
+    engine_label = "async"
+
+class TimedReadQueuePool(TimedCheckout, QueuePool):
+    engine_label = "read"
+
+def engine_options(url, is_async: bool = False, read: bool = False) -> dict:
+    """Engine keyword arguments from settings, pool sizing only applies to pooled backends"""
+    ## settings.db_echo is applied by logs.setup_logging, echo=True would log from the request thread
+    options = {
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+    if not is_sqlite_memory(url):
+        options.update(
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout,
+        )
+        if settings.metrics_enabled:
+            options["poolclass"] = TimedAsyncQueuePool if is_async else TimedReadQueuePool if read else TimedQueuePool
+    return options
+
+def set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """Applied on every new SQLite connection"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={settings.sqlite_journal_mode}")
+    cursor.execute(f"PRAGMA synchronous={settings.sqlite_synchronous}")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_size)}")
+    cursor.execute(f"PRAGMA foreign_keys={'ON' if settings.sqlite_foreign_keys else 'OFF'}")
+    cursor.close()
+
+def set_sqlite_query_only(dbapi_connection, connection_record) -> None:
+    """Applied on every new connection of a SQLite read engine, writes through it fail"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+def configure_engine(sync_engine: Engine, read: bool = False) -> Engine:
+    """Hook the per-connection setup onto an engine"""
+    if sync_engine.dialect.name == "sqlite":
+        event.listen(sync_engine, "connect", set_sqlite_pragmas)
+        if read:
+            event.listen(sync_engine, "connect", set_sqlite_query_only)
+    if settings.metrics_enabled:
+        metrics.instrument_engine(sync_engine)
+    return sync_engine
+
+engine = configure_engine(create_engine(URL_DATABASE, **engine_options(URL_DATABASE)))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+## Read engines (replicas, or read-only connections to the same SQLite file) used by GET routes
+read_engines = [
+    configure_engine(create_engine(url, **engine_options(url, read=True)), read=True)
+    for url in settings.database_read_urls
+]
+read_engine_picks = itertools.count()
+
+## Users who wrote within `settings.read_your_writes_seconds`: this worker's own writes, and
+## in the shared state those of every worker (serve.py). The shared state does I/O, it is only
+## read from sync dependencies and written from a thread of its own, never on the event loop.
+recent_writes = TTLCache(maxsize=settings.read_your_writes_cache_size, ttl=settings.read_your_writes_seconds)
+recent_write_publisher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recent-writes")
+
+def recent_write_key(user_id: int) -> str:
+    return f"wrote:{user_id}"
+
+def publish_recent_write(user_id: int) -> None:
+    from shared import shared_state
+    try:
+        shared_state.set(recent_write_key(user_id), True, ttl=settings.read_your_writes_seconds)
+    except Exception:
+        logger.exception("Recording a recent write in the shared state failed")
+
+def wrote_recently(user_id: int) -> bool:
+    """Whether a user wrote recently in any worker, may do shared state I/O"""
+    if recent_writes.get(user_id):
+        return True
+    from shared import shared_state
+    return bool(shared_state.get(recent_write_key(user_id)))
+
+def next_read_engine() -> Engine:
+    return read_engines[next(read_engine_picks) % len(read_engines)]
+
+class ReadSession(Session):
+    """
+    Session reading from one of the read engines, picked by get_read_db for the request's user.
+    Flushes and insert/update/delete statements still go to the primary (raw SQL text doesn't), and so do the reads of a user who wrote
+    within the last `settings.read_your_writes_seconds`, replicas may not have their write yet.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self._flushing or isinstance(clause, UpdateBase):
+            return engine
+        bind = self.info.get("read_bind")
+        if bind is not None:
+            return bind
+        ## a session opened outside get_read_db: only this worker's writes are known without I/O
+        user_id = get_user_id()
+        if user_id is None:
+            ## not authenticated yet: decided again on the next query, once the user may be known
+            return next_read_engine()
+        bind = engine if recent_writes.get(user_id) else next_read_engine()
+        self.info["read_bind"] = bind
+        return bind
+
+ReadSessionLocal = sessionmaker(class_=ReadSession, autocommit=False, autoflush=False) if read_engines else SessionLocal
+
+def note_write(session: Session, *args) -> None:
+    session.info["wrote"] = True
+
+def note_dml(orm_execute_state) -> None:
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["wrote"] = True
+
+def remember_write(session: Session) -> None:
+    """After a commit that wrote, the current user reads from the primary for a while"""
+    if not session.info.pop("wrote", False):
+        return
+    user_id = get_user_id()
+    if user_id is not None:
+        recent_writes.set(user_id, True)
+        ## AsyncSession commits land here on the event loop
+        recent_write_publisher.submit(publish_recent_write, user_id)
+
+if read_engines:
+    ## on every Session, so the sessions of the async routers (AsyncSession wraps one) count too
+    event.listen(Session, "after_flush", note_write)
+    event.listen(Session, "do_orm_execute", note_dml)
+    event.listen(Session, "after_commit", remember_write)
+
+## Async stack (aiosqlite locally, asyncpg on Postgres) of the async routers, /projects/import and
+## WebSocket authorization. Made on first use, so the driver is only imported when something needs it.
+ASYNC_URL_DATABASE = get_async_database_url()
+async_engine: AsyncEngine | None = None
+async_session_factory: async_sessionmaker | None = None
+async_engine_lock = threading.Lock()
+
+def get_async_engine() -> AsyncEngine:
+    global async_engine, async_session_factory
+    with async_engine_lock:
+        if async_engine is None:
+            async_engine = create_async_engine(ASYNC_URL_DATABASE, **engine_options(ASYNC_URL_DATABASE, is_async=True))
+            configure_engine(async_engine.sync_engine)
+            async_session_factory = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+        return async_engine
+
+def AsyncSessionLocal() -> AsyncSession:
+    """New AsyncSession, like SessionLocal() for the sync stack"""
+    get_async_engine()
+    return async_session_factory()
+
+async def dispose_async_engine() -> None:
+    if async_engine is not None:
+        await async_engine.dispose()
+
 Base = declarative_base()
 
+def add_missing_columns() -> None:
+    """create_all doesn't alter existing tables, add the columns models gained since they were created"""
+    inspector = sqlalchemy.inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                    connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column_ddl}"))
+
+def schema_fingerprint() -> str:
+    """Hash of the DDL init_db runs, changing a model or the search index gives a new one"""
+    from search import POSTGRES_SEARCH_DDL, SQLITE_SEARCH_DDL
+    statements = []
+    for table in Base.metadata.sorted_tables:
+        statements.append(str(CreateTable(table).compile(dialect=engine.dialect)))
+        statements.extend(
+            str(CreateIndex(index).compile(dialect=engine.dialect))
+            for index in sorted(table.indexes, key=lambda index: index.name)
+        )
+    statements.extend(SQLITE_SEARCH_DDL + POSTGRES_SEARCH_DDL)
+    return hashlib.sha256("\n".join(statements).encode()).hexdigest()
+
+def stored_schema_fingerprint() -> str | None:
+    import models
+    try:
+        with engine.connect() as connection:
+            return connection.scalar(select(models.schema_version.c.fingerprint))
+    except DBAPIError:
+        ## no schema_version table yet
+        return None
+
 def init_db() -> None:
     # Import models so they are registered with SQLAlchemy metadata
-    import models  # noqa: F401
+    import models
+    fingerprint = schema_fingerprint()
+    if settings.schema_version_check and stored_schema_fingerprint() == fingerprint:
+        ## created by an earlier start from the same models, nothing to create, alter or backfill
+        return
+
     Base.metadata.create_all(bind=engine)
+    add_missing_columns()
+    ## create_all skips tables that already exist, indexes added to them later still need creating
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    from search import create_search_index
+    create_search_index(engine)
+    from ranking import rank_unranked_tasks
+    rank_unranked_tasks(engine)
+
+    with engine.begin() as connection:
+        connection.execute(delete(models.schema_version))
+        connection.execute(insert(models.schema_version).values(fingerprint=fingerprint, applied_at=time.time()))
 
 def get_db():
     db = SessionLocal()
@@ -29,4 +283,23 @@ def get_db():
     finally:
         db.close()
 
-db_dependency = Annotated[Session, Depends(get_db)]
\ No newline at end of file
+def get_read_db(request: Request):
+    """Session for routes that only read, see ReadSession"""
+    db = ReadSessionLocal()
+    if read_engines:
+        ## a sync dependency, so the shared state lookup runs in the threadpool
+        from routers.auth import request_user_id
+        user_id = request_user_id(request)
+        db.info["read_bind"] = engine if user_id is not None and wrote_recently(user_id) else next_read_engine()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+db_dependency = Annotated[Session, Depends(get_db)]
+read_db_dependency = Annotated[Session, Depends(get_read_db)]
+async_db_dependency = Annotated[AsyncSession, Depends(get_async_db)]
@@ -0,0 +1,239 @@
+import asyncio
+import importlib
+import json
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+## Deliver callback handed to backends: (project_id, encoded event) -> None, called on the event loop
+Deliver = Callable[[int, str], None]
+
+
+class EventBackend(ABC):
+    """
+    Transport between publishers and the hub of each worker.
+    `publish` may be called from any thread; `deliver` must be called on the hub's event loop.
+    """
+
+    @abstractmethod
+    async def start(self, deliver: Deliver) -> None:
+        ...
+
+    @abstractmethod
+    def publish(self, project_id: int, message: str) -> None:
+        ...
+
+    async def stop(self) -> None:
+        pass
+
+
+class LocalEventBackend(EventBackend):
+    """Single-process backend, events only reach subscribers of this worker"""
+
+    def __init__(self):
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._deliver: Deliver | None = None
+
+    async def start(self, deliver: Deliver) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._deliver = deliver
+
+    def publish(self, project_id: int, message: str) -> None:
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        ## sync routes publish from the threadpool
+        loop.call_soon_threadsafe(self._deliver, project_id, message)
+
+    async def stop(self) -> None:
+        self._loop = None
+
+
+class SharedEventBackend(EventBackend):
+    """Events published through the shared state (shared.py), reaching the subscribers of every worker"""
+
+    CHANNEL = "events"
+
+    def __init__(self):
+        from shared import shared_state
+
+        self.state = shared_state
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._deliver: Deliver | None = None
+        ## writes to the shared state happen on this thread, not on the publisher's (often the
+        ## event loop); a single one, so events keep the order they were published in
+        self._publisher: ThreadPoolExecutor | None = None
+        self._publisher_lock = threading.Lock()
+
+    async def start(self, deliver: Deliver) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._deliver = deliver
+        self.state.subscribe(self.CHANNEL, self._receive)
+
+    def publish(self, project_id: int, message: str) -> None:
+        with self._publisher_lock:
+            if self._publisher is None:
+                self._publisher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="event-publisher")
+            self._publisher.submit(self._publish, f"{project_id}:{message}")
+
+    def _publish(self, message: str) -> None:
+        try:
+            self.state.publish(self.CHANNEL, message)
+        except Exception:
+            logger.exception("Publishing an event to the shared state failed")
+
+    def _receive(self, message: str) -> None:
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        project_id, _, event = message.partition(":")
+        loop.call_soon_threadsafe(self._deliver, int(project_id), event)
+
+    async def stop(self) -> None:
+        with self._publisher_lock:
+            publisher, self._publisher = self._publisher, None
+        if publisher is not None:
+            ## events published before stopping still go out
+            await asyncio.to_thread(publisher.shutdown)
+        self.state.unsubscribe(self.CHANNEL, self._receive)
+        self._loop = None
+
+
+def load_backend(path: str) -> EventBackend:
+    """Instantiate a backend from a "module:Class" path"""
+    module_name, _, class_name = path.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+class Subscription:
+    """
+    One connection's bounded queue of encoded events.
+    A consumer that lets it fill up is dropped instead of slowing down everyone else,
+    one whose user is removed from the project is revoked after that event.
+    """
+
+    def __init__(self, project_id: int, maxsize: int, user_id: Optional[int] = None):
+        self.project_id = project_id
+        self.user_id = user_id
+        self.queue: asyncio.Queue[str | None] = asyncio.Queue(maxsize=maxsize)
+        self.dropped = False
+        self.revoked = False
+
+    def push(self, message: str) -> bool:
+        """Queue an event, False if the consumer is too slow and got dropped"""
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            self.drop()
+            return False
+
+    def drop(self) -> None:
+        ## empty the queue so the None sentinel fits and the reader stops right away
+        self.dropped = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    def revoke(self) -> None:
+        """End the subscription once the events already queued are read"""
+        self.revoked = True
+        try:
+            self.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            self.drop()
+
+    async def get(self) -> str | None:
+        """Next encoded event, None once the subscription was dropped or revoked"""
+        return await self.queue.get()
+
+
+## publish encodes the type first, so a removal is recognised without decoding every event
+REMOVED_MEMBERS_PREFIX = json.dumps({"type": "members.removed"})[:-1] + ","
+
+
+class EventHub:
+    """In-process pub/sub of project change events, fanned out to per-connection queues"""
+
+    def __init__(self, backend: EventBackend, queue_size: int):
+        self.backend = backend
+        self.queue_size = queue_size
+        self._subscribers: dict[int, set[Subscription]] = defaultdict(set)
+        self._lock = threading.Lock()
+        self._stats = {"published": 0, "delivered": 0, "dropped_consumers": 0, "revoked_consumers": 0}
+
+    async def start(self) -> None:
+        await self.backend.start(self._deliver)
+
+    async def stop(self) -> None:
+        await self.backend.stop()
+        for subscriptions in list(self._subscribers.values()):
+            for subscription in list(subscriptions):
+                subscription.drop()
+        self._subscribers.clear()
+
+    def subscribe(self, project_id: int, user_id: Optional[int] = None) -> Subscription:
+        """Subscribe to a project's events, as `user_id` when the subscription must end with their membership"""
+        subscription = Subscription(project_id, self.queue_size, user_id)
+        self._subscribers[project_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions = self._subscribers.get(subscription.project_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscribers[subscription.project_id]
+
+    def publish(self, project_id: int, event_type: str, **data: Any) -> None:
+        """Broadcast an event about a project, encoded once for every subscriber"""
+        message = json.dumps({"type": event_type, "project_id": project_id, **data}, default=str)
+        with self._lock:
+            self._stats["published"] += 1
+        self.backend.publish(project_id, message)
+
+    def _deliver(self, project_id: int, message: str) -> None:
+        subscriptions = self._subscribers.get(project_id)
+        if not subscriptions:
+            return
+        delivered = dropped = 0
+        for subscription in list(subscriptions):
+            if subscription.push(message):
+                delivered += 1
+            else:
+                dropped += 1
+                self.unsubscribe(subscription)
+        if dropped:
+            logger.warning(f"Dropped {dropped} slow event consumer(s) of project {project_id}")
+        revoked = self._revoke_removed_members(project_id, message)
+        with self._lock:
+            self._stats["delivered"] += delivered
+            self._stats["dropped_consumers"] += dropped
+            self._stats["revoked_consumers"] += revoked
+
+    def _revoke_removed_members(self, project_id: int, message: str) -> int:
+        """Access is checked when a socket connects, a removal ends the subscriptions of the removed users"""
+        if not message.startswith(REMOVED_MEMBERS_PREFIX):
+            return 0
+        removed = set(json.loads(message).get("user_ids", ()))
+        revoked = 0
+        for subscription in list(self._subscribers.get(project_id, ())):
+            if subscription.user_id in removed:
+                subscription.revoke()
+                self.unsubscribe(subscription)
+                revoked += 1
+        return revoked
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "subscribers": sum(len(s) for s in self._subscribers.values())}
+
+
+event_hub = EventHub(load_backend(settings.event_backend), settings.event_queue_size)
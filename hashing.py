@@ -0,0 +1,139 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from fastapi import HTTPException, status
+
+import metrics
+from config import settings
+
+
+def _timed_hash(password: str, salt: str) -> tuple[str, float]:
+    """Runs inside the worker, returns the hash and the wall-clock time it started at"""
+    from pyargon2 import hash as argon2_hash  ## imported by the first hash, not at startup
+
+    started_at = time.time()
+    return argon2_hash(password=password, salt=salt, variant="id"), started_at
+
+
+class HashingPool:
+    """
+    Dedicated executor for Argon2 hashing.
+    At most `workers + max_queue` hashes can be in flight, further requests
+    are rejected with a 503 instead of piling up on the request threadpool.
+    """
+
+    def __init__(self, workers: int, max_queue: int, kind: str = "thread", retry_after: int = 1):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.kind = kind
+        self.retry_after = retry_after
+        self._executor: Executor | None = None
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self._stats = {
+            "completed": 0,
+            "rejected": 0,
+            "in_flight": 0,
+            "latency_seconds_total": 0.0,
+            "latency_seconds_max": 0.0,
+            "queue_wait_seconds_total": 0.0,
+            "queue_wait_seconds_max": 0.0,
+        }
+
+    def _get_executor(self) -> Executor:
+        ## created lazily so a process pool is not forked at import time
+        with self._lock:
+            if self._executor is None:
+                if self.kind == "process":
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="argon2")
+            return self._executor
+
+    def submit(self, password: str, salt: str) -> Future:
+        """Schedule a hash, the future resolves to the hex digest"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats["rejected"] += 1
+            metrics.hashes_rejected.inc()
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many concurrent authentication requests, try again later",
+                headers={"Retry-After": str(self.retry_after)},
+            )
+
+        submitted_at = time.time()
+        with self._lock:
+            self._stats["in_flight"] += 1
+        metrics.hashes_in_flight.inc()
+        try:
+            inner = self._get_executor().submit(_timed_hash, password, salt)
+        except BaseException:
+            self._release()
+            raise
+
+        result: Future = Future()
+
+        def _done(fut: Future) -> None:
+            self._release()
+            try:
+                hashed, started_at = fut.result()
+            except BaseException as exc:
+                result.set_exception(exc)
+                return
+            finished_at = time.time()
+            self._record(max(started_at - submitted_at, 0.0), finished_at - submitted_at)
+            result.set_result(hashed)
+
+        inner.add_done_callback(_done)
+        return result
+
+    def hash(self, password: str, salt: str) -> str:
+        """Hash a password, blocking the calling thread until a worker is done"""
+        return self.submit(password, salt).result()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _release(self) -> None:
+        with self._lock:
+            self._stats["in_flight"] -= 1
+        metrics.hashes_in_flight.dec()
+        self._slots.release()
+
+    def _record(self, queue_wait: float, latency: float) -> None:
+        metrics.hash_queue_wait.observe(queue_wait)
+        metrics.hash_duration.observe(latency)
+        with self._lock:
+            self._stats["completed"] += 1
+            self._stats["queue_wait_seconds_total"] += queue_wait
+            self._stats["queue_wait_seconds_max"] = max(self._stats["queue_wait_seconds_max"], queue_wait)
+            self._stats["latency_seconds_total"] += latency
+            self._stats["latency_seconds_max"] = max(self._stats["latency_seconds_max"], latency)
+
+
+hashing_pool = HashingPool(
+    workers=settings.hash_workers,
+    max_queue=settings.hash_queue_limit,
+    kind=settings.hash_executor,
+    retry_after=settings.hash_retry_after,
+)
+
+
+def hash_password(password: str, salt: str) -> str:
+    """Argon2id hash of a password, computed on the hashing pool"""
+    return hashing_pool.hash(password, salt)
+
+
+async def hash_password_async(password: str, salt: str) -> str:
+    """Argon2id hash of a password, awaited without holding a request thread"""
+    return await asyncio.wrap_future(hashing_pool.submit(password, salt))
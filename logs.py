@@ -0,0 +1,188 @@
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
+
+from config import settings
+
+## Logging goes through a queue: request code only builds the record, a listener
+## thread formats it and does the file and console writes.
+
+REQUEST_ID_HEADER = "X-Request-ID"
+## request ids sent by clients are echoed back, so only short plain ones are kept
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,128}$")
+
+## Request fields copied onto every record logged while serving a request
+class RequestContext:
+    __slots__ = ("request_id", "scope", "user_id", "sampled")
+
+    def __init__(self, request_id: str, scope: dict, sampled: bool):
+        self.request_id = request_id
+        self.scope = scope
+        self.user_id = None
+        self.sampled = sampled
+
+    @property
+    def route(self) -> Optional[str]:
+        """Path template of the matched route, known once routing is done"""
+        return getattr(self.scope.get("route"), "path", None)
+
+request_context: ContextVar[Optional[RequestContext]] = ContextVar("request_context", default=None)
+
+def set_user_id(user_id: int) -> None:
+    """Attach the authenticated user to the current request's records"""
+    context = request_context.get()
+    if context is not None:
+        context.user_id = user_id
+
+def get_user_id() -> Optional[int]:
+    """Authenticated user of the current request, once known"""
+    context = request_context.get()
+    return context.user_id if context is not None else None
+
+class RequestContextFilter(logging.Filter):
+    """Adds the request fields, and drops 4xx records of requests that weren't sampled"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = request_context.get()
+        if context is None:
+            return True
+        status = getattr(record, "status", None)
+        if status is not None and 400 <= status < 500 and not context.sampled:
+            return False
+        record.request_id = context.request_id
+        record.method = context.scope["method"]
+        record.route = context.route
+        record.user_id = context.user_id
+        return True
+
+class RequestQueueHandler(QueueHandler):
+    """QueueHandler leaving formatting to the listener thread"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        ## freeze the message now, arguments may change once the call returns
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+RECORD_FIELDS = ("request_id", "method", "route", "status", "latency_ms", "user_id")
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in RECORD_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+def setup_logging() -> QueueListener:
+    """Route the root logger through a queue to a rotating file and the console"""
+    formatter = JSONFormatter() if settings.log_format == "json" else logging.Formatter(TEXT_FORMAT)
+    handlers = [logging.StreamHandler(sys.stderr)]
+    if settings.log_file:
+        ## "{pid}" in the name gives every worker its own file, rotation isn't safe across processes
+        handlers.append(RotatingFileHandler(
+            settings.log_file.format(pid=os.getpid()),
+            maxBytes=settings.log_max_bytes,
+            backupCount=settings.log_backup_count,
+            encoding="utf-8",
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = RequestQueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(settings.log_level)
+    ## SQL logging also goes through the queue, create_engine(echo=True) would write from the request thread
+    if settings.db_echo:
+        logging.getLogger("sqlalchemy.engine").setLevel(logging.INFO)
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+def stop_logging(listener: QueueListener) -> None:
+    """Write out what is still queued, later records go straight to the handlers"""
+    listener.stop()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    for handler in listener.handlers:
+        root.addHandler(handler)
+
+access_logger = logging.getLogger("access")
+
+class RequestLoggingMiddleware:
+    """
+    ASGI middleware giving every request an id (X-Request-ID, taken from the request when
+    it has a usable one) and logging one access record per request with its latency.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                candidate = value.decode("latin-1")
+                if REQUEST_ID_PATTERN.match(candidate):
+                    request_id = candidate
+                break
+        context = RequestContext(
+            request_id or uuid.uuid4().hex,
+            scope,
+            sampled=random.random() < settings.log_client_error_sample_rate,
+        )
+        token = request_context.set(context)
+        status = 500
+
+        async def send_with_request_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-request-id", context.request_id.encode())]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            if settings.log_access:
+                latency_ms = round((time.perf_counter() - start) * 1000, 3)
+                access_logger.info(
+                    "%s %s %s", scope["method"], scope["path"], status,
+                    extra={"status": status, "latency_ms": latency_ms},
+                )
+            request_context.reset(token)
@@ -1,14 +1,31 @@
+import time
+## taken before the other imports, so the startup timings include them
+STARTED_AT = time.perf_counter()
+
+import asyncio
 import logging
 from contextlib import asynccontextmanager
+from typing import List
 
-from fastapi import FastAPI, HTTPException
+from fastapi import APIRouter, Depends, FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from routers.projects import router as projects_router
+from routers.projects import purge_orphaned_projects, router as projects_router
 
 from routers.users import router as users_router
-from routers.auth import router as auth_router
+from routers.auth import router as auth_router, principal_cache, subscribe_invalidations, unsubscribe_invalidations
 from routers.me import router as me_router
-from database import init_db
+from routers.events import router as events_router
+from routers.sync import router as sync_router
+from routers.search import router as search_router
+from routers.transfer import router as transfer_router
+from database import dispose_async_engine, init_db
+from config import settings
+from hashing import hashing_pool
+from events import event_hub
+from changelog import compact_periodically
+from metrics import MetricsMiddleware, StartupTimer
+from logs import REQUEST_ID_HEADER, RequestLoggingMiddleware, setup_logging, stop_logging
+from ratelimit import rate_limit, rate_limiter
 
 app_description = """
 This API serves as the backend for a Kanban-style project management application.
@@ -24,6 +41,7 @@ It allows users to manage projects, tasks, and user assignments with proper auth
 - Project Management (Create, Read, Update, Delete)
 - Task Management within Projects
 - User Assignments to Projects
+- Live project updates over WebSockets
 - CORS Configuration for Frontend Integration
 
 ## Source Code
@@ -38,32 +56,64 @@ Here are some frontend implementations for this API:
 """
 
 global_logger = logging.getLogger()
-global_logger.setLevel(logging.INFO)
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    filename='app.log',
-    encoding='utf-8'
-    )
-handler = logging.StreamHandler()
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-handler.setFormatter(formatter)
-global_logger.addHandler(handler)
+startup_timer = StartupTimer()
+
+def build_openapi(app: FastAPI) -> None:
+    """Generate the OpenAPI schema (FastAPI keeps it) before anyone asks for /docs"""
+    with startup_timer.phase("openapi"):
+        app.openapi()
+    global_logger.info("OpenAPI schema built in %.1f ms", startup_timer.phases["openapi"] * 1000)
+
+def purge_orphans() -> None:
+    """Finish deleting the projects whose background purge a previous run didn't get to"""
+    try:
+        purged = purge_orphaned_projects()
+    except Exception:
+        global_logger.exception("Purging orphaned projects failed")
+        return
+    if purged:
+        global_logger.info("Purged %d orphaned projects", len(purged))
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger = global_logger
 
-    # Place for startup and shutdown events if needed in the future
+    ## records are written to the console and app.log by a background thread, see logs.py;
+    ## set up by the app that serves, not by whatever imports this module
+    with startup_timer.phase("logging"):
+        log_listener = setup_logging()
     logger.info("Initializing database...")
-    init_db()
+    with startup_timer.phase("init_db"):
+        init_db()
+    with startup_timer.phase("event_hub"):
+        await event_hub.start()
+    subscribe_invalidations()
+    compaction = asyncio.create_task(compact_periodically())
+    logger.info("Started in %.1f ms: %s", (time.perf_counter() - STARTED_AT) * 1000, startup_timer.summary())
+    ## off the startup path, the worker takes requests meanwhile
+    openapi_build = asyncio.get_running_loop().run_in_executor(None, build_openapi, app)
+    orphan_purge = asyncio.get_running_loop().run_in_executor(None, purge_orphans)
     yield
+    await openapi_build
+    await orphan_purge
+    compaction.cancel()
+    await event_hub.stop()
+    unsubscribe_invalidations()
+    logger.info(f"Event hub stats: {event_hub.stats()}")
+    logger.info(f"Principal cache stats: {principal_cache.stats()}")
+    logger.info(f"Hashing pool stats: {hashing_pool.stats()}")
+    logger.info(f"Rate limiter stats: {rate_limiter.stats()}")
+    hashing_pool.shutdown()
+    await dispose_async_engine()
+    stop_logging(log_listener)
 
 app = FastAPI(
     lifespan=lifespan,
     license_info={"name": "AGPL-3.0-or-later", "url": "https://www.gnu.org/licenses/agpl-3.0.en.html"},
     description=app_description,
     title="Kanban Clone Backend API",
+    ## runs before the route's own dependencies, so throttled requests never reach the database
+    dependencies=[Depends(rate_limit)] if settings.rate_limit_enabled else [],
     )
 
 app.add_middleware(
@@ -72,12 +122,42 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", REQUEST_ID_HEADER],
 )
-
-app.include_router(auth_router)
-app.include_router(users_router)
-app.include_router(me_router)
-app.include_router(projects_router)
+if settings.metrics_enabled:
+    ## outside the other middleware, so the timings include them
+    app.add_middleware(MetricsMiddleware)
+## outermost, every record logged while serving a request carries its id
+app.add_middleware(RequestLoggingMiddleware)
+
+def with_fallback(primary: APIRouter, fallback: APIRouter) -> APIRouter:
+    """Routes of `primary`, plus the routes of `fallback` it doesn't define itself"""
+
+    defined = {(route.path, frozenset(getattr(route, "methods", None) or ())) for route in primary.routes}
+    merged = APIRouter()
+    merged.routes.extend(primary.routes)
+    merged.routes.extend(
+        route for route in fallback.routes
+        if (route.path, frozenset(getattr(route, "methods", None) or ())) not in defined
+    )
+    return merged
+
+def api_routers(async_routers: bool) -> List[APIRouter]:
+    """The API's routers, with `async_routers` the async routes replace their sync counterparts"""
+    auth, projects = auth_router, projects_router
+    if async_routers:
+        ## anything not ported yet stays sync
+        from routers.async_auth import router as async_auth_router
+        from routers.async_projects import router as async_projects_router
+        auth = with_fallback(async_auth_router, auth)
+        projects = with_fallback(async_projects_router, projects)
+    return [auth, users_router, me_router, projects, events_router, sync_router, search_router, transfer_router]
+
+for router in api_routers(settings.async_routers):
+    app.include_router(router)
+if settings.metrics_enabled:
+    from routers.metrics import router as metrics_router
+    app.include_router(metrics_router)
 
 """ping pong :)"""
 @app.get("/ping")
@@ -89,27 +169,30 @@ def ping():
 def source():
     return {"url": "https://github.com/a-mayb3/Kanban_clone_backend"}
 
-if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
-
-
 from fastapi.exceptions import RequestValidationError 
 from fastapi.responses import JSONResponse 
 
+def error_type(status_code: int) -> str:
+    if status_code == 401:
+        return "authentication_error"
+    if status_code == 429:
+        return "rate_limit_error"
+    return "authorization_error"
+
 @app.exception_handler(HTTPException) 
 async def http_exception_handler(request, exc): 
     """Custom HTTP exception handler""" 
     
     logger = global_logger
-    logger.error(f"HTTP error occurred: {exc.detail}")
+    level = logging.ERROR if exc.status_code >= 500 else logging.WARNING
+    logger.log(level, "HTTP error occurred: %s", exc.detail, extra={"status": exc.status_code})
     
     return JSONResponse( 
         status_code=exc.status_code, 
         content={ 
             "error": { 
                 "message": exc.detail, 
-                "type": "authentication_error" if exc.status_code == 401 else "authorization_error", 
+                "type": error_type(exc.status_code), 
                 "status_code": exc.status_code 
              } 
           }, 
@@ -121,7 +204,7 @@ async def validation_exception_handler(request, exc):
     """Handle validation errors"""
 
     logger = global_logger
-    logger.error(f"Validation error: {exc.errors()}")
+    logger.warning("Validation error: %s", exc.errors(), extra={"status": 422})
 
     return JSONResponse( 
         status_code=422, 
@@ -139,7 +222,7 @@ async def general_exception_handler(request, exc):
     """Handle all other exceptions"""
 
     logger = global_logger
-    logger.error(f"Unexpected error: {exc}")
+    logger.error("Unexpected error: %s", exc, exc_info=exc, extra={"status": 500})
 
     return JSONResponse(
         status_code=500,
@@ -150,4 +233,11 @@ async def general_exception_handler(request, exc):
                 "details": str(exc)
             }
         }
-    )
\ No newline at end of file
+    )
+
+startup_timer.record("import", time.perf_counter() - STARTED_AT)
+
+if __name__ == "__main__":
+    import uvicorn
+    ## uvicorn's loggers propagate to the queue, access records come from RequestLoggingMiddleware
+    uvicorn.run(app, host="0.0.0.0", port=8000, log_config=None, access_log=False)
@@ -0,0 +1,259 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+## Prometheus metrics kept in process and rendered in the text exposition format
+## (https://prometheus.io/docs/instrumenting/exposition_formats/). Every worker
+## process has its own, Prometheus adds them up across scrape targets.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+STATEMENT_COUNT_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+LabelValues = Tuple[str, ...]
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{escape_label(str(value))}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+class Metric(ABC):
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+    @abstractmethod
+    def render(self) -> List[str]:
+        ...
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        super().__init__(name, documentation, labels)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        with self.lock:
+            values = sorted(self.values.items())
+        return self.header() + [
+            f"{self.name}{format_labels(self.label_names, labels)} {format_value(value)}" for labels, value in values
+        ]
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def dec(self, *label_values: str, amount: float = 1) -> None:
+        self.inc(*label_values, amount=-amount)
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        ## per label set: count per bucket (the last one is +Inf), then the sum
+        self.values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self.lock:
+            counts, total = self.values.setdefault(label_values, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    def render(self) -> List[str]:
+        with self.lock:
+            values = sorted((labels, (list(counts), total[0])) for labels, (counts, total) in self.values.items())
+        lines = self.header()
+        for labels, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                bucket_labels = format_labels((*self.label_names, "le"), (*labels, format_value(bound)))
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.label_names, labels)} {format_value(total)}")
+            lines.append(f"{self.name}_count{format_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route, method and status code", ("method", "route", "status"),
+))
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "Time to the end of the response body, by route", ("method", "route"),
+))
+http_requests_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "HTTP requests being served",
+))
+http_request_db_statements = registry.register(Histogram(
+    "http_request_db_statements", "SQL statements run per request, by route", ("method", "route"), STATEMENT_COUNT_BUCKETS,
+))
+http_request_db_duration = registry.register(Histogram(
+    "http_request_db_seconds", "Time spent in SQL statements per request, by route", ("method", "route"),
+))
+db_statements = registry.register(Counter(
+    "db_statements_total", "SQL statements run, by kind", ("operation",),
+))
+db_statement_duration = registry.register(Histogram(
+    "db_statement_duration_seconds", "Time spent in each SQL statement, by kind", ("operation",),
+))
+db_pool_checkout_wait = registry.register(Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection", ("engine",),
+))
+
+hash_queue_wait = registry.register(Histogram(
+    "password_hash_queue_wait_seconds", "Time password hashes waited for a hashing worker",
+))
+hash_duration = registry.register(Histogram(
+    "password_hash_duration_seconds", "Time from submitting a password hash to its result, queue wait included",
+))
+hashes_in_flight = registry.register(Gauge(
+    "password_hashes_in_flight", "Password hashes queued or running",
+))
+hashes_rejected = registry.register(Counter(
+    "password_hashes_rejected_total", "Password hashes refused with a 503 because the hashing queue was full",
+))
+
+app_startup_phase = registry.register(Gauge(
+    "app_startup_phase_seconds", "Time spent in each phase of the worker's startup", ("phase",),
+))
+
+class StartupTimer:
+    """Durations of the startup phases, in the order they ran"""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+
+    def record(self, name: str, seconds: float) -> None:
+        self.phases[name] = seconds
+        app_startup_phase.inc(name, amount=seconds)
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def summary(self) -> str:
+        return ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in self.phases.items())
+
+## SQL statistics of the request being served, shared with the threads and greenlets it runs on
+class RequestQueries:
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+current_queries: ContextVar[Optional[RequestQueries]] = ContextVar("current_queries", default=None)
+
+OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "BEGIN", "COMMIT", "ROLLBACK", "PRAGMA", "CREATE", "ALTER"}
+
+def statement_operation(statement: str) -> str:
+    keyword = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return keyword if keyword in OPERATIONS else "OTHER"
+
+## the start time lives on the statement's execution context, a statement that fails never
+## reaches after_cursor_execute and leaves nothing behind on the pooled connection
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if context is not None:
+        context.metrics_started = time.perf_counter()
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    started = getattr(context, "metrics_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    operation = statement_operation(statement)
+    db_statements.inc(operation)
+    db_statement_duration.observe(elapsed, operation)
+    queries = current_queries.get()
+    if queries is not None:
+        queries.count += 1
+        queries.seconds += elapsed
+
+def observe_checkout_wait(engine_name: str, seconds: float) -> None:
+    db_pool_checkout_wait.observe(seconds, engine_name)
+
+def instrument_engine(sync_engine: Engine) -> None:
+    """Time every statement run on an engine"""
+    event.listen(sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", after_cursor_execute)
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency, status codes and SQL statistics per route.
+    Routes are labelled with their path template, requests no route matched with "unmatched".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = "500"
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        queries = RequestQueries()
+        token = current_queries.set(queries)
+        http_requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_requests_in_flight.dec()
+            current_queries.reset(token)
+            route = scope.get("route")
+            route_label = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            http_requests.inc(method, route_label, status)
+            http_request_duration.observe(elapsed, method, route_label)
+            http_request_db_statements.observe(queries.count, method, route_label)
+            http_request_db_duration.observe(queries.seconds, method, route_label)
@@ -1,14 +1,26 @@
-from sqlalchemy import Column, ForeignKey, String, Integer, Table
+import time
+
+from sqlalchemy import Column, Float, ForeignKey, String, Integer, Table, Index
 from sqlalchemy.dialects.sqlite import BLOB
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, selectinload
 from database import Base
 from typing import Optional, List
 
 project_user = Table(
     "project_user",
     Base.metadata,
-    Column("project_id", Integer, ForeignKey("projects.id"), primary_key=True),
-    Column("user_id", Integer, ForeignKey("users.id"), primary_key=True)
+    Column("project_id", Integer, ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True),
+    Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+    ## the primary key serves (project_id, user_id) lookups, this one serves "projects of a user"
+    Index("ix_project_user_user_id", "user_id"),
+)
+
+## Fingerprint of the schema init_db last created, it skips its DDL while the models still match
+schema_version = Table(
+    "schema_version",
+    Base.metadata,
+    Column("fingerprint", String, primary_key=True),
+    Column("applied_at", Float, nullable=False),
 )
 
 class User(Base):
@@ -19,7 +31,7 @@ class User(Base):
     email = Column(String, unique=True, index=True)
     password_hash = Column(String)
     password_salt = Column(String)
-    projects = relationship("Project", secondary=project_user, back_populates="users")
+    projects = relationship("Project", secondary=project_user, back_populates="users", passive_deletes=True)
 
 class Project(Base):
     __tablename__ = "projects"
@@ -27,8 +39,10 @@ class Project(Base):
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     name = Column(String, index=True)
     description = Column(String)
-    users = relationship("User", secondary=project_user, back_populates="projects")
-    tasks = relationship("Task", back_populates="project")
+    ## bumped by every change to the project, its tasks or its members (used for ETags)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    users = relationship("User", secondary=project_user, back_populates="projects", passive_deletes=True)
+    tasks = relationship("Task", back_populates="project", passive_deletes=True)
 
 class Task(Base):
     __tablename__ = "tasks"
@@ -37,5 +51,40 @@ class Task(Base):
     title = Column(String, index=True)
     description = Column(String)
     status = Column(String, default="pending")
-    project_id = Column(Integer, ForeignKey("projects.id"))
-    project = relationship("Project", back_populates="tasks")
\ No newline at end of file
+    rank = Column(String)  ## position inside the status column, see ranking.py
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"))
+    project = relationship("Project", back_populates="tasks")
+
+    __table_args__ = (
+        ## keyset pagination of a project's tasks, optionally filtered by status
+        Index("ix_tasks_project_id_id", "project_id", "id"),
+        Index("ix_tasks_project_status_id", "project_id", "status", "id"),
+        ## columns read in board order, and the neighbours of a moved task
+        Index("ix_tasks_project_status_rank", "project_id", "status", "rank"),
+    )
+
+class ChangeLog(Base):
+    """
+    Append-only log of changes to projects, tasks and memberships, read by /sync.
+    Rows outlive what they describe (deletions are tombstones), so there are no foreign keys.
+    """
+    __tablename__ = "change_log"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)  ## doubles as the sync cursor, see changelog.CHANGE_LOG_LOCK
+    project_id = Column(Integer, nullable=False)
+    entity = Column(String, nullable=False)  ## "project", "task" or "member"
+    entity_id = Column(Integer, nullable=False)  ## project, task or user id
+    op = Column(String, nullable=False)  ## "upsert" or "delete"
+    created_at = Column(Float, nullable=False, default=time.time)
+
+    __table_args__ = (
+        ## changes of a user's projects past a cursor, and the user's own membership changes
+        Index("ix_change_log_project_id_id", "project_id", "id"),
+        Index("ix_change_log_entity_entity_id_id", "entity", "entity_id", "id"),
+        Index("ix_change_log_created_at", "created_at"),
+        {"sqlite_autoincrement": True},
+    )
+
+## Loader options for everything schemas.projects.ProjectFull serializes,
+## so listings cost a fixed number of queries instead of two per project
+FULL_PROJECT_OPTIONS = (selectinload(Project.tasks), selectinload(Project.users))
@@ -0,0 +1,74 @@
+from typing import Iterable, List
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from changelog import MEMBER, PROJECT, UPSERT, changes_statement
+from events import event_hub
+from models import Project, Task
+from schemas.projects import ProjectSummary
+from schemas.tasks import TaskBase, TaskBatchResult
+
+## What a write to a project does besides the write itself, shared by the sync
+## (routers/projects.py) and async (routers/async_projects.py) routes: change log rows
+## for /sync and a version bump (ETags, cached JSON) in the write's transaction, then
+## once it is committed, an event for the project's subscribers (events.py).
+
+def touch_projects_statement(project_ids):
+    """Bump the version of changed projects (ids or a subquery), which invalidates their ETags and cached JSON"""
+    return (
+        update(Project)
+        .where(Project.id.in_(project_ids))
+        .values(version=Project.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+def project_write_statements(project_id: int, entity: str, entity_ids: Iterable[int], op: str = UPSERT) -> list:
+    """Change log rows for the changed entities plus the project's version bump"""
+    statements = [touch_projects_statement([project_id])]
+    changes = changes_statement(project_id, entity, entity_ids, op)
+    if changes is not None:
+        statements.insert(0, changes)
+    return statements
+
+def project_created_statements(project_id: int, user_id: int) -> list:
+    """Change log rows of a new project and of its first member, there is no version to bump yet"""
+    return [changes_statement(project_id, PROJECT, [project_id]), changes_statement(project_id, MEMBER, [user_id])]
+
+def record_project_write(db: Session, project_id: int, entity: str, entity_ids: Iterable[int], op: str = UPSERT) -> None:
+    for statement in project_write_statements(project_id, entity, entity_ids, op):
+        db.execute(statement)
+
+async def record_project_write_async(db: AsyncSession, project_id: int, entity: str, entity_ids: Iterable[int], op: str = UPSERT) -> None:
+    for statement in project_write_statements(project_id, entity, entity_ids, op):
+        await db.execute(statement)
+
+## Change events, published once the change is committed
+def task_payload(db_task: Task) -> dict:
+    return TaskBase.model_validate(db_task).model_dump(mode="json")
+
+def project_payload(db_project: Project) -> dict:
+    return ProjectSummary.model_validate(db_project).model_dump(mode="json")
+
+def batch_payload(results: List[TaskBatchResult]) -> list:
+    return [result.model_dump(mode="json", include={"op", "id"}) for result in results if result.ok]
+
+def publish_task(project_id: int, event_type: str, db_task: Task) -> None:
+    event_hub.publish(project_id, event_type, task=task_payload(db_task))
+
+def publish_task_deleted(project_id: int, task_id: int) -> None:
+    event_hub.publish(project_id, "task.deleted", task_id=task_id)
+
+def publish_batch(project_id: int, results: List[TaskBatchResult]) -> None:
+    event_hub.publish(project_id, "tasks.batch", changes=batch_payload(results))
+
+def publish_project_updated(db_project: Project) -> None:
+    event_hub.publish(db_project.id, "project.updated", project=project_payload(db_project))
+
+def publish_project_deleted(project_id: int) -> None:
+    event_hub.publish(project_id, "project.deleted")
+
+def publish_members(project_id: int, event_type: str, user_ids: Iterable[int]) -> None:
+    """members.added / members.removed"""
+    event_hub.publish(project_id, event_type, user_ids=list(user_ids))
@@ -0,0 +1,144 @@
+from typing import Dict, List, Optional
+
+from sqlalchemy import Select, bindparam, func, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from changelog import TASK, record_changes
+from models import Project, Task
+
+## Tasks are ordered inside a status column by `rank`, a string compared byte by byte and read
+## as a base 36 fraction ("i" is 0.5). There is always room for a rank between two others, so
+## moving a task only rewrites that task; a column is rebalanced when ranks grow too long.
+## Lowercase letters and digits sort the same way under any database collation.
+DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+BASE = len(DIGITS)
+FIRST_RANK = DIGITS[BASE // 2]
+
+def _midpoint(lower: str, upper: Optional[str]) -> str:
+    """A rank strictly between lower ("" is 0) and upper (None is 1), neither ending in "0" """
+    if upper is not None:
+        ## keep the shared prefix, lower is padded with zeros
+        n = 0
+        while n < len(upper) and (lower[n] if n < len(lower) else DIGITS[0]) == upper[n]:
+            n += 1
+        if n > 0:
+            return upper[:n] + _midpoint(lower[n:], upper[n:])
+    low = DIGITS.index(lower[0]) if lower else 0
+    high = DIGITS.index(upper[0]) if upper else BASE
+    if high - low > 1:
+        return DIGITS[(low + high) // 2]
+    ## consecutive digits
+    if upper and len(upper) > 1:
+        return upper[0]
+    return DIGITS[low] + _midpoint(lower[1:], None)
+
+## Appending or prepending steps by one unit in the fourth digit, so a column takes
+## millions of tasks at either end before its ranks get longer
+STEP_WIDTH = 4
+
+def _to_int(rank: str, width: int) -> int:
+    return int(rank.ljust(width, DIGITS[0]), BASE)
+
+def _from_int(value: int, width: int) -> str:
+    digits = []
+    for _ in range(width):
+        value, digit = divmod(value, BASE)
+        digits.append(DIGITS[digit])
+    return "".join(reversed(digits)).rstrip(DIGITS[0])
+
+def _step(rank: str, delta: int) -> Optional[str]:
+    """The rank `delta` units away from `rank`, or None when that falls outside (0, 1)"""
+    width = max(len(rank), STEP_WIDTH)
+    value = _to_int(rank, width) + delta
+    if 0 < value < BASE ** width:
+        return _from_int(value, width)
+    return None
+
+def rank_between(before: Optional[str], after: Optional[str]) -> str:
+    """A rank sorting after `before` and before `after`, None meaning the start or end of the column"""
+    if before is None and after is None:
+        return FIRST_RANK
+    if after is None:
+        return _step(before, 1) or before + DIGITS[1]
+    if before is None:
+        return _step(after, -1) or _midpoint("", after)
+    if before >= after:
+        raise ValueError(f"Rank {before!r} does not sort before {after!r}")
+    return _midpoint(before, after)
+
+def spread_ranks(count: int) -> List[str]:
+    """`count` increasing ranks, evenly spaced with room for BASE moves between neighbours"""
+    width = 1
+    while BASE ** width < (count + 1) * BASE:
+        width += 1
+    step = BASE ** width // (count + 1)
+    return [_from_int(position * step, width) for position in range(1, count + 1)]
+
+def last_rank_statement(project_id: int, status: str) -> Select:
+    """Highest rank of a column, read from the (project_id, status, rank) index"""
+    return select(func.max(Task.rank)).where(Task.project_id == project_id, Task.status == status)
+
+def last_ranks_statement(project_id: int) -> Select:
+    """(status, highest rank) of every column of a project"""
+    return (
+        select(Task.status, func.max(Task.rank))
+        .where(Task.project_id == project_id)
+        .group_by(Task.status)
+    )
+
+class ColumnEnds:
+    """Hands out ranks at the end of a project's columns, for many tasks at once"""
+
+    def __init__(self, last_ranks: Dict[str, Optional[str]]):
+        self.last_ranks = last_ranks
+
+    @classmethod
+    def load(cls, db: Session, project_id: int) -> "ColumnEnds":
+        return cls(dict(db.execute(last_ranks_statement(project_id)).all()))
+
+    def note_rank(self, status: str, rank: str) -> None:
+        """Account for a rank given to a task some other way"""
+        last = self.last_ranks.get(status)
+        if last is None or rank > last:
+            self.last_ranks[status] = rank
+
+    def next_rank(self, status: str) -> str:
+        rank = rank_between(self.last_ranks.get(status), None)
+        self.last_ranks[status] = rank
+        return rank
+
+## rows per change log INSERT, keeps big columns under the bound parameter limit
+REBALANCE_CHUNK_SIZE = 1000
+
+def rebalance_column(db: Session, project_id: int, status: str) -> None:
+    """
+    Rewrite the ranks of a whole column evenly spaced, keeping its order (tasks without a
+    rank go last). Logs the change of every task, the caller touches the project.
+    """
+    task_ids = db.scalars(
+        select(Task.id)
+        .where(Task.project_id == project_id, Task.status == status)
+        .order_by(Task.rank.is_(None), Task.rank, Task.id)
+    ).all()
+    if not task_ids:
+        return
+    tasks = Task.__table__
+    db.execute(
+        update(tasks).where(tasks.c.id == bindparam("task_id")).values(rank=bindparam("new_rank")),
+        [{"task_id": task_id, "new_rank": rank} for task_id, rank in zip(task_ids, spread_ranks(len(task_ids)))],
+    )
+    for start in range(0, len(task_ids), REBALANCE_CHUNK_SIZE):
+        record_changes(db, project_id, TASK, task_ids[start:start + REBALANCE_CHUNK_SIZE])
+
+def rank_unranked_tasks(engine: Engine) -> None:
+    """Give ranks to tasks created before ranks existed, rebalancing the columns they are in"""
+    with Session(engine) as db:
+        columns = db.execute(select(Task.project_id, Task.status).where(Task.rank.is_(None)).distinct()).all()
+        if not columns:
+            return
+        for project_id, status in columns:
+            rebalance_column(db, project_id, status)
+        project_ids = {project_id for project_id, _ in columns}
+        db.execute(update(Project).where(Project.id.in_(project_ids)).values(version=Project.version + 1))
+        db.commit()
@@ -0,0 +1,205 @@
+import math
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from starlette.requests import HTTPConnection
+
+from config import settings
+from events import load_backend
+
+## Token buckets: a key may make `burst` requests at once, then `rate` per second.
+## Every request takes a token from the bucket of its client IP, of its user (when it
+## carries a valid token) and, for routes with their own limit, of that route; a request
+## that is refused by one bucket takes nothing from the others.
+
+class Limit(NamedTuple):
+    rate: float  ## tokens added per second
+    burst: int  ## bucket size
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+LIMIT_PATTERN = re.compile(r"^\s*(\d+)\s*/\s*(second|minute|hour|day)\s*$")
+
+def parse_limit(value: str) -> Limit:
+    """Read a limit written like "10/minute": up to 10 at once, then one every 6 seconds"""
+    match = LIMIT_PATTERN.match(value)
+    if match is None:
+        raise ValueError(f"Invalid rate limit {value!r}, expected e.g. '10/minute'")
+    count = int(match.group(1))
+    return Limit(rate=count / PERIODS[match.group(2)], burst=count)
+
+
+Bucket = Tuple[Tuple, Limit]  ## (key, limit)
+
+def refill(tokens: float, updated_at: float, limit: Limit, now: float) -> float:
+    return min(limit.burst, tokens + max(0.0, now - updated_at) * limit.rate)
+
+def wait_for_tokens(tokens: Sequence[float], limits: Sequence[Limit]) -> float:
+    """0 when every bucket has a token, otherwise the seconds until they all have one"""
+    return max(((1 - count) / limit.rate for count, limit in zip(tokens, limits) if count < 1), default=0.0)
+
+
+class RateLimitBackend(ABC):
+    """
+    Where buckets live. `take` is called once per request with all of its buckets;
+    a backend shared by all workers makes limits apply across them.
+    """
+
+    ## take does I/O, requests call it from the threadpool instead of the event loop
+    blocking = False
+
+    @abstractmethod
+    def take(self, buckets: Sequence[Bucket], now: float) -> float:
+        """
+        Take a token from every bucket, or from none of them when one is empty:
+        0 when allowed, otherwise the seconds until every bucket has a token
+        """
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """
+    Buckets of this worker only. A take is a dict lookup; full buckets (clients that
+    stopped sending) are swept out every `sweep_interval` seconds.
+    """
+
+    def __init__(self, sweep_interval: Optional[float] = None):
+        self.buckets: Dict[Tuple, List[float]] = {}  ## key -> [tokens, updated at, seconds to fill]
+        self.lock = threading.Lock()
+        self.sweep_interval = settings.rate_limit_sweep_interval if sweep_interval is None else sweep_interval
+        self.next_sweep = time.monotonic() + self.sweep_interval
+
+    def take(self, buckets: Sequence[Bucket], now: float) -> float:
+        with self.lock:
+            if now >= self.next_sweep:
+                self.sweep(now)
+            states = []
+            for key, limit in buckets:
+                state = self.buckets.get(key)
+                if state is None:
+                    state = self.buckets[key] = [float(limit.burst), now, limit.burst / limit.rate]
+                else:
+                    state[0] = refill(state[0], state[1], limit, now)
+                    state[1] = now
+                states.append(state)
+            wait = wait_for_tokens([state[0] for state in states], [limit for _, limit in buckets])
+            if not wait:
+                for state in states:
+                    state[0] -= 1
+            return wait
+
+    def sweep(self, now: float) -> None:
+        """Drop buckets that have refilled, they are the same as no bucket"""
+        self.buckets = {
+            key: bucket for key, bucket in self.buckets.items()
+            if now - bucket[1] < bucket[2]
+        }
+        self.next_sweep = now + self.sweep_interval
+
+    def stats(self) -> dict:
+        return {"buckets": len(self.buckets)}
+
+
+class SharedRateLimitBackend(RateLimitBackend):
+    """
+    Buckets kept in the shared state (shared.py), so the limits hold across every worker.
+    A request's buckets are read and taken from in one atomic update, bucket keys expire
+    once the bucket is full again.
+    """
+
+    blocking = True
+
+    def __init__(self):
+        from shared import shared_state
+
+        self.state = shared_state
+
+    def take(self, buckets: Sequence[Bucket], now: float) -> float:
+        keys = ["ratelimit:" + ":".join(map(str, key)) for key, _ in buckets]
+        limits = [limit for _, limit in buckets]
+        wait = 0.0
+
+        def take_tokens(values: List[Optional[List[float]]]) -> List[List[float]]:
+            ## [tokens, updated at]; time.monotonic() is the same clock in every process of the host
+            nonlocal wait
+            tokens = [
+                float(limit.burst) if value is None else refill(value[0], value[1], limit, now)
+                for value, limit in zip(values, limits)
+            ]
+            wait = wait_for_tokens(tokens, limits)
+            if not wait:
+                tokens = [count - 1 for count in tokens]
+            return [[count, now] for count in tokens]
+
+        self.state.update_many(keys, take_tokens, [limit.burst / limit.rate for limit in limits])
+        return wait
+
+
+class RateLimiter:
+    def __init__(self, backend: RateLimitBackend):
+        self.backend = backend
+        self.ip_limit = parse_limit(settings.rate_limit_ip)
+        self.user_limit = parse_limit(settings.rate_limit_user)
+        self.route_limits = {route: parse_limit(value) for route, value in settings.rate_limit_routes.items()}
+        self.rejected = 0
+
+    def buckets(self, ip: str, user_id: Optional[int], route: Optional[str]) -> Iterator[Bucket]:
+        yield ("ip", ip), self.ip_limit
+        if user_id is not None:
+            yield ("user", user_id), self.user_limit
+        route_limit = self.route_limits.get(route) if route is not None else None
+        if route_limit is not None:
+            client = ("user", user_id) if user_id is not None else ("ip", ip)
+            yield ("route", route, *client), route_limit
+
+    def check(self, ip: str, user_id: Optional[int], route: Optional[str]) -> float:
+        """Take a token from each bucket the request falls in if they all have one, otherwise returns the wait"""
+        wait = self.backend.take(list(self.buckets(ip, user_id, route)), time.monotonic())
+        if wait:
+            self.rejected += 1
+        return wait
+
+    def stats(self) -> dict:
+        stats = {"rejected": self.rejected}
+        if hasattr(self.backend, "stats"):
+            stats.update(self.backend.stats())
+        return stats
+
+rate_limiter = RateLimiter(load_backend(settings.rate_limit_backend))
+
+
+def client_ip(connection: HTTPConnection) -> str:
+    """
+    The peer address, or behind `rate_limit_forwarded_hops` trusted proxies the X-Forwarded-For
+    entry the outermost one added. Entries further left come from the client and can be forged.
+    """
+    if settings.rate_limit_trust_forwarded:
+        forwarded = [entry.strip() for entry in ",".join(connection.headers.getlist("x-forwarded-for")).split(",")]
+        forwarded = [entry for entry in forwarded if entry]
+        hops = max(1, settings.rate_limit_forwarded_hops)
+        if len(forwarded) >= hops:
+            return forwarded[-hops]
+    return connection.client.host if connection.client else "unknown"
+
+async def rate_limit(connection: HTTPConnection) -> None:
+    """App-wide dependency: 429 with Retry-After once one of the request's buckets is empty"""
+    from routers.auth import request_user_id
+
+    if connection.scope["type"] != "http":
+        return
+    route = connection.scope.get("route")
+    route_key = f"{connection.scope['method']} {route.path}" if route is not None else None
+    check = (client_ip(connection), request_user_id(connection), route_key)
+    if rate_limiter.backend.blocking:
+        wait = await run_in_threadpool(rate_limiter.check, *check)
+    else:
+        wait = rate_limiter.check(*check)
+    if wait:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests",
+            headers={"Retry-After": str(max(1, math.ceil(wait)))},
+        )
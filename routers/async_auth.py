@@ -0,0 +1,68 @@
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import async_db_dependency
+from serialization import FastJSONRoute
+import models
+
+import schemas.users as user_schemas
+from logs import set_user_id
+from routers.auth import (
+    cache_principal,
+    decode_jwt_token,
+    get_already_logged_in,
+    get_cached_principal,
+    issue_access_token,
+    read_access_token,
+    verify_user_password,
+)
+
+router = APIRouter(prefix="/auth", tags=["auth"], route_class=FastJSONRoute)
+
+async def get_principal_from_jwt(request: Request, db: AsyncSession) -> user_schemas.UserBase:
+    """Async version of routers.auth.get_principal_from_jwt, sharing the same principal cache"""
+
+    get_token = read_access_token(request)
+
+    principal = get_cached_principal(get_token)
+    if principal is not None:
+        set_user_id(principal.id)
+        return principal
+
+    try:
+        claims = decode_jwt_token(get_token)  ## verifying token validity
+
+        db_user = await db.get(models.User, int(claims["sub"]))
+        if db_user is None:
+            raise HTTPException(
+                status_code=401,
+                detail="Could not verify credentials"
+            )
+    except HTTPException:
+        request.cookies.clear() ## removing invalid auth cookie
+        raise
+
+    set_user_id(db_user.id)
+    return cache_principal(get_token, claims, db_user)
+
+@router.post("/login")
+async def login(user_data: user_schemas.UserLogin, request: Request, response: Response, db: async_db_dependency):
+    """Login and receive JWT token in cookie"""
+
+    ## check if access token already exists
+    already_logged_in = get_already_logged_in(request)
+    if already_logged_in is not None:
+        return already_logged_in
+
+    ## check if user exists
+    db_user = (await db.execute(select(models.User).where(models.User.email == user_data.email))).scalars().first()
+    if db_user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect email or password"
+        )
+
+    await verify_user_password(db_user, user_data.password)
+
+    return issue_access_token(response, db_user)
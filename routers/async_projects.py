@@ -0,0 +1,350 @@
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response
+from typing import Annotated, List, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from changelog import DELETE, MEMBER, PROJECT, TASK
+from database import async_db_dependency
+from project_writes import (
+    project_created_statements,
+    publish_members,
+    publish_project_deleted,
+    publish_project_updated,
+    publish_task,
+    publish_task_deleted,
+    record_project_write_async,
+)
+from ranking import last_rank_statement, rank_between
+from serialization import FastJSONRoute, render_json
+
+from schemas.tasks import TaskBase, TaskCreate, TaskUpdate, TaskStatus
+from schemas.projects import ProjectCreate, ProjectUpdate, ProjectAddUser, ProjectRemoveUsers, ProjectFull, ProjectSummary
+from schemas.users import UserBase
+from schemas.projects_tasks import ProjectTaskBase
+
+from models import Project, Task, User, project_user, FULL_PROJECT_OPTIONS
+from routers.async_auth import get_principal_from_jwt
+from routers.projects import (
+    add_members_statement,
+    after_query,
+    check_keeps_a_member,
+    check_project_access,
+    delete_projects,
+    etag_matches,
+    is_member_clause,
+    json_response,
+    limit_query,
+    make_etag,
+    not_modified,
+    project_access_statement,
+    project_page_type,
+    project_tasks_statement,
+    project_users_statement,
+    project_version_statement,
+    projects_by_ids_statement,
+    remaining_members_statement,
+    response_cache,
+    split_page,
+    tasks_etag,
+    user_project_versions_statement,
+    versions_digest,
+)
+
+## Async versions of the routes in routers/projects.py.
+## Relationships can't be lazy loaded on an AsyncSession, so everything a
+## response model serializes is loaded up front with selectinload.
+
+async def is_project_member(project_id: int, user_id: int, db: AsyncSession) -> bool:
+    """Whether a user belongs to a project"""
+    return bool(await db.scalar(select(is_member_clause(project_id, user_id))))
+
+async def get_project_by_id_for_user(user: UserBase, project_id: int, db: AsyncSession, *options) -> Project:
+    """Get a project by ID and verify user has access"""
+    row = (await db.execute(project_access_statement(project_id, user.id, *options))).first()
+    return check_project_access(row)
+
+async def get_project_member(project_id: int, request: Request, db: async_db_dependency) -> UserBase:
+    """Authorization dependency: the authenticated user, after checking they belong to the project"""
+    user = await get_principal_from_jwt(request, db)
+    await get_project_by_id_for_user(user, project_id, db)
+    return user
+
+project_member_dependency = Annotated[UserBase, Depends(get_project_member)]
+
+async def get_task_by_id_for_project(project_id: int, task_id: int, db: AsyncSession) -> Task:
+    """
+    Get a task by ID within a project
+    Supposes the user has already been verified to have access to the project
+    """
+    db_task = (
+        await db.execute(select(Task).where(Task.id == task_id, Task.project_id == project_id))
+    ).scalars().first()
+    if db_task is None:
+        raise HTTPException(status_code=404, detail="Task not found in the specified project")
+    return db_task
+
+async def load_full_project(project_id: int, db: AsyncSession) -> Project:
+    """(Re)load a project with everything ProjectFull serializes"""
+    return (
+        await db.execute(
+            select(Project)
+            .where(Project.id == project_id)
+            .options(*FULL_PROJECT_OPTIONS)
+            .execution_options(populate_existing=True)
+        )
+    ).scalars().one()
+
+router = APIRouter(prefix="/projects", tags=["projects"], route_class=FastJSONRoute)
+
+@router.get("/", response_model=List[ProjectFull] | List[ProjectSummary], tags=["projects", "me"])
+async def get_projects(
+    db: async_db_dependency,
+    request: Request,
+    limit: limit_query = None,
+    after: after_query = None,
+    compact: Annotated[bool, Query(description="Leave out embedded tasks and users")] = False,
+):
+    """Get a user's projects"""
+
+    user = await get_principal_from_jwt(request, db)
+
+    ## the page's ids and versions decide whether anything changed
+    rows, next_cursor = split_page((await db.execute(user_project_versions_statement(user.id, limit, after))).all(), limit)
+    digest = versions_digest(rows)
+    etag = make_etag("projects", "compact" if compact else "full", digest)
+    if etag_matches(request, etag):
+        return not_modified(etag, next_cursor)
+
+    cache_key = ("projects", compact, digest)
+    content = response_cache.get(cache_key)
+    if content is None:
+        ## fetching projects for the user
+        projects = (await db.scalars(projects_by_ids_statement([row.id for row in rows], compact))).all()
+        content = render_json(project_page_type(compact), projects)
+        response_cache.set(cache_key, content, tags=[("project", row.id) for row in rows])
+    return json_response(content, etag, next_cursor)
+
+
+@router.get("/{project_id}", response_model=ProjectFull)
+async def get_project(project_id: int, request: Request, db: async_db_dependency):
+    """Get a project by ID"""
+
+    user = await get_principal_from_jwt(request, db)
+    project = await get_project_by_id_for_user(user, project_id, db)
+
+    etag = make_etag("project", project_id, project.version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    cache_key = ("project", project_id, project.version)
+    content = response_cache.get(cache_key)
+    if content is None:
+        content = render_json(ProjectFull, await load_full_project(project_id, db))
+        response_cache.set(cache_key, content, tags=[("project", project_id)])
+    return json_response(content, etag)
+
+@router.get("/{project_id}/users", response_model=List[UserBase], tags=["users", "projects"])
+async def get_project_users(project_id: int, user: project_member_dependency, db: async_db_dependency):
+    """Get users from a specified project"""
+
+    return (await db.scalars(project_users_statement(project_id))).all()
+
+
+@router.get("/{project_id}/tasks/{task_id}", response_model=TaskBase, tags=["tasks"])
+async def get_project_task(project_id: int, task_id: int, db: async_db_dependency, user: project_member_dependency):
+    """Get a specific task from a specified project"""
+
+    db_task = await get_task_by_id_for_project(project_id, task_id, db)
+
+    return db_task
+
+@router.get("/{project_id}/users/{user_id}", response_model=UserBase, tags=["users"])
+async def get_project_user(project_id: int, user_id: int, db: async_db_dependency, user: project_member_dependency):
+    """Get a specific user from a specified project"""
+
+    db_user = (await db.scalars(project_users_statement(project_id).where(User.id == user_id))).first()
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="User not found in the specified project")
+    return db_user
+
+@router.get("/{project_id}/tasks", response_model=List[TaskBase], tags=["tasks", "projects"])
+async def get_project_tasks(
+    project_id: int,
+    user: project_member_dependency,
+    request: Request,
+    db: async_db_dependency,
+    limit: limit_query = None,
+    after: after_query = None,
+    status: Optional[TaskStatus] = None,
+):
+    """Get tasks from a specified project"""
+
+    version = await db.scalar(project_version_statement(project_id))
+    etag = tasks_etag(project_id, version, limit, after, status)
+    cache_key = ("tasks", project_id, version, limit, after, status)
+    cached = response_cache.get(cache_key)
+    if etag_matches(request, etag):
+        if cached is not None:
+            return not_modified(etag, cached[1])
+        ids = (await db.execute(project_tasks_statement(project_id, limit, after, status).with_only_columns(Task.id))).all()
+        return not_modified(etag, split_page(ids, limit)[1])
+
+    if cached is None:
+        db_tasks, next_cursor = split_page((await db.scalars(project_tasks_statement(project_id, limit, after, status))).all(), limit)
+        cached = (render_json(List[TaskBase], db_tasks), next_cursor)
+        response_cache.set(cache_key, cached, tags=[("project", project_id)])
+    content, next_cursor = cached
+    return json_response(content, etag, next_cursor)
+
+@router.post("/", response_model=ProjectCreate)
+async def create_project(project: ProjectCreate, request: Request, db: async_db_dependency):
+    """Create a new project"""
+
+    user = await get_principal_from_jwt(request, db)
+    db_user = await db.get(User, user.id)
+    if db_user is None:
+        raise HTTPException(status_code=401, detail="Could not verify credentials")
+
+    db_project = Project(
+        name=project.name,
+        description=project.description,
+        tasks=[]
+    )
+
+    db_project.users.append(db_user)
+
+    db.add(db_project)
+    await db.flush()
+    for statement in project_created_statements(db_project.id, db_user.id):
+        await db.execute(statement)
+    await db.commit()
+
+    return db_project
+
+
+@router.post("/{project_id}/tasks", response_model=ProjectTaskBase, tags=["tasks"])
+async def create_project_task(project_id: int, task: TaskCreate, db: async_db_dependency, user: project_member_dependency):
+    """Create a new task in a specified project"""
+
+    db_task = Task(
+        title=task.title,
+        description=task.description,
+        status=task.status,
+        rank=rank_between(await db.scalar(last_rank_statement(project_id, task.status.value)), None),
+        project_id=project_id
+    )
+
+    db.add(db_task)
+    await db.flush()
+    await record_project_write_async(db, project_id, TASK, [db_task.id])
+    await db.commit()
+
+    ## the response embeds the whole project
+    task_id = db_task.id
+    db.expire_all()
+    db_task = (
+        await db.execute(
+            select(Task)
+            .where(Task.id == task_id)
+            .options(selectinload(Task.project).options(*FULL_PROJECT_OPTIONS))
+        )
+    ).scalars().one()
+    publish_task(project_id, "task.created", db_task)
+    return db_task
+
+@router.post("/{project_id}/users", response_model=ProjectFull, tags=["users"])
+async def add_project_user(project_id: int, user_data: ProjectAddUser, db: async_db_dependency, user: project_member_dependency):
+    """Add a user to a specified project using their email address"""
+
+    db_user = (await db.execute(select(User).where(User.email == user_data.user_email))).scalars().first()
+
+    if not db_user:
+        raise HTTPException(status_code=404, detail="User with the specified email not found")
+
+    if not (await db.scalars(add_members_statement(db.get_bind().dialect.name, project_id, [db_user.id]))).all():
+        raise HTTPException(status_code=400, detail="User is already a member of the project")
+
+    await record_project_write_async(db, project_id, MEMBER, [db_user.id])
+
+    await db.commit()
+    publish_members(project_id, "members.added", [db_user.id])
+    return await load_full_project(project_id, db)
+
+@router.delete("/{project_id}/users/{user_id}", response_model=ProjectRemoveUsers, tags=["users"])
+async def remove_user_from_project(project_id: int, user_id: int, db: async_db_dependency, user: project_member_dependency):
+    """Remove a user from a specified project using their ID"""
+
+    if not await is_project_member(project_id, user_id, db):
+        raise HTTPException(status_code=404, detail="User not found in the specified project")
+    check_keeps_a_member(await db.scalar(remaining_members_statement(project_id, [user_id])))
+
+    await db.execute(
+        delete(project_user).where(project_user.c.project_id == project_id, project_user.c.user_id == user_id)
+    )
+    await record_project_write_async(db, project_id, MEMBER, [user_id], DELETE)
+    await db.commit()
+    publish_members(project_id, "members.removed", [user_id])
+    return ProjectRemoveUsers(user_ids=[user_id])
+
+@router.put("/{project_id}/tasks/{task_id}", response_model=TaskUpdate, tags=["tasks"])
+async def update_project_task(project_id: int, task_id: int, task: TaskUpdate, db: async_db_dependency, user: project_member_dependency):
+    """Update a task in a specified project"""
+    db_task = await get_task_by_id_for_project(project_id, task_id, db)
+
+    if task.title is not None:
+        db_task.title = task.title
+    if task.description is not None:
+        db_task.description = task.description
+    if task.status is not None and task.status.value != db_task.status:
+        db_task.status = task.status.value
+        db_task.rank = rank_between(await db.scalar(last_rank_statement(project_id, task.status.value)), None)
+
+    await record_project_write_async(db, project_id, TASK, [task_id])
+    await db.commit()
+    publish_task(project_id, "task.updated", db_task)
+    return db_task
+
+@router.put("/{project_id}", response_model=ProjectUpdate)
+async def update_project(project_id: int, project: ProjectUpdate, db: async_db_dependency, request: Request):
+    """Update a project by ID"""
+    user = await get_principal_from_jwt(request, db)
+
+    db_project = await get_project_by_id_for_user(user, project_id, db)
+
+    if project.name is not None:
+        db_project.name = project.name
+    if project.description is not None:
+        db_project.description = project.description
+
+    await record_project_write_async(db, project_id, PROJECT, [project_id])
+    await db.commit()
+    publish_project_updated(db_project)
+    return db_project
+
+@router.delete("/{project_id}", tags=["projects"])
+async def delete_project(project_id: int, db: async_db_dependency, user: project_member_dependency, response: Response, background_tasks: BackgroundTasks):
+    """Delete a project by ID"""
+
+    ## Remove tasks and user associations along with the project
+    scheduled = await db.run_sync(delete_projects, [project_id], background_tasks)
+    await db.commit()
+    publish_project_deleted(project_id)
+
+    if scheduled:
+        response.status_code = 202
+        return {"detail": "Project deletion scheduled"}
+    return {"detail": "Project deleted successfully"}
+
+@router.delete("/{project_id}/tasks/{task_id}" , tags=["tasks"])
+async def delete_project_task(project_id: int, task_id: int, db: async_db_dependency, user: project_member_dependency):
+    """Delete a task from a specified project"""
+    db_task = await get_task_by_id_for_project(project_id, task_id, db)
+
+    await db.delete(db_task)
+    await record_project_write_async(db, project_id, TASK, [task_id], DELETE)
+
+    await db.commit()
+    publish_task_deleted(project_id, task_id)
+    return {"detail": "Task deleted successfully"}
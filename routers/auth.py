@@ -1,21 +1,71 @@
 import os
+import hashlib
+import time
+from typing import NamedTuple
 
 from fastapi import APIRouter, Depends, HTTPException, Request, status, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from starlette.requests import HTTPConnection
 from database import db_dependency
-from jose import JWTError, jwt
+from serialization import FastJSONRoute
 from datetime import datetime, timedelta, timezone
 import models
 
 import schemas.users as user_schemas
+from cache import TTLCache
+from config import settings
+from hashing import hash_password_async
+from logs import set_user_id
+from shared import shared_state
 
-from pyargon2 import hash
-
-router = APIRouter(prefix="/auth", tags=["auth"])
+router = APIRouter(prefix="/auth", tags=["auth"], route_class=FastJSONRoute)
 
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 1440  # 24 hours
 
+class Principal(NamedTuple):
+    """Decoded JWT claims plus the user they resolved to"""
+    claims: dict
+    user: user_schemas.UserBase
+
+## verified tokens, keyed by token hash and tagged with ("user", user_id)
+principal_cache = TTLCache(maxsize=settings.principal_cache_size, ttl=settings.principal_cache_ttl)
+
+def _token_cache_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+## every worker has its own cache, invalidations are published to all of them through the
+## shared state: "token:<token hash>" or "user:<user id>"
+INVALIDATIONS_CHANNEL = "principals"
+
+def apply_invalidation(message: str) -> None:
+    kind, _, value = message.partition(":")
+    if kind == "token":
+        principal_cache.invalidate(value)
+    elif kind == "user":
+        principal_cache.invalidate_tag(("user", int(value)))
+
+def subscribe_invalidations() -> None:
+    shared_state.subscribe(INVALIDATIONS_CHANNEL, apply_invalidation)
+
+def unsubscribe_invalidations() -> None:
+    shared_state.unsubscribe(INVALIDATIONS_CHANNEL, apply_invalidation)
+
+def publish_invalidation(message: str) -> None:
+    ## this worker forgets right away, the others when the message reaches them
+    apply_invalidation(message)
+    shared_state.publish(INVALIDATIONS_CHANNEL, message)
+
+def invalidate_token(token: str) -> None:
+    """Forget a cached token in every worker, e.g. on logout. Writes to the shared state, keep it off the event loop"""
+    publish_invalidation(f"token:{_token_cache_key(token)}")
+
+def invalidate_user_principals(user_id: int) -> None:
+    """Forget every cached token of a user in every worker, e.g. when the user is deleted. Writes to the shared state, keep it off the event loop"""
+    publish_invalidation(f"user:{user_id}")
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None): 
     """Create a JWT token"""
 
@@ -26,72 +76,135 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
         expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
     to_encode.update({"iat": datetime.now(timezone.utc)})
+    from jose import jwt  ## imported on first use, it pulls in the cryptography backends
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_jwt_token(token: str):
-    """Verify and decode a JWT token"""
-    
+def decode_jwt_token(token: str) -> dict:
+    """Verify a JWT token and return its claims"""
+    from jose import JWTError, jwt
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("sub")
-        if user_id is None:
+        if payload.get("sub") is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Could not validate credentials",
             )
-        return user_id
-    
+        return payload
+
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
         )
+
+def verify_jwt_token(token: str):
+    """Verify and decode a JWT token"""
     
-def get_user_from_jwt(request: Request, db: db_dependency) -> models.User :
-    """Helper function to check for valid JWT token in cookies"""
+    return decode_jwt_token(token)["sub"]
+
+def read_access_token(request: Request) -> str:
+    """Get the JWT from the auth cookie, 401 if there is none"""
 
     get_token = request.cookies.get("access_token")
-    
-    if not get_token or get_token is None:
+
+    if not get_token:
         raise HTTPException(
             status_code=401,
             detail="Not logged in"
         )
+    return get_token
+
+def get_cached_principal(token: str) -> user_schemas.UserBase | None:
+    """Return the principal of an already verified token, if still cached"""
+
+    principal: Principal | None = principal_cache.get(_token_cache_key(token))
+    return principal.user if principal is not None else None
+
+def request_user_id(connection: HTTPConnection) -> int | None:
+    """User id of the request's JWT, without touching the database; None for anonymous or invalid tokens"""
+
+    token = connection.cookies.get("access_token")
+    if not token:
+        return None
+    principal = get_cached_principal(token)
+    if principal is not None:
+        return principal.id
     try:
-        user_id: str = verify_jwt_token(get_token)  ## verifying token validity
+        return int(decode_jwt_token(token)["sub"])
+    except (HTTPException, ValueError):
+        return None
 
-        db_user = db.query(models.User).filter(models.User.id == int(user_id)).first()
+def cache_principal(token: str, claims: dict, db_user: models.User) -> user_schemas.UserBase:
+    """Remember a verified token and return its principal"""
+
+    principal = Principal(claims=claims, user=user_schemas.UserBase.model_validate(db_user))
+    ## never cache a token past its own expiry
+    principal_cache.set(
+        _token_cache_key(token),
+        principal,
+        ttl=claims["exp"] - time.time() if "exp" in claims else None,
+        tags=[("user", principal.user.id)],
+    )
+    return principal.user
+
+def get_principal_from_jwt(request: Request, db: db_dependency) -> user_schemas.UserBase:
+    """
+    Check for a valid JWT token in cookies and return the authenticated user.
+    Verified tokens are cached, so repeated requests skip the decode and the DB lookup.
+    """
+
+    get_token = read_access_token(request)
+
+    principal = get_cached_principal(get_token)
+    if principal is not None:
+        set_user_id(principal.id)
+        return principal
+
+    try:
+        claims = decode_jwt_token(get_token)  ## verifying token validity
+
+        db_user = db.query(models.User).filter(models.User.id == int(claims["sub"])).first()
         if db_user is None:
-            request.cookies.clear() ## removing invalid auth cookie
             raise HTTPException(
                 status_code=401,
                 detail="Could not verify credentials"
             )
-        return db_user
     except HTTPException:
         request.cookies.clear() ## removing invalid auth cookie
         raise
 
-def verify_user_password(user_id: int, password: str, db: db_dependency) -> None:
-    """Verify user's password"""
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+    set_user_id(db_user.id)
+    return cache_principal(get_token, claims, db_user)
+
+def get_user_from_jwt(request: Request, db: db_dependency) -> models.User :
+    """Helper function to check for valid JWT token in cookies, returns the user's DB row"""
+
+    principal = get_principal_from_jwt(request, db)
+
+    db_user = db.get(models.User, principal.id)
     if db_user is None:
+        invalidate_user_principals(principal.id)
+        request.cookies.clear() ## removing invalid auth cookie
         raise HTTPException(
             status_code=401,
-            detail="Could not verify credentials")
-    
-    hashed_password = hash(password=password, salt=str(getattr(db_user,"password_salt")), variant="id")
+            detail="Could not verify credentials"
+        )
+    return db_user
+
+async def verify_user_password(db_user: models.User, password: str) -> None:
+    """Verify user's password, hashing on the hashing pool without holding a thread"""
+
+    hashed_password = await hash_password_async(password, str(getattr(db_user, "password_salt")))
     if hashed_password != db_user.password_hash:
         raise HTTPException(
             status_code=401,
             detail="Could not verify credentials")
 
-@router.post("/login")
-def login(user_data: user_schemas.UserLogin, request: Request, response: Response, db: db_dependency):
-    """Login and receive JWT token in cookie"""
+def get_already_logged_in(request: Request) -> dict | None:
+    """Login response for a request that already carries a valid token"""
 
-    ## check if access token already exists
     get_token = request.cookies.get("access_token")
     if get_token:
         try:
@@ -104,17 +217,11 @@ def login(user_data: user_schemas.UserLogin, request: Request, response: Respons
             }
         except HTTPException:
             request.cookies.clear() ## removing invalid auth cookie
+    return None
+
+def issue_access_token(response: Response, db_user: models.User) -> dict:
+    """Set the JWT cookie for a verified user and build the login response"""
 
-    ## check if user exists
-    db_user = db.query(models.User).filter(models.User.email == user_data.email).first()
-    if db_user is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect email or password"
-        )
-    
-    verify_user_password(getattr(db_user, "id"), user_data.password, db)
-    
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": str(db_user.id)},
@@ -140,3 +247,26 @@ def login(user_data: user_schemas.UserLogin, request: Request, response: Respons
         }
     }
 
+def find_user_by_email(db: Session, email: str) -> models.User | None:
+    return db.query(models.User).filter(models.User.email == email).first()
+
+@router.post("/login")
+async def login(user_data: user_schemas.UserLogin, request: Request, response: Response, db: db_dependency):
+    """Login and receive JWT token in cookie"""
+
+    ## check if access token already exists
+    already_logged_in = get_already_logged_in(request)
+    if already_logged_in is not None:
+        return already_logged_in
+
+    ## check if user exists
+    db_user = await run_in_threadpool(find_user_by_email, db, user_data.email)
+    if db_user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect email or password"
+        )
+    
+    await verify_user_password(db_user, user_data.password)
+
+    return issue_access_token(response, db_user)
@@ -0,0 +1,60 @@
+import asyncio
+
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, status
+
+from database import AsyncSessionLocal
+from events import event_hub
+
+router = APIRouter(prefix="/projects", tags=["projects", "events"])
+
+async def authorize_subscriber(websocket: WebSocket, project_id: int) -> int:
+    """Same access_token cookie and membership check as the HTTP routes, returns the user's id"""
+    ## the async routers are only imported when a socket connects or when they are enabled
+    from routers.async_auth import get_principal_from_jwt
+    from routers.async_projects import get_project_by_id_for_user
+
+    async with AsyncSessionLocal() as db:
+        user = await get_principal_from_jwt(websocket, db)
+        await get_project_by_id_for_user(user, project_id, db)
+    return user.id
+
+async def forward_events(websocket: WebSocket, subscription) -> None:
+    while (message := await subscription.get()) is not None:
+        await websocket.send_text(message)
+    if subscription.revoked:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="No longer a member of the project")
+        return
+    ## dropped for falling behind, the client should reload and reconnect
+    await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason="Too slow, events were dropped")
+
+async def wait_for_disconnect(websocket: WebSocket) -> None:
+    ## clients don't send anything, this only notices them leaving
+    while True:
+        await websocket.receive_text()
+
+@router.websocket("/{project_id}/events")
+async def project_events(websocket: WebSocket, project_id: int):
+    """Stream the task and membership changes of a project as JSON messages"""
+
+    try:
+        user_id = await authorize_subscriber(websocket, project_id)
+    except HTTPException as exc:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=str(exc.detail))
+        return
+
+    await websocket.accept()
+    subscription = event_hub.subscribe(project_id, user_id)
+    tasks = [
+        asyncio.create_task(forward_events(websocket, subscription)),
+        asyncio.create_task(wait_for_disconnect(websocket)),
+    ]
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        for task in done:
+            exc = task.exception()
+            if exc is not None and not isinstance(exc, WebSocketDisconnect):
+                raise exc
+    finally:
+        event_hub.unsubscribe(subscription)
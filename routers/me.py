@@ -1,24 +1,67 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response, Request
-from database import db_dependency
-from jose import JWTError, jwt
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Response, Request
+from database import db_dependency, read_db_dependency
+from serialization import FastJSONRoute
+from sqlalchemy.orm import selectinload
 import models
 
 from routers import auth
+from routers.projects import (
+    build_summary, etag_matches, json_response, make_etag, not_modified, response_cache,
+    status_counts_statement, user_project_versions_statement, versions_digest,
+)
+from routers.users import delete_user_cascade
+from serialization import render_json
+from project_writes import publish_members
 
+from schemas.board import DashboardSummary
 from schemas.users import UserBase
 from schemas.projects import ProjectBase
 from schemas.projects_users import ProjectUserBase
 
 
-router = APIRouter(prefix="/me", tags=["me"])
+router = APIRouter(prefix="/me", tags=["me"], route_class=FastJSONRoute)
 
 @router.get("/", response_model=ProjectUserBase, tags=["me", "users"])
-def get_me(request: Request, db: db_dependency):
+def get_me(request: Request, db: read_db_dependency):
     """Get current authenticated user"""
-    user = auth.get_user_from_jwt(request, db)
+    principal = auth.get_principal_from_jwt(request, db)
+
+    ## loading the user's projects with their tasks and members up front
+    user = (
+        db.query(models.User)
+        .options(selectinload(models.User.projects).options(*models.FULL_PROJECT_OPTIONS))
+        .filter(models.User.id == principal.id)
+        .first()
+    )
+    if user is None:
+        auth.invalidate_user_principals(principal.id)
+        raise HTTPException(
+            status_code=401,
+            detail="Could not verify credentials"
+        )
     return user
 
 
+@router.get("/summary", response_model=DashboardSummary, tags=["me", "tasks"])
+def get_summary(request: Request, db: read_db_dependency):
+    """Task counts per status over all of the current user's projects"""
+    user = auth.get_principal_from_jwt(request, db)
+
+    ## same versions as the project list, any change in any project invalidates the summary
+    digest = versions_digest(db.execute(user_project_versions_statement(user.id, None, None)).all())
+    etag = make_etag("summary", digest)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    cache_key = ("summary", digest)
+    content = response_cache.get(cache_key)
+    if content is None:
+        rows = db.execute(status_counts_statement(user.id)).all()
+        content = render_json(DashboardSummary, build_summary(rows))
+        response_cache.set(cache_key, content, tags=[("project", row.id) for row in rows])
+    return json_response(content, etag)
+
+
 @router.get("/logout", tags=["me", "auth"])
 def logout(request: Request,response: Response):
     """Logout by clearing the JWT cookie"""
@@ -30,28 +73,23 @@ def logout(request: Request,response: Response):
             detail="Not logged in"
         )
     
+    auth.invalidate_token(get_token)
     response.delete_cookie(key="access_token")
     return {"message": "Logout successful"}
 
 @router.delete("/delete-me", tags=["me", "auth", "users"])
-def delete_me(request: Request, db: db_dependency):
+def delete_me(request: Request, db: db_dependency, background_tasks: BackgroundTasks):
     """Delete current authenticated user"""
     
-    user = auth.get_user_from_jwt(request, db)
+    user = auth.get_principal_from_jwt(request, db)
 
     ## Remove user from all projects, delete projects with no users left
-    projects = user.projects[:]
-    for project in projects:
-        project.users.remove(user)
-        if len(project.users) == 0:
-            ## delete project if no users left
-            tasks = project.tasks[:]
-            for task in tasks:
-                db.delete(task)
-            db.delete(project)
-
-    db.delete(user)
+    user_id = user.id
+    left_projects = delete_user_cascade(db, user_id, background_tasks)
     db.commit()
+    auth.invalidate_user_principals(user_id)
+    for project_id in left_projects:
+        publish_members(project_id, "members.removed", [user_id])
     ## Logout user by clearing cookie
     request.cookies.clear()
     return {"message": "User deleted successfully"}
@@ -1,98 +1,609 @@
-from fastapi import APIRouter, HTTPException, Depends, Request
-from typing import List, Annotated
-
-from database import db_dependency
-
-from schemas.tasks import TaskBase, TaskCreate, TaskUpdate
-from schemas.projects import ProjectBase, ProjectCreate, ProjectUpdate, ProjectAddUser, ProjectRemoveUsers, ProjectFull
+import hashlib
+
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, Query, Request, Response
+from typing import List, Annotated, Optional
+
+from sqlalchemy import Insert, Select, delete, exists, func, insert, literal, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, aliased
+
+from cache import TTLCache
+from changelog import DELETE, MEMBER, PROJECT, TASK, UPSERT, project_deletion_statements, record_changes
+from config import settings
+from database import SessionLocal, db_dependency, read_db_dependency
+from events import event_hub
+from project_writes import (
+    project_created_statements,
+    publish_batch,
+    publish_members,
+    publish_project_deleted,
+    publish_project_updated,
+    publish_task,
+    publish_task_deleted,
+    record_project_write,
+)
+from ranking import ColumnEnds, last_rank_statement, rank_between, rebalance_column
+from serialization import FastJSONRoute, get_adapter, render_json
+
+from schemas.board import Board, BoardColumn, DashboardSummary, ProjectStatusCounts
+from schemas.tasks import TaskBase, TaskCreate, TaskUpdate, TaskStatus, TaskBatch, TaskBatchResult, TaskPosition
+from schemas.projects import ProjectBase, ProjectCreate, ProjectUpdate, ProjectAddUser, ProjectAddUsers, ProjectRemoveUsers, ProjectFull, ProjectSummary
 from schemas.users import UserBase
 from schemas.projects_users import ProjectUserBase
 from schemas.projects_tasks import ProjectTaskBase, ProjectTaskCreate
 
-from models import Project, Task, User
-from routers.auth import get_user_from_jwt
-   
-def get_project_by_id_for_user(user: UserBase, project_id: int, db: db_dependency) -> ProjectBase:
-    """Get a project by ID and verify user has access"""
-    db_project = db.query(Project).filter(Project.id == project_id).first()
-    if db_project is None:
+from models import Project, Task, User, project_user, FULL_PROJECT_OPTIONS
+from routers.auth import get_user_from_jwt, get_principal_from_jwt
+
+def is_member_clause(project_id, user_id):
+    """EXISTS over the project_user primary key, no member rows are loaded"""
+    return exists().where(project_user.c.project_id == project_id, project_user.c.user_id == user_id)
+
+def add_members_statement(dialect: str, project_id: int, user_ids) -> Insert:
+    """
+    One INSERT ... SELECT of the users who aren't members yet, returning the ids it added.
+    A concurrent add of the same user can pass the NOT EXISTS too, its row is skipped instead of failing the primary key.
+    """
+    members = select(literal(project_id), User.id).where(User.id.in_(user_ids), ~is_member_clause(project_id, User.id))
+    dialect_insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+    return (
+        dialect_insert(project_user)
+        .from_select(["project_id", "user_id"], members)
+        .on_conflict_do_nothing()
+        .returning(project_user.c.user_id)
+    )
+
+def project_access_statement(project_id: int, user_id: int, *options) -> Select:
+    """The project (if any) plus whether the user is a member of it, in one query"""
+    return (
+        select(Project, is_member_clause(Project.id, user_id).label("is_member"))
+        .where(Project.id == project_id)
+        .options(*options)
+    )
+
+def check_project_access(row) -> Project:
+    """Turn a project_access_statement row into the project, or a 404/403"""
+    if row is None:
         raise HTTPException(status_code=404, detail="Project not found")
-    if user not in db_project.users:
+    db_project, is_member = row
+    if not is_member:
         raise HTTPException(status_code=403, detail="Not authorized to access this project")
-    
     return db_project
 
-def get_task_by_id_for_project(project: ProjectBase, task_id: int, db: db_dependency) -> TaskBase:
+def is_project_member(project_id: int, user_id: int, db: db_dependency) -> bool:
+    """Whether a user belongs to a project"""
+    return bool(db.scalar(select(is_member_clause(project_id, user_id))))
+
+def get_project_by_id_for_user(user: UserBase, project_id: int, db: db_dependency, *options) -> ProjectBase:
+    """
+    Get a project by ID and verify user has access
+    Extra loader `options` are applied to the project query
+    """
+    row = db.execute(project_access_statement(project_id, user.id, *options)).first()
+    return check_project_access(row)
+
+def get_project_member(project_id: int, request: Request, db: db_dependency) -> UserBase:
+    """Authorization dependency: the authenticated user, after checking they belong to the project"""
+    user = get_principal_from_jwt(request, db)
+    get_project_by_id_for_user(user, project_id, db)
+    return user
+
+project_member_dependency = Annotated[UserBase, Depends(get_project_member)]
+
+def get_project_reader(project_id: int, request: Request, db: read_db_dependency) -> UserBase:
+    """get_project_member for routes that only read, checking on the route's own read session"""
+    return get_project_member(project_id, request, db)
+
+project_reader_dependency = Annotated[UserBase, Depends(get_project_reader)]
+
+def get_task_by_id_for_project(project_id: int, task_id: int, db: db_dependency) -> TaskBase:
     """
     Get a task by ID within a project
     Supposes the user has already been verified to have access to the project
     """
-    db_task = db.query(Task).filter(Task.id == task_id, Task.project_id == getattr(project, "id")).first()
+    db_task = db.query(Task).filter(Task.id == task_id, Task.project_id == project_id).first()
     if db_task is None:
         raise HTTPException(status_code=404, detail="Task not found in the specified project")
     return db_task
 
-router = APIRouter(prefix="/projects", tags=["projects"])
+def load_full_project(project_id: int, db: db_dependency) -> Project:
+    """(Re)load a project with everything ProjectFull serializes"""
+    return (
+        db.query(Project)
+        .options(*FULL_PROJECT_OPTIONS)
+        .execution_options(populate_existing=True)
+        .filter(Project.id == project_id)
+        .one()
+    )
+
+## Keyset pagination: pass the X-Next-Cursor header of a page as `after` to get the next one
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+limit_query = Annotated[Optional[int], Query(ge=1, le=settings.max_page_size, description="Page size, everything when unset")]
+after_query = Annotated[Optional[int], Query(description="Cursor returned by the previous page")]
+
+def paginate(stmt: Select, id_column, limit: Optional[int], after: Optional[int]) -> Select:
+    """Order by `id_column` and keep the rows after the cursor, one extra row tells if there is a next page"""
+    if after is not None:
+        stmt = stmt.where(id_column > after)
+    stmt = stmt.order_by(id_column)
+    if limit is not None:
+        stmt = stmt.limit(limit + 1)
+    return stmt
+
+def split_page(rows, limit: Optional[int]) -> tuple[list, Optional[str]]:
+    """Drop the look-ahead row, returns the page and the cursor of the next one (if any)"""
+    rows = list(rows)
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        return rows, str(rows[-1].id)
+    return rows, None
+
+def page_rows(rows, limit: Optional[int], response: Response) -> list:
+    """Drop the look-ahead row and advertise the cursor of the next page"""
+    rows, next_cursor = split_page(rows, limit)
+    if next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return rows
+
+def user_project_versions_statement(user_id: int, limit: Optional[int], after: Optional[int]) -> Select:
+    """(id, version) of a page of the projects a user is a member of, enough to build its ETag"""
+    stmt = (
+        select(Project.id, Project.version)
+        .join(project_user, project_user.c.project_id == Project.id)
+        .where(project_user.c.user_id == user_id)
+    )
+    return paginate(stmt, Project.id, limit, after)
+
+def projects_by_ids_statement(project_ids: List[int], compact: bool) -> Select:
+    """Projects by id, with what ProjectFull serializes unless compact"""
+    stmt = select(Project).where(Project.id.in_(project_ids)).order_by(Project.id)
+    if not compact:
+        stmt = stmt.options(*FULL_PROJECT_OPTIONS)
+    return stmt
+
+def project_version_statement(project_id: int) -> Select:
+    return select(Project.version).where(Project.id == project_id)
+
+def project_tasks_statement(project_id: int, limit: Optional[int], after: Optional[int], status: Optional[TaskStatus]) -> Select:
+    """Page of a project's tasks, optionally only those with the given status"""
+    stmt = select(Task).where(Task.project_id == project_id)
+    if status is not None:
+        stmt = stmt.where(Task.status == status.value)
+    return paginate(stmt, Task.id, limit, after)
+
+def tasks_etag(project_id: int, version: int, limit: Optional[int], after: Optional[int], status: Optional[TaskStatus]) -> str:
+    """Every page and filter of a project's tasks has its own ETag"""
+    return make_etag("tasks", project_id, version, limit or "all", after or 0, status.value if status is not None else "all")
+
+def board_statement(project_id: int, per_column: int) -> Select:
+    """
+    One windowed query for a whole board: the first `per_column` tasks of every status,
+    each row carrying the size of its column
+    """
+    position = func.row_number().over(partition_by=Task.status, order_by=(Task.rank, Task.id)).label("position")
+    column_size = func.count().over(partition_by=Task.status).label("column_size")
+    ranked = select(Task, position, column_size).where(Task.project_id == project_id).subquery()
+    ranked_task = aliased(Task, ranked)
+    return (
+        select(ranked_task, ranked.c.column_size)
+        .where(ranked.c.position <= per_column)
+        .order_by(ranked.c.status, ranked.c.position)
+    )
+
+def build_board(project_id: int, rows) -> Board:
+    """Board from board_statement rows, with empty columns for statuses that have no tasks"""
+    columns = {status: BoardColumn(status=status, count=0, tasks=[]) for status in TaskStatus}
+    for task, column_size in rows:
+        column = columns[TaskStatus(task.status)]
+        column.count = column_size
+        column.tasks.append(TaskBase.model_validate(task))
+    return Board(project_id=project_id, columns=list(columns.values()))
+
+def status_counts_statement(user_id: int) -> Select:
+    """(project id, name, status, task count) for every project of the user, one grouped query"""
+    return (
+        select(Project.id, Project.name, Task.status, func.count(Task.id).label("count"))
+        .join(project_user, (project_user.c.project_id == Project.id) & (project_user.c.user_id == user_id))
+        .outerjoin(Task, Task.project_id == Project.id)
+        .group_by(Project.id, Project.name, Task.status)
+        .order_by(Project.id)
+    )
+
+def build_summary(rows) -> DashboardSummary:
+    """DashboardSummary from status_counts_statement rows, every status present in every count"""
+    summary = DashboardSummary(total=0, counts=dict.fromkeys(TaskStatus, 0), projects=[])
+    projects = {}
+    for row in rows:
+        project = projects.get(row.id)
+        if project is None:
+            project = projects[row.id] = ProjectStatusCounts(
+                project_id=row.id, name=row.name, total=0, counts=dict.fromkeys(TaskStatus, 0),
+            )
+            summary.projects.append(project)
+        ## projects without tasks come back as a single row with no status
+        if row.status is None:
+            continue
+        status = TaskStatus(row.status)
+        project.counts[status] += row.count
+        project.total += row.count
+        summary.counts[status] += row.count
+        summary.total += row.count
+    return summary
+
+def project_users_statement(project_id: int) -> Select:
+    """Members of a project, through the project_user table"""
+    return select(User).join(project_user, project_user.c.user_id == User.id).where(project_user.c.project_id == project_id)
+
+def remaining_members_statement(project_id: int, user_ids) -> Select:
+    """How many members a project keeps once `user_ids` are removed"""
+    return select(func.count()).select_from(project_user).where(
+        project_user.c.project_id == project_id, project_user.c.user_id.not_in(user_ids)
+    )
+
+def check_keeps_a_member(remaining: int) -> None:
+    if remaining == 0:
+        raise HTTPException(status_code=400, detail="A project must keep at least one member, delete the project instead")
+
+def project_page_type(compact: bool):
+    """Compact pages only carry the project's own columns"""
+    return List[ProjectSummary] if compact else List[ProjectFull]
+
+## built at import time, not on the first request
+get_adapter(project_page_type(True))
+get_adapter(project_page_type(False))
+
+## Conditional reads: every mutation bumps Project.version, ETags are built from it,
+## and rendered JSON is cached under the version it was rendered for
+response_cache = TTLCache(maxsize=settings.response_cache_size, ttl=settings.response_cache_ttl)
+
+def make_etag(*parts) -> str:
+    return 'W/"' + "-".join(str(part) for part in parts) + '"'
+
+def versions_digest(rows) -> str:
+    """Short digest of (id, version) pairs"""
+    return hashlib.sha1(",".join(f"{row.id}:{row.version}" for row in rows).encode()).hexdigest()[:20]
 
-@router.get("/", response_model=List[ProjectFull], tags=["projects", "me"])
-def get_projects(db: db_dependency, request: Request):
+def etag_matches(request: Request, etag: str) -> bool:
+    """Weak comparison against If-None-Match"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag.removeprefix("W/") in {tag.strip().removeprefix("W/") for tag in header.split(",")}
+
+def read_headers(etag: str, next_cursor: Optional[str] = None) -> dict:
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if next_cursor is not None:
+        headers[NEXT_CURSOR_HEADER] = next_cursor
+    return headers
+
+def not_modified(etag: str, next_cursor: Optional[str] = None) -> Response:
+    return Response(status_code=304, headers=read_headers(etag, next_cursor))
+
+def json_response(content: bytes, etag: str, next_cursor: Optional[str] = None) -> Response:
+    return Response(content=content, media_type="application/json", headers=read_headers(etag, next_cursor))
+
+def apply_task_batch(db: Session, project_id: int, batch: TaskBatch) -> List[TaskBatchResult]:
+    """
+    Apply a batch of task operations with one statement per kind of operation.
+    Nothing is committed, ids that aren't tasks of the project are reported as failed items.
+    """
+    operation_count = len(batch.create) + len(batch.update) + len(batch.move) + len(batch.delete)
+    if operation_count > settings.max_batch_size:
+        raise HTTPException(status_code=400, detail=f"A batch can hold at most {settings.max_batch_size} operations")
+
+    results: List[TaskBatchResult] = []
+
+    referenced_ids = {item.id for item in batch.update} | {item.id for item in batch.move} | set(batch.delete)
+    existing_statuses = {}
+    if referenced_ids:
+        existing_statuses = dict(db.execute(
+            select(Task.id, Task.status).where(Task.project_id == project_id, Task.id.in_(referenced_ids))
+        ).all())
+    existing_ids = existing_statuses.keys()
+
+    ## created tasks and tasks changing status go at the end of their column
+    column_ends = None
+    if batch.create or any(item.status is not None for item in batch.update) or batch.move:
+        column_ends = ColumnEnds.load(db, project_id)
+
+    if batch.create:
+        ## rows get increasing ids in VALUES order, sorting avoids the row-at-a-time
+        ## fallback that sort_by_parameter_order=True has on some backends
+        created_ids = sorted(db.scalars(
+            insert(Task).returning(Task.id),
+            [
+                {
+                    "title": item.title,
+                    "description": item.description,
+                    "status": item.status.value,
+                    "rank": column_ends.next_rank(item.status.value),
+                    "project_id": project_id,
+                }
+                for item in batch.create
+            ],
+        ).all())
+        results += [TaskBatchResult(op="create", index=index, id=task_id) for index, task_id in enumerate(created_ids)]
+
+    ## updates and moves both become rows of one bulk UPDATE by primary key
+    update_rows = []
+    for op, items in (("update", batch.update), ("move", batch.move)):
+        for index, item in enumerate(items):
+            if item.id not in existing_ids:
+                results.append(TaskBatchResult(op=op, index=index, id=item.id, ok=False, detail="Task not found in the specified project"))
+                continue
+            values = {key: value for key, value in item.model_dump(exclude={"id"}).items() if value is not None}
+            if "status" in values:
+                values["status"] = TaskStatus(values["status"]).value
+                if values["status"] != existing_statuses[item.id]:
+                    values["rank"] = column_ends.next_rank(values["status"])
+                    existing_statuses[item.id] = values["status"]
+            if values:
+                update_rows.append({"id": item.id, **values})
+            results.append(TaskBatchResult(op=op, index=index, id=item.id))
+    if update_rows:
+        db.execute(update(Task), update_rows)
+
+    delete_ids = []
+    for index, task_id in enumerate(batch.delete):
+        if task_id not in existing_ids:
+            results.append(TaskBatchResult(op="delete", index=index, id=task_id, ok=False, detail="Task not found in the specified project"))
+            continue
+        delete_ids.append(task_id)
+        results.append(TaskBatchResult(op="delete", index=index, id=task_id))
+    if delete_ids:
+        db.execute(delete(Task).where(Task.project_id == project_id, Task.id.in_(delete_ids)))
+
+    return results
+
+def neighbour_rank_statement(project_id: int, status: str, task_id: int, rank: str, after: bool) -> Select:
+    """Rank of the task right after (or before) `rank` in a column, leaving out the task being moved"""
+    stmt = select(func.min(Task.rank) if after else func.max(Task.rank)).where(
+        Task.project_id == project_id,
+        Task.status == status,
+        Task.id != task_id,
+    )
+    return stmt.where(Task.rank > rank if after else Task.rank < rank)
+
+def position_rank(db: Session, project_id: int, task_id: int, status: str, position: TaskPosition) -> Optional[str]:
+    """
+    Rank for a task moved to `position`, or None when the column's ranks need rebalancing first.
+    Only the given neighbours and one index lookup for the other side are read.
+    """
+    neighbour_ids = [neighbour_id for neighbour_id in (position.after_id, position.before_id) if neighbour_id is not None]
+    neighbours = {}
+    if neighbour_ids:
+        neighbours = {
+            row.id: row for row in db.execute(
+                select(Task.id, Task.status, Task.rank).where(Task.project_id == project_id, Task.id.in_(neighbour_ids))
+            )
+        }
+    for neighbour_id in neighbour_ids:
+        if neighbour_id not in neighbours:
+            raise HTTPException(status_code=404, detail=f"Task {neighbour_id} not found in the specified project")
+        if neighbour_id == task_id:
+            raise HTTPException(status_code=400, detail="A task can't be moved next to itself")
+        if neighbours[neighbour_id].status != status:
+            raise HTTPException(status_code=400, detail=f"Task {neighbour_id} is not in the {status} column")
+
+    lower = neighbours[position.after_id].rank if position.after_id is not None else None
+    upper = neighbours[position.before_id].rank if position.before_id is not None else None
+    if (position.after_id is not None and lower is None) or (position.before_id is not None and upper is None):
+        return None
+    if position.after_id is None and position.before_id is None:
+        lower = db.scalar(
+            select(func.max(Task.rank)).where(Task.project_id == project_id, Task.status == status, Task.id != task_id)
+        )
+    elif position.before_id is None:
+        upper = db.scalar(neighbour_rank_statement(project_id, status, task_id, lower, after=True))
+    elif position.after_id is None:
+        lower = db.scalar(neighbour_rank_statement(project_id, status, task_id, upper, after=False))
+
+    ## neighbours sharing a rank, or ranks grown too long
+    if lower is not None and upper is not None and lower >= upper:
+        return None
+    rank = rank_between(lower, upper)
+    if len(rank) > settings.task_rank_max_length:
+        return None
+    return rank
+
+def record_batch_changes(db: Session, project_id: int, results: List[TaskBatchResult]) -> None:
+    """Change log rows for the items of a batch that were applied, and the project's version bump"""
+    applied = [result for result in results if result.ok]
+    record_changes(db, project_id, TASK, [result.id for result in applied if result.op != "delete"], UPSERT)
+    record_project_write(db, project_id, TASK, [result.id for result in applied if result.op == "delete"], DELETE)
+
+def delete_projects_statements(project_ids: List[int]) -> list:
+    """Set-based deletes of projects with their tasks and memberships, children first"""
+    return [
+        delete(Task).where(Task.project_id.in_(project_ids)),
+        delete(project_user).where(project_user.c.project_id.in_(project_ids)),
+        delete(Project).where(Project.id.in_(project_ids)),
+    ]
+
+def delete_projects(db: Session, project_ids: List[int], background_tasks: BackgroundTasks) -> List[int]:
+    """
+    Delete projects with set-based statements, nothing is committed.
+    Projects with more than PROJECT_DELETE_BACKGROUND_THRESHOLD tasks only lose their
+    members here and are purged by a background job, their ids are returned.
+    """
+    if not project_ids:
+        return []
+
+    task_counts = dict(db.execute(
+        select(Task.project_id, func.count()).where(Task.project_id.in_(project_ids)).group_by(Task.project_id)
+    ).all())
+    large = [pid for pid in project_ids if task_counts.get(pid, 0) > settings.project_delete_background_threshold]
+    small = [pid for pid in project_ids if pid not in large]
+
+    for project_id in project_ids:
+        response_cache.invalidate_tag(("project", project_id))
+    for statement in project_deletion_statements(project_ids):
+        db.execute(statement)
+
+    if small:
+        for statement in delete_projects_statements(small):
+            db.execute(statement)
+    if large:
+        ## detached projects are invisible to everyone until the job removes them
+        db.execute(delete(project_user).where(project_user.c.project_id.in_(large)))
+        for project_id in large:
+            background_tasks.add_task(purge_project, project_id)
+    return large
+
+def purge_project(project_id: int) -> None:
+    """Background job: delete a project's tasks in short transactions so the write lock is released in between"""
+    with SessionLocal() as db:
+        while True:
+            chunk = select(Task.id).where(Task.project_id == project_id).limit(settings.delete_chunk_size)
+            result = db.execute(delete(Task).where(Task.id.in_(chunk.scalar_subquery())))
+            db.commit()
+            if result.rowcount == 0:
+                break
+        for statement in delete_projects_statements([project_id]):
+            db.execute(statement)
+        db.commit()
+
+def orphaned_projects_statement() -> Select:
+    """Projects without members: deleted ones whose purge job never ran, e.g. cut short by a restart"""
+    return select(Project.id).where(~exists().where(project_user.c.project_id == Project.id))
+
+def purge_orphaned_projects() -> List[int]:
+    """Startup job: purge the projects background jobs left behind, returns their ids"""
+    with SessionLocal() as db:
+        project_ids = db.scalars(orphaned_projects_statement()).all()
+    for project_id in project_ids:
+        purge_project(project_id)
+    return project_ids
+
+router = APIRouter(prefix="/projects", tags=["projects"], route_class=FastJSONRoute)
+
+@router.get("/", response_model=List[ProjectFull] | List[ProjectSummary], tags=["projects", "me"])
+def get_projects(
+    db: read_db_dependency,
+    request: Request,
+    limit: limit_query = None,
+    after: after_query = None,
+    compact: Annotated[bool, Query(description="Leave out embedded tasks and users")] = False,
+):
     """Get a user's projects"""
 
-    user = get_user_from_jwt(request, db)
-    user_id = getattr(user, "id")
+    user = get_principal_from_jwt(request, db)
+    user_id = user.id
+
+    ## the page's ids and versions decide whether anything changed
+    rows, next_cursor = split_page(db.execute(user_project_versions_statement(user_id, limit, after)).all(), limit)
+    digest = versions_digest(rows)
+    etag = make_etag("projects", "compact" if compact else "full", digest)
+    if etag_matches(request, etag):
+        return not_modified(etag, next_cursor)
 
-    ## fetching projects for the user
-    projects = db.query(Project).join(Project.users).filter(User.id == user_id).all()
-    return projects
+    cache_key = ("projects", compact, digest)
+    content = response_cache.get(cache_key)
+    if content is None:
+        ## fetching projects for the user
+        projects = db.scalars(projects_by_ids_statement([row.id for row in rows], compact)).all()
+        content = render_json(project_page_type(compact), projects)
+        response_cache.set(cache_key, content, tags=[("project", row.id) for row in rows])
+    return json_response(content, etag, next_cursor)
 
 
 @router.get("/{project_id}", response_model=ProjectFull)
-def get_project(project_id: int, request:Request, db: db_dependency):
+def get_project(project_id: int, request:Request, db: read_db_dependency):
     """Get a project by ID"""
     
-    user = get_user_from_jwt(request, db)
+    user = get_principal_from_jwt(request, db)
     project = get_project_by_id_for_user(user, project_id, db)
-    return project
+
+    etag = make_etag("project", project_id, project.version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    cache_key = ("project", project_id, project.version)
+    content = response_cache.get(cache_key)
+    if content is None:
+        content = render_json(ProjectFull, load_full_project(project_id, db))
+        response_cache.set(cache_key, content, tags=[("project", project_id)])
+    return json_response(content, etag)
 
 @router.get("/{project_id}/users", response_model=List[UserBase], tags=["users", "projects"])
-def get_project_users(project_id: int, request:Request, db: db_dependency):
+def get_project_users(project_id: int, user: project_reader_dependency, db: read_db_dependency):
     """Get users from a specified project"""
     
-    user = get_user_from_jwt(request, db)
-    db_project = get_project_by_id_for_user(user, project_id, db)
-    return db_project.users
+    return db.scalars(project_users_statement(project_id)).all()
 
 
 @router.get("/{project_id}/tasks/{task_id}", response_model=TaskBase, tags=["tasks"])
-def get_project_task(project_id: int, task_id: int, db: db_dependency, request: Request):
+def get_project_task(project_id: int, task_id: int, db: read_db_dependency, user: project_reader_dependency):
     """Get a specific task from a specified project"""
     
-    user = get_user_from_jwt(request, db)
-    db_project = get_project_by_id_for_user(user, project_id, db)
-    db_task = get_task_by_id_for_project(db_project, task_id, db)
+    db_task = get_task_by_id_for_project(project_id, task_id, db)
 
     return db_task
 
 @router.get("/{project_id}/users/{user_id}", response_model=UserBase, tags=["users"])
-def get_project_user(project_id: int, user_id: int, db: db_dependency, request: Request):
+def get_project_user(project_id: int, user_id: int, db: read_db_dependency, user: project_reader_dependency):
     """Get a specific user from a specified project"""
-    user = get_user_from_jwt(request, db)
-
-    db_project : ProjectBase = get_project_by_id_for_user(user, project_id, db)
 
-    db_user = db.query(User).filter(User.id == user_id).first()
-    if db_user is None or db_user not in db_project.users:
+    db_user = db.scalars(project_users_statement(project_id).where(User.id == user_id)).first()
+    if db_user is None:
         raise HTTPException(status_code=404, detail="User not found in the specified project")
     return db_user
 
 @router.get("/{project_id}/tasks", response_model=List[TaskBase], tags=["tasks", "projects"])
-def get_project_tasks(project_id: int, request:Request, db: db_dependency):
+def get_project_tasks(
+    project_id: int,
+    user: project_reader_dependency,
+    request: Request,
+    db: read_db_dependency,
+    limit: limit_query = None,
+    after: after_query = None,
+    status: Optional[TaskStatus] = None,
+):
     """Get tasks from a specified project"""
-    
-    user = get_user_from_jwt(request, db)
-    db_project = get_project_by_id_for_user(user, project_id, db)
-    db_tasks = db.query(Task).filter(Task.project_id == project_id).all()
-    return db_tasks
+
+    version = db.scalar(project_version_statement(project_id))
+    etag = tasks_etag(project_id, version, limit, after, status)
+    ## the page's cursor is cached with its JSON, a 304 carries it too
+    cache_key = ("tasks", project_id, version, limit, after, status)
+    cached = response_cache.get(cache_key)
+    if etag_matches(request, etag):
+        if cached is not None:
+            return not_modified(etag, cached[1])
+        ids = db.execute(project_tasks_statement(project_id, limit, after, status).with_only_columns(Task.id)).all()
+        return not_modified(etag, split_page(ids, limit)[1])
+
+    if cached is None:
+        db_tasks, next_cursor = split_page(db.scalars(project_tasks_statement(project_id, limit, after, status)).all(), limit)
+        cached = (render_json(List[TaskBase], db_tasks), next_cursor)
+        response_cache.set(cache_key, cached, tags=[("project", project_id)])
+    content, next_cursor = cached
+    return json_response(content, etag, next_cursor)
+
+@router.get("/{project_id}/board", response_model=Board, tags=["tasks", "projects"])
+def get_project_board(
+    project_id: int,
+    user: project_reader_dependency,
+    request: Request,
+    db: read_db_dependency,
+    per_column: Annotated[int, Query(ge=1, le=settings.max_page_size, description="Tasks returned per status column")] = 20,
+):
+    """Task counts per status plus the first tasks of every status"""
+
+    version = db.scalar(project_version_statement(project_id))
+    etag = make_etag("board", project_id, version, per_column)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    cache_key = ("board", project_id, version, per_column)
+    content = response_cache.get(cache_key)
+    if content is None:
+        board = build_board(project_id, db.execute(board_statement(project_id, per_column)).tuples())
+        content = render_json(Board, board)
+        response_cache.set(cache_key, content, tags=[("project", project_id)])
+    return json_response(content, etag)
 
 @router.post("/", response_model=ProjectCreate)
 def create_project(project: ProjectCreate, request:Request, db: db_dependency):
@@ -109,6 +620,9 @@ def create_project(project: ProjectCreate, request:Request, db: db_dependency):
     db_project.users.append(user)
 
     db.add(db_project)
+    db.flush()
+    for statement in project_created_statements(db_project.id, user.id):
+        db.execute(statement)
     db.commit()
     db.refresh(db_project)
     
@@ -116,82 +630,157 @@ def create_project(project: ProjectCreate, request:Request, db: db_dependency):
 
 
 @router.post("/{project_id}/tasks", response_model=ProjectTaskBase, tags=["tasks"])
-def create_project_task(project_id: int, task: TaskCreate, db: db_dependency, request: Request):
+def create_project_task(project_id: int, task: TaskCreate, db: db_dependency, user: project_member_dependency):
     """Create a new task in a specified project"""
-    user = get_user_from_jwt(request, db)
-
-    db_project = get_project_by_id_for_user(user, project_id, db)
 
     db_task = Task(
         title=task.title,
         description=task.description,
         status=task.status,
-        project=db_project
+        rank=rank_between(db.scalar(last_rank_statement(project_id, task.status.value)), None),
+        project_id=project_id
     )
     
     db.add(db_task)
+    db.flush()
+    record_project_write(db, project_id, TASK, [db_task.id])
     db.commit()
     db.refresh(db_task)
+    publish_task(project_id, "task.created", db_task)
+    return db_task
+
+@router.post("/{project_id}/tasks/batch", response_model=List[TaskBatchResult], tags=["tasks"])
+def batch_project_tasks(project_id: int, batch: TaskBatch, db: db_dependency, user: project_member_dependency):
+    """Create, update, move and delete many tasks of a project in one transaction"""
+
+    results = apply_task_batch(db, project_id, batch)
+    record_batch_changes(db, project_id, results)
+    db.commit()
+    publish_batch(project_id, results)
+    return results
+
+@router.post("/{project_id}/tasks/{task_id}/move", response_model=TaskBase, tags=["tasks"])
+def move_project_task(project_id: int, task_id: int, position: TaskPosition, db: db_dependency, user: project_member_dependency):
+    """Move a task to another column and/or between two tasks, only the moved task is rewritten"""
+    db_task = get_task_by_id_for_project(project_id, task_id, db)
+    status = position.status.value if position.status is not None else db_task.status
+
+    rank = position_rank(db, project_id, task_id, status, position)
+    rebalanced = rank is None
+    if rebalanced:
+        ## rare: spread the column's ranks out again, then retry once
+        rebalance_column(db, project_id, status)
+        rank = position_rank(db, project_id, task_id, status, position)
+        if rank is None:
+            raise HTTPException(status_code=400, detail="after_id must come before before_id in the column")
+
+    db_task.status = status
+    db_task.rank = rank
+    record_project_write(db, project_id, TASK, [task_id])
+    db.commit()
+    db.refresh(db_task)
+    if rebalanced:
+        event_hub.publish(project_id, "tasks.rebalanced", status=status)
+    publish_task(project_id, "task.updated", db_task)
     return db_task
 
 @router.post("/{project_id}/users", response_model=ProjectFull, tags=["users"])
-def add_project_user(project_id: int, user_data: ProjectAddUser, db: db_dependency, request: Request):
+def add_project_user(project_id: int, user_data: ProjectAddUser, db: db_dependency, user: project_member_dependency):
     """Add a user to a specified project using their email address"""
-    user = get_user_from_jwt(request, db)
-    db_project = get_project_by_id_for_user(user, project_id, db)
 
     db_user = db.query(User).filter(User.email == user_data.user_email).first()
 
     if not db_user:
         raise HTTPException(status_code=404, detail="User with the specified email not found")
 
-    if db_user not in db_project.users:
-        db_project.users.append(db_user)
-    else:
+    if not db.scalars(add_members_statement(db.get_bind().dialect.name, project_id, [db_user.id])).all():
         raise HTTPException(status_code=400, detail="User is already a member of the project")
-        
+
+    record_project_write(db, project_id, MEMBER, [db_user.id])
     db.commit()
-    db.refresh(db_project)
-    return db_project
+    publish_members(project_id, "members.added", [db_user.id])
+    return load_full_project(project_id, db)
+
+@router.post("/{project_id}/users/bulk", response_model=List[UserBase], tags=["users"])
+def add_project_users(project_id: int, user_data: ProjectAddUsers, db: db_dependency, user: project_member_dependency):
+    """Add many users to a specified project by ID, returns the updated member list"""
+
+    user_ids = set(user_data.user_ids)
+    if user_ids:
+        found_ids = set(db.scalars(select(User.id).where(User.id.in_(user_ids))))
+        missing_ids = sorted(user_ids - found_ids)
+        if missing_ids:
+            raise HTTPException(status_code=404, detail=f"Users not found: {missing_ids}")
+
+        ## users who already are members are skipped, only the ids it inserted are logged and announced
+        added_ids = sorted(db.scalars(add_members_statement(db.get_bind().dialect.name, project_id, user_ids)))
+        if added_ids:
+            record_project_write(db, project_id, MEMBER, added_ids)
+            db.commit()
+            publish_members(project_id, "members.added", added_ids)
+
+    return db.scalars(project_users_statement(project_id)).all()
+
+@router.delete("/{project_id}/users", response_model=List[UserBase], tags=["users"])
+def remove_project_users(project_id: int, user_data: ProjectRemoveUsers, db: db_dependency, user: project_member_dependency):
+    """Remove many users from a specified project by ID, returns the updated member list"""
+
+    user_ids = set(user_data.user_ids)
+    if user_ids:
+        check_keeps_a_member(db.scalar(remaining_members_statement(project_id, user_ids)))
+
+        ## only ids that were members are logged and announced
+        removed_ids = sorted(db.scalars(
+            delete(project_user)
+            .where(project_user.c.project_id == project_id, project_user.c.user_id.in_(user_ids))
+            .returning(project_user.c.user_id)
+        ))
+        if removed_ids:
+            record_project_write(db, project_id, MEMBER, removed_ids, DELETE)
+            db.commit()
+            publish_members(project_id, "members.removed", removed_ids)
+
+    return db.scalars(project_users_statement(project_id)).all()
 
 @router.delete("/{project_id}/users/{user_id}", response_model=ProjectRemoveUsers, tags=["users"])
-def remove_user_from_project(project_id: int, user_id: int, db: db_dependency, request: Request):
+def remove_user_from_project(project_id: int, user_id: int, db: db_dependency, user: project_member_dependency):
     """Remove a user from a specified project using their ID"""
-    user = get_user_from_jwt(request, db)
 
-    db_project = get_project_by_id_for_user(user, project_id, db)
-
-    db_user = db.query(User).filter(User.id == user_id).first()
-    if db_user is None or db_user not in db_project.users:
+    if not is_project_member(project_id, user_id, db):
         raise HTTPException(status_code=404, detail="User not found in the specified project")
+    check_keeps_a_member(db.scalar(remaining_members_statement(project_id, [user_id])))
 
-    db_project.users.remove(db_user)
+    db.execute(
+        delete(project_user).where(project_user.c.project_id == project_id, project_user.c.user_id == user_id)
+    )
+    record_project_write(db, project_id, MEMBER, [user_id], DELETE)
     db.commit()
-    db.refresh(db_project)
-    return db_project
+    publish_members(project_id, "members.removed", [user_id])
+    return ProjectRemoveUsers(user_ids=[user_id])
 
 @router.put("/{project_id}/tasks/{task_id}", response_model=TaskUpdate, tags=["tasks"])
-def update_project_task(project_id: int, task_id: int, task: TaskUpdate, db: db_dependency, request: Request):
+def update_project_task(project_id: int, task_id: int, task: TaskUpdate, db: db_dependency, user: project_member_dependency):
     """Update a task in a specified project"""
-    user = get_user_from_jwt(request, db)
-    db_project = get_project_by_id_for_user(user, project_id, db)
-    db_task = get_task_by_id_for_project(db_project, task_id, db)
+    db_task = get_task_by_id_for_project(project_id, task_id, db)
 
     if task.title is not None:
         db_task.title = task.title
     if task.description is not None:
         db_task.description = task.description
-    if task.status is not None:
-        db_task.status = task.status
+    if task.status is not None and task.status.value != db_task.status:
+        db_task.status = task.status.value
+        db_task.rank = rank_between(db.scalar(last_rank_statement(project_id, task.status.value)), None)
 
+    record_project_write(db, project_id, TASK, [task_id])
     db.commit()
     db.refresh(db_task)
+    publish_task(project_id, "task.updated", db_task)
     return db_task
 
 @router.put("/{project_id}", response_model=ProjectUpdate)
 def update_project(project_id: int, project: ProjectUpdate, db: db_dependency, request: Request):
     """Update a project by ID"""
-    user = get_user_from_jwt(request, db)
+    user = get_principal_from_jwt(request, db)
 
     db_project = get_project_by_id_for_user(user, project_id, db)
 
@@ -200,35 +789,34 @@ def update_project(project_id: int, project: ProjectUpdate, db: db_dependency, r
     if project.description is not None:
         db_project.description = project.description
 
+    record_project_write(db, project_id, PROJECT, [project_id])
     db.commit()
     db.refresh(db_project)
+    publish_project_updated(db_project)
     return db_project
 
 @router.delete("/{project_id}", tags=["projects"])
-def delete_project(project_id: int, db: db_dependency, request: Request):
+def delete_project(project_id: int, db: db_dependency, user: project_member_dependency, response: Response, background_tasks: BackgroundTasks):
     """Delete a project by ID"""
-    user = get_user_from_jwt(request, db)
-    db_project = get_project_by_id_for_user(user, project_id, db)
-    
-    ## Remove dangling tasks and user associations
-    tasks: List[Task] = db.query(Task).filter(Task.project_id == project_id).all()
-    for task in tasks:
-        db.delete(task)
-        db_project.tasks.remove(task)
 
-    db.delete(db_project)
+    ## Remove tasks and user associations along with the project
+    scheduled = delete_projects(db, [project_id], background_tasks)
     db.commit()
+    publish_project_deleted(project_id)
+
+    if scheduled:
+        response.status_code = 202
+        return {"detail": "Project deletion scheduled"}
     return {"detail": "Project deleted successfully"}
 
 @router.delete("/{project_id}/tasks/{task_id}" , tags=["tasks"])
-def delete_project_task(project_id: int, task_id: int, db: db_dependency, request: Request):
+def delete_project_task(project_id: int, task_id: int, db: db_dependency, user: project_member_dependency):
     """Delete a task from a specified project"""
-    user = get_user_from_jwt(request, db)
-    db_project = get_project_by_id_for_user(user, project_id, db)
-    db_task = get_task_by_id_for_project(db_project, task_id, db)
+    db_task = get_task_by_id_for_project(project_id, task_id, db)
     
     db.delete(db_task)
-    db_project.tasks.remove(db_task)
+    record_project_write(db, project_id, TASK, [task_id], DELETE)
 
     db.commit()
+    publish_task_deleted(project_id, task_id)
     return {"detail": "Task deleted successfully"}
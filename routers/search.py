@@ -0,0 +1,39 @@
+from typing import Annotated, List, Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+
+from config import settings
+from database import read_db_dependency
+from serialization import FastJSONRoute
+from routers.auth import get_principal_from_jwt
+from routers.projects import NEXT_CURSOR_HEADER
+from schemas.tasks import TaskSearchResult
+from search import search_tasks_statement, search_terms
+
+router = APIRouter(prefix="/search", tags=["search"], route_class=FastJSONRoute)
+
+@router.get("/tasks", response_model=List[TaskSearchResult], tags=["tasks"])
+def search_tasks(
+    request: Request,
+    response: Response,
+    db: read_db_dependency,
+    q: Annotated[str, Query(min_length=1, max_length=200, description="Words to look for in task titles and descriptions")],
+    project_id: Optional[int] = None,
+    limit: Annotated[int, Query(ge=1, le=settings.max_page_size)] = 20,
+    after: Annotated[int, Query(ge=0, description="Cursor returned by the previous page")] = 0,
+):
+    """Search the tasks of the user's projects, best matches first"""
+
+    user = get_principal_from_jwt(request, db)
+
+    terms = search_terms(q)
+    if not terms:
+        raise HTTPException(status_code=400, detail="The search query has no words")
+
+    statement = search_tasks_statement(db.get_bind().dialect.name, user.id, terms, limit, after, project_id)
+    tasks = db.scalars(statement).all()
+    ## ranked results page by position, the cursor is the number of results already seen
+    if len(tasks) > limit:
+        tasks = tasks[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = str(after + limit)
+    return tasks
@@ -0,0 +1,138 @@
+from typing import Annotated, Iterable, Optional
+
+from fastapi import APIRouter, Query, Request
+from sqlalchemy import and_, func, or_, select, tuple_
+from sqlalchemy.orm import Session
+
+from changelog import DELETE, MEMBER, PROJECT, TASK, UPSERT, oldest_valid_cursor
+from database import db_dependency
+from serialization import FastJSONRoute
+from models import ChangeLog, Project, Task, User, project_user
+from routers.auth import get_principal_from_jwt
+from schemas.projects import ProjectSummary
+from schemas.sync import SyncMember, SyncMemberRef, SyncResponse, SyncTask
+from schemas.users import UserBase
+
+router = APIRouter(prefix="/sync", tags=["sync", "me"], route_class=FastJSONRoute)
+
+def user_project_ids(db: Session, user_id: int) -> set[int]:
+    return set(db.scalars(select(project_user.c.project_id).where(project_user.c.user_id == user_id)))
+
+def add_snapshot(db: Session, response: SyncResponse, project_ids: Iterable[int]) -> None:
+    """Everything the client needs about projects it doesn't know yet, three queries in all"""
+    project_ids = sorted(project_ids)
+    if not project_ids:
+        return
+    response.projects += [
+        ProjectSummary.model_validate(project)
+        for project in db.scalars(select(Project).where(Project.id.in_(project_ids)).order_by(Project.id))
+    ]
+    response.tasks += [
+        SyncTask.model_validate(task)
+        for task in db.scalars(select(Task).where(Task.project_id.in_(project_ids)).order_by(Task.id))
+    ]
+    response.members += [
+        SyncMember(project_id=project_id, user=UserBase.model_validate(user))
+        for project_id, user in db.execute(
+            select(project_user.c.project_id, User)
+            .join(User, User.id == project_user.c.user_id)
+            .where(project_user.c.project_id.in_(project_ids))
+            .order_by(project_user.c.project_id, User.id)
+        ).tuples()
+    ]
+
+def latest_changes(db: Session, user_id: int, project_ids: set[int], since: int, cursor: int) -> dict:
+    """
+    Last operation per (project, entity, id) in (since, cursor], over the user's projects
+    plus the user's own membership changes (projects they left or that were deleted)
+    """
+    rows = db.execute(
+        select(ChangeLog.project_id, ChangeLog.entity, ChangeLog.entity_id, ChangeLog.op)
+        .where(
+            ChangeLog.id > since,
+            ChangeLog.id <= cursor,
+            or_(
+                ChangeLog.project_id.in_(project_ids),
+                and_(ChangeLog.entity == MEMBER, ChangeLog.entity_id == user_id),
+            ),
+        )
+        .order_by(ChangeLog.id)
+    ).tuples()
+    return {(project_id, entity, entity_id): op for project_id, entity, entity_id, op in rows}
+
+@router.get("/", response_model=SyncResponse)
+def sync(
+    request: Request,
+    db: db_dependency,
+    since: Annotated[Optional[int], Query(ge=0, description="Cursor returned by the previous sync, leave out for a full sync")] = None,
+):
+    """Changes to the user's projects, tasks and memberships since a cursor"""
+
+    user = get_principal_from_jwt(request, db)
+    cursor = db.scalar(select(func.max(ChangeLog.id))) or 0
+    project_ids = user_project_ids(db, user.id)
+
+    ## no cursor, a cursor from another database, or one older than the retained log
+    oldest = oldest_valid_cursor(db)
+    if since is None or since > cursor or (oldest is not None and since < oldest):
+        response = SyncResponse(cursor=cursor, reset=True)
+        add_snapshot(db, response, project_ids)
+        return response
+
+    response = SyncResponse(cursor=cursor)
+    changes = latest_changes(db, user.id, project_ids, since, cursor)
+
+    ## projects the user joined are sent whole, the ones they lost access to are dropped whole
+    joined = {
+        pid for (pid, entity, eid), op in changes.items()
+        if entity == MEMBER and eid == user.id and op == UPSERT
+    }
+    joined &= project_ids
+    lost = {
+        pid for (pid, entity, eid), op in changes.items()
+        if op == DELETE and (entity == PROJECT or (entity == MEMBER and eid == user.id))
+    }
+    lost -= project_ids
+    response.deleted_projects = sorted(lost)
+    add_snapshot(db, response, joined)
+
+    def changed(entity: str, op: str) -> list:
+        return [
+            (pid, eid) for (pid, kind, eid), last_op in changes.items()
+            if kind == entity and last_op == op and pid in project_ids and pid not in joined
+        ]
+
+    updated_project_ids = [eid for _, eid in changed(PROJECT, UPSERT)]
+    if updated_project_ids:
+        response.projects += [
+            ProjectSummary.model_validate(project)
+            for project in db.scalars(select(Project).where(Project.id.in_(updated_project_ids)).order_by(Project.id))
+        ]
+
+    upserted_task_ids = {eid for _, eid in changed(TASK, UPSERT)}
+    deleted_task_ids = {eid for _, eid in changed(TASK, DELETE)}
+    if upserted_task_ids:
+        tasks = db.scalars(
+            select(Task).where(Task.id.in_(upserted_task_ids), Task.project_id.in_(project_ids)).order_by(Task.id)
+        ).all()
+        response.tasks += [SyncTask.model_validate(task) for task in tasks]
+        ## only a project delete removes tasks without a task tombstone
+        deleted_task_ids |= upserted_task_ids - {task.id for task in tasks}
+    response.deleted_tasks = sorted(deleted_task_ids)
+
+    added_members = changed(MEMBER, UPSERT)
+    if added_members:
+        response.members += [
+            SyncMember(project_id=project_id, user=UserBase.model_validate(member))
+            for project_id, member in db.execute(
+                select(project_user.c.project_id, User)
+                .join(User, User.id == project_user.c.user_id)
+                .where(tuple_(project_user.c.project_id, project_user.c.user_id).in_(added_members))
+                .order_by(project_user.c.project_id, User.id)
+            ).tuples()
+        ]
+    response.removed_members = [
+        SyncMemberRef(project_id=project_id, user_id=user_id)
+        for project_id, user_id in changed(MEMBER, DELETE)
+    ]
+    return response
@@ -0,0 +1,46 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from database import async_db_dependency
+from serialization import FastJSONRoute
+from routers.projects import project_member_dependency
+from schemas.transfer import ProjectImportResult
+from transfer import ExportLineTooLong, InvalidExport, export_project_lines, import_project, spool_export
+
+router = APIRouter(prefix="/projects", tags=["projects"], route_class=FastJSONRoute)
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+@router.get("/{project_id}/export", response_class=StreamingResponse)
+def export_project(project_id: int, user: project_member_dependency):
+    """Stream a project with its members and tasks as NDJSON"""
+    return StreamingResponse(
+        export_project_lines(project_id),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={"Content-Disposition": f'attachment; filename="project-{project_id}.ndjson"'},
+    )
+
+@router.post(
+    "/import",
+    response_model=ProjectImportResult,
+    openapi_extra={"requestBody": {"required": True, "content": {NDJSON_MEDIA_TYPE: {"schema": {"type": "string"}}}}},
+)
+async def import_project_stream(request: Request, db: async_db_dependency):
+    """Create a project from an export, in one transaction. Members are matched by email."""
+    ## the async routers are only imported once an import comes in or when they are enabled
+    from routers.async_auth import get_principal_from_jwt
+
+    user = await get_principal_from_jwt(request, db)
+    ## no connection is held while the body uploads, the transaction starts once it is validated
+    await db.close()
+
+    try:
+        spool = await spool_export(request.stream())
+        with spool:
+            result = await import_project(db, user.id, spool)
+    except ExportLineTooLong as exc:
+        raise HTTPException(status_code=413, detail=str(exc))
+    except InvalidExport as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    await db.commit()
+    return result
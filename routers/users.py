@@ -1,26 +1,57 @@
 import os
 from typing import List
-from fastapi import APIRouter, HTTPException, Depends, Request
-from jose import JWTError, jwt
-from database import db_dependency
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+from database import db_dependency, read_db_dependency
+from serialization import FastJSONRoute
 
 import models
 
 from routers import auth
 import schemas.users as users
 import schemas.projects as projects
-from routers.auth import get_user_from_jwt
-
-from pyargon2 import hash
-
-router = APIRouter(prefix="/users", tags=["users"])
+from routers.auth import get_principal_from_jwt, invalidate_user_principals
+from routers.projects import delete_projects
+from project_writes import publish_members, touch_projects_statement
+from hashing import hash_password_async
+from changelog import DELETE, MEMBER, record_changes
+
+router = APIRouter(prefix="/users", tags=["users"], route_class=FastJSONRoute)
+
+def delete_user_cascade(db: Session, user_id: int, background_tasks: BackgroundTasks) -> List[int]:
+    """
+    Delete a user, their memberships and the projects nobody else is a member of,
+    using set-based statements. Nothing is committed.
+    Returns the projects that keep other members.
+    """
+    membership = models.project_user.c
+    user_projects = select(membership.project_id).where(membership.user_id == user_id)
+    member_counts = db.execute(
+        select(membership.project_id, func.count().label("members"))
+        .where(membership.project_id.in_(user_projects))
+        .group_by(membership.project_id)
+    ).all()
+    sole_member_projects = [row.project_id for row in member_counts if row.members == 1]
+    shared_projects = [row.project_id for row in member_counts if row.members > 1]
+
+    ## projects the user leaves have one member less
+    if shared_projects:
+        db.execute(touch_projects_statement(shared_projects))
+    for project_id in shared_projects:
+        record_changes(db, project_id, MEMBER, [user_id], DELETE)
+    db.execute(delete(models.project_user).where(membership.user_id == user_id))
+    delete_projects(db, sole_member_projects, background_tasks)
+    db.execute(delete(models.User).where(models.User.id == user_id))
+    return shared_projects
 
 
 @router.get("/{user_id}", response_model=users.UserBase)
-def read_user(user_id: int, db: db_dependency, request:Request):
+def read_user(user_id: int, db: read_db_dependency, request:Request):
     """Get a user by ID"""
 
-    get_user_from_jwt(request, db)
+    get_principal_from_jwt(request, db)
     
     db_user = db.query(models.User).filter(models.User.id == user_id).first()
     if db_user is None:
@@ -28,10 +59,10 @@ def read_user(user_id: int, db: db_dependency, request:Request):
     return db_user
 
 @router.get("/{user_id}/projects", response_model=List[projects.ProjectBase])
-def read_projects_from_user(user_id: int, db: db_dependency, request: Request):
+def read_projects_from_user(user_id: int, db: read_db_dependency, request: Request):
     """Get projects assigned to a user"""
 
-    get_user_from_jwt(request, db)
+    get_principal_from_jwt(request, db)
 
     db_user = db.query(models.User).filter(models.User.id == user_id).first()
     if db_user is None:
@@ -42,14 +73,19 @@ def read_projects_from_user(user_id: int, db: db_dependency, request: Request):
 ## POST endpoints
 ##
 
+def insert_user(db: Session, db_user: models.User) -> models.User:
+    db.add(db_user)
+    db.commit()
+    db.refresh(db_user)
+    return db_user
+
 @router.post("/", response_model=users.UserBase)
-def create_user(user: users.UserCreate, db: db_dependency):
+async def create_user(user: users.UserCreate, db: db_dependency):
     """Create a new user"""
 
     user_salt = os.urandom(32).hex()
-    print("Generated salt:", user_salt)
-    
-    hashed_password = hash(password=user.password, salt=user_salt, variant="id")
+
+    hashed_password = await hash_password_async(user.password, user_salt)
     
     db_user = models.User(
         name=user.name,
@@ -58,18 +94,23 @@ def create_user(user: users.UserCreate, db: db_dependency):
         password_salt=user_salt
     )
 
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    return db_user
+    return await run_in_threadpool(insert_user, db, db_user)
 
 @router.delete("/{user_id}")
-def delete_user(user_id: int, db: db_dependency):
+def delete_user(user_id: int, request: Request, db: db_dependency, background_tasks: BackgroundTasks):
+    """Delete a user along with the projects only they belong to, only that user may do it"""
+    principal = get_principal_from_jwt(request, db)
+    if principal.id != user_id:
+        raise HTTPException(status_code=403, detail="Not authorized to delete this user")
+
     db_user = db.query(models.User).filter(models.User.id == user_id).first()
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
-    db.delete(db_user)
+    left_projects = delete_user_cascade(db, user_id, background_tasks)
     db.commit()
+    invalidate_user_principals(user_id)
+    for project_id in left_projects:
+        publish_members(project_id, "members.removed", [user_id])
     return {"detail": "User deleted"}
 
 
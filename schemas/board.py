@@ -0,0 +1,26 @@
+from pydantic import BaseModel
+from typing import Dict, List
+
+from schemas.tasks import TaskBase, TaskStatus
+
+class BoardColumn(BaseModel):
+    status: TaskStatus
+    count: int
+    tasks: List[TaskBase]
+
+class Board(BaseModel):
+    """A project's tasks grouped by status: every column's size and its first tasks"""
+    project_id: int
+    columns: List[BoardColumn]
+
+class ProjectStatusCounts(BaseModel):
+    project_id: int
+    name: str
+    total: int
+    counts: Dict[TaskStatus, int]
+
+class DashboardSummary(BaseModel):
+    """Task counts per status over all of a user's projects"""
+    total: int
+    counts: Dict[TaskStatus, int]
+    projects: List[ProjectStatusCounts]
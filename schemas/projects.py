@@ -15,6 +15,14 @@ class ProjectBase(BaseModel):
 class ProjectFull(ProjectBase):
     id: int
 
+class ProjectSummary(BaseModel):
+    """Project without its embedded tasks and users"""
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    name: str
+    description: Optional[str] = None
+
 class ProjectCreate(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
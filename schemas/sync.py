@@ -0,0 +1,33 @@
+from pydantic import BaseModel, ConfigDict
+from typing import List
+
+from schemas.projects import ProjectSummary
+from schemas.tasks import TaskBase
+from schemas.users import UserBase
+
+class SyncTask(TaskBase):
+    model_config = ConfigDict(from_attributes=True)
+
+    project_id: int
+
+class SyncMember(BaseModel):
+    project_id: int
+    user: UserBase
+
+class SyncMemberRef(BaseModel):
+    project_id: int
+    user_id: int
+
+class SyncResponse(BaseModel):
+    """
+    What changed in the user's projects since a cursor.
+    With `reset` the client must drop its copy: the response holds everything, not a delta.
+    """
+    cursor: int
+    reset: bool = False
+    projects: List[ProjectSummary] = []
+    deleted_projects: List[int] = []
+    tasks: List[SyncTask] = []
+    deleted_tasks: List[int] = []
+    members: List[SyncMember] = []
+    removed_members: List[SyncMemberRef] = []
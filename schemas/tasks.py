@@ -1,6 +1,6 @@
 from enum import Enum
 from pydantic import BaseModel, ConfigDict
-from typing import List, Annotated, Optional
+from typing import List, Annotated, Literal, Optional
 
 class TaskStatus(str, Enum):
     PENDING = "pending"
@@ -16,6 +16,10 @@ class TaskBase(BaseModel):
     title: str
     description: Optional[str] = None
     status: TaskStatus = TaskStatus.PENDING
+    rank: Optional[str] = None
+
+class TaskSearchResult(TaskBase):
+    project_id: int
 
 class TaskCreate(BaseModel):
     title: str
@@ -27,3 +31,29 @@ class TaskUpdate(BaseModel):
     description: Optional[str] = None
     status: Optional[TaskStatus] = None
 
+class TaskBatchUpdate(TaskUpdate):
+    id: int
+
+class TaskMove(BaseModel):
+    id: int
+    status: TaskStatus
+
+class TaskPosition(BaseModel):
+    """Where to move a task: its column (unchanged if left out) and the tasks it should sit between"""
+    status: Optional[TaskStatus] = None
+    after_id: Optional[int] = None
+    before_id: Optional[int] = None
+
+class TaskBatch(BaseModel):
+    """Task operations applied together in one transaction, in the order create, update, move, delete"""
+    create: List[TaskCreate] = []
+    update: List[TaskBatchUpdate] = []
+    move: List[TaskMove] = []
+    delete: List[int] = []
+
+class TaskBatchResult(BaseModel):
+    op: Literal["create", "update", "move", "delete"]
+    index: int
+    id: Optional[int] = None
+    ok: bool = True
+    detail: Optional[str] = None
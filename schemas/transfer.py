@@ -0,0 +1,32 @@
+from pydantic import BaseModel, Field, StringConstraints
+from typing import Annotated, Literal, Optional, Union
+
+from schemas.tasks import TaskStatus
+
+## Lines of a project export (NDJSON): the project first, then its members and tasks.
+## Members are matched by email on import, ids are not kept.
+
+class ExportedProject(BaseModel):
+    type: Literal["project"] = "project"
+    name: str
+    description: Optional[str] = None
+
+class ExportedMember(BaseModel):
+    type: Literal["member"] = "member"
+    email: str
+    name: Optional[str] = None
+
+class ExportedTask(BaseModel):
+    type: Literal["task"] = "task"
+    title: str
+    description: Optional[str] = None
+    status: TaskStatus = TaskStatus.PENDING
+    rank: Optional[Annotated[str, StringConstraints(pattern=r"^[0-9a-z]*[1-9a-z]$")]] = None
+
+ExportLine = Annotated[Union[ExportedProject, ExportedMember, ExportedTask], Field(discriminator="type")]
+
+class ProjectImportResult(BaseModel):
+    project_id: int
+    members: int
+    tasks: int
+    unknown_members: int = 0  ## member lines whose email has no account here
@@ -0,0 +1,104 @@
+import re
+from typing import List, Optional
+
+from sqlalchemy import Select, column, func, inspect, literal_column, select, table, text
+from sqlalchemy.engine import Engine
+
+from models import Task, project_user
+
+## Full-text index over task titles and descriptions, maintained by the database itself
+## (triggers on SQLite, a generated column on Postgres) so bulk statements stay covered.
+
+## SQLite: external-content FTS5 table over tasks, rowid = tasks.id
+tasks_fts = table("tasks_fts", column("rowid"), column("title"), column("description"))
+
+SQLITE_SEARCH_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+        title, description, content='tasks', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tasks_fts_ai AFTER INSERT ON tasks BEGIN
+        INSERT INTO tasks_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tasks_fts_ad AFTER DELETE ON tasks BEGIN
+        INSERT INTO tasks_fts(tasks_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tasks_fts_au AFTER UPDATE OF title, description ON tasks BEGIN
+        INSERT INTO tasks_fts(tasks_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO tasks_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+]
+
+POSTGRES_SEARCH_DDL = [
+    """
+    ALTER TABLE tasks ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_tasks_search_vector ON tasks USING GIN (search_vector)",
+]
+
+## Title matches count more than description matches
+SQLITE_TITLE_WEIGHT = 10.0
+SQLITE_DESCRIPTION_WEIGHT = 1.0
+
+def create_search_index(engine: Engine) -> None:
+    """Create the index if missing, filling it from existing tasks the first time"""
+    dialect = engine.dialect.name
+    if dialect == "sqlite":
+        is_new = not inspect(engine).has_table("tasks_fts")
+        with engine.begin() as connection:
+            for statement in SQLITE_SEARCH_DDL:
+                connection.execute(text(statement))
+            if is_new:
+                connection.execute(text("INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild')"))
+    elif dialect == "postgresql":
+        with engine.begin() as connection:
+            for statement in POSTGRES_SEARCH_DDL:
+                connection.execute(text(statement))
+
+def search_terms(query: str) -> List[str]:
+    """Words of a user query, FTS operators and punctuation are not passed through"""
+    return re.findall(r"\w+", query)
+
+def search_tasks_statement(
+    dialect: str,
+    user_id: int,
+    terms: List[str],
+    limit: int,
+    offset: int,
+    project_id: Optional[int] = None,
+) -> Select:
+    """
+    Tasks of the user's projects matching every term (as a prefix), best match first.
+    Fetches one row past `limit` so the caller can tell whether there is a next page.
+    """
+    stmt = select(Task).join(
+        project_user,
+        (project_user.c.project_id == Task.project_id) & (project_user.c.user_id == user_id),
+    )
+    if dialect == "postgresql":
+        query = func.to_tsquery("simple", " & ".join(f"{term}:*" for term in terms))
+        vector = literal_column("tasks.search_vector")
+        score = func.ts_rank(vector, query)
+        stmt = stmt.where(vector.op("@@")(query)).order_by(score.desc(), Task.id)
+    else:
+        match = " ".join(f'"{term}"*' for term in terms)
+        score = func.bm25(literal_column("tasks_fts"), SQLITE_TITLE_WEIGHT, SQLITE_DESCRIPTION_WEIGHT)
+        stmt = (
+            stmt.join(tasks_fts, tasks_fts.c.rowid == Task.id)
+            .where(literal_column("tasks_fts").op("MATCH")(match))
+            ## bm25 is lower for better matches
+            .order_by(score, Task.id)
+        )
+    if project_id is not None:
+        stmt = stmt.where(Task.project_id == project_id)
+    return stmt.limit(limit + 1).offset(offset)
@@ -0,0 +1,110 @@
+import functools
+import inspect
+from functools import lru_cache
+from typing import Any, Callable, Optional
+
+from fastapi import Response
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.exceptions import ResponseValidationError
+from fastapi.routing import APIRoute
+from fastapi.utils import is_body_allowed_for_status_code
+from pydantic import TypeAdapter, ValidationError
+
+
+@lru_cache(maxsize=None)
+def get_adapter(type_: Any) -> TypeAdapter:
+    """One TypeAdapter per response type, building them is the expensive part"""
+    return TypeAdapter(type_)
+
+
+def render_json(type_: Any, value: Any) -> bytes:
+    """Validate ORM objects against a response type and encode them to JSON bytes"""
+    adapter = get_adapter(type_)
+    try:
+        validated = adapter.validate_python(value, from_attributes=True)
+    except ValidationError as exc:
+        ## same error FastAPI raises for an invalid response_model
+        errors = [{**error, "loc": ("response", *error["loc"])} for error in exc.errors(include_url=False)]
+        raise ResponseValidationError(errors=errors, body=value) from exc
+    return adapter.dump_json(validated)
+
+
+## Name of the Response parameter fast JSON endpoints get injected, to pick up
+## the status code, headers and cookies the endpoint set on its own Response
+SUB_RESPONSE_PARAM = "fast_json_sub_response__"
+
+
+def fast_json_endpoint(endpoint: Callable, response_model: Any, status_code: Optional[int]) -> Callable:
+    """
+    Wrap an endpoint so its return value is rendered by render_json into a Response.
+    FastAPI leaves returned Responses alone, which skips its own validate, serialize
+    to Python objects, then json.dumps round trip. Output bytes are the same.
+    """
+    get_adapter(response_model)  ## built at import time, not on the first request
+
+    def to_response(result: Any, sub_response: Response) -> Response:
+        if isinstance(result, Response):
+            return result
+        status = sub_response.status_code or status_code or 200
+        content = render_json(response_model, result) if is_body_allowed_for_status_code(status) else b""
+        response = Response(content=content, status_code=status, media_type="application/json")
+        response.headers.raw.extend(sub_response.headers.raw)
+        return response
+
+    ## FastAPI injects a single Response per endpoint, reuse the endpoint's own parameter if it has one
+    signature = inspect.signature(endpoint)
+    own_param = next((
+        name for name, param in signature.parameters.items()
+        if inspect.isclass(param.annotation) and issubclass(param.annotation, Response)
+    ), None)
+    param_name = own_param or SUB_RESPONSE_PARAM
+
+    def take_sub_response(kwargs: dict) -> Response:
+        return kwargs[param_name] if own_param else kwargs.pop(param_name)
+
+    if inspect.iscoroutinefunction(endpoint):
+        async def wrapper(*args, **kwargs):
+            sub_response = take_sub_response(kwargs)
+            return to_response(await endpoint(*args, **kwargs), sub_response)
+    else:
+        ## stays sync so FastAPI keeps running it (and the rendering) in the threadpool
+        def wrapper(*args, **kwargs):
+            sub_response = take_sub_response(kwargs)
+            return to_response(endpoint(*args, **kwargs), sub_response)
+
+    functools.update_wrapper(wrapper, endpoint)
+    if own_param is None:
+        wrapper.__signature__ = signature.replace(parameters=[
+            *signature.parameters.values(),
+            inspect.Parameter(SUB_RESPONSE_PARAM, inspect.Parameter.KEYWORD_ONLY, annotation=Response),
+        ])
+    wrapper.fast_json = True
+    return wrapper
+
+
+class FastJSONRoute(APIRoute):
+    """
+    Route class whose JSON responses are encoded straight from ORM objects with a
+    prebuilt TypeAdapter. Routes with a custom response_class or response_model
+    include/exclude options keep FastAPI's regular path.
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs: Any):
+        response_model = kwargs.get("response_model")
+        ## include_router rebuilds routes from the already wrapped endpoint
+        if (
+            not getattr(endpoint, "fast_json", False)
+            and response_model is not None
+            and not isinstance(response_model, DefaultPlaceholder)
+            and isinstance(kwargs.get("response_class", DefaultPlaceholder(None)), DefaultPlaceholder)
+            and kwargs.get("response_model_by_alias", True)
+            and not any(kwargs.get(option) for option in (
+                "response_model_include",
+                "response_model_exclude",
+                "response_model_exclude_unset",
+                "response_model_exclude_defaults",
+                "response_model_exclude_none",
+            ))
+        ):
+            endpoint = fast_json_endpoint(endpoint, response_model, kwargs.get("status_code"))
+        super().__init__(path, endpoint, **kwargs)
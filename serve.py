@@ -0,0 +1,76 @@
+"""
+Production launcher: one uvicorn worker process per core, on uvloop and httptools.
+
+With more than one worker, the settings still at their single-process defaults are
+pointed at the shared state (shared.py) so that events, rate limits and log files
+work across workers; anything set in the environment or .env is left alone.
+
+    python serve.py --workers 4 --port 8000
+"""
+import argparse
+import os
+from typing import List, Optional
+
+import uvicorn
+
+from config import Settings, settings
+
+## setting -> value used when running several workers
+MULTI_WORKER_SETTINGS = {
+    "shared_state_backend": "shared:SQLiteSharedState",
+    "event_backend": "events:SharedEventBackend",
+    "rate_limit_backend": "ratelimit:SharedRateLimitBackend",
+    "log_file": "app.{pid}.log",
+}
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes (default: one per core)")
+    parser.add_argument("--backlog", type=int, default=2048, help="connections waiting to be accepted")
+    return parser.parse_args(argv)
+
+
+def share_state() -> None:
+    """Switch the settings left at their defaults to the shared implementations, workers inherit the environment"""
+    for name, value in MULTI_WORKER_SETTINGS.items():
+        if getattr(settings, name) == Settings.model_fields[name].default:
+            os.environ[name.upper()] = value
+            setattr(settings, name, value)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    if args.workers > 1:
+        share_state()
+
+    from database import init_db
+    from logs import setup_logging, stop_logging
+
+    ## this process' records, every worker sets up its own in the app's lifespan
+    log_listener = setup_logging()
+    try:
+        ## schema changes and the shared state's tables are made once here, not by every worker at the same time
+        init_db()
+        import shared  # noqa: F401
+
+        uvicorn.run(
+            "main:app",
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            backlog=args.backlog,
+            loop="uvloop",
+            http="httptools",
+            ## records go through logs.py's queue, access records come from RequestLoggingMiddleware
+            log_config=None,
+            access_log=False,
+        )
+    finally:
+        stop_logging(log_listener)
+
+
+if __name__ == "__main__":
+    main()
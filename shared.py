@@ -0,0 +1,291 @@
+import importlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Any, Callable, List, Optional, Sequence
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+## State that must agree across worker processes: keys with a TTL, counters and pub/sub.
+## Values are anything json.dumps accepts. LocalSharedState keeps it in the process (one
+## worker), SQLiteSharedState in a SQLite file every worker on the host opens (serve.py).
+
+Subscriber = Callable[[str], None]
+
+
+class SharedState(ABC):
+    """
+    Key/value store with expiry, counters and pub/sub channels.
+    Every method may be called from any thread, some do I/O and shouldn't be called
+    on the event loop; subscribers are called on a background thread (or the publishing one)
+    and must not block.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Any:
+        """Value of a key, None when missing or expired"""
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def update_many(self, keys: Sequence[str], function: Callable[[List[Any]], List[Any]], ttls: Sequence[Optional[float]]) -> List[Any]:
+        """
+        Atomically replace the values of several keys (None when missing) with function(values),
+        the key at each position getting the TTL at that position. Returns the new values.
+        """
+
+    def update(self, key: str, function: Callable[[Any], Any], ttl: Optional[float] = None) -> Any:
+        """Atomically replace a key's value (None when missing) with function(value), returns the new value"""
+        return self.update_many([key], lambda values: [function(values[0])], [ttl])[0]
+
+    @abstractmethod
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        """Add to a counter, starting from 0; the TTL applies from the counter's creation"""
+
+    @abstractmethod
+    def publish(self, channel: str, message: str) -> None:
+        ...
+
+    @abstractmethod
+    def subscribe(self, channel: str, callback: Subscriber) -> None:
+        ...
+
+    @abstractmethod
+    def unsubscribe(self, channel: str, callback: Subscriber) -> None:
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+class LocalSharedState(SharedState):
+    """Dicts of this process, for a single worker"""
+
+    def __init__(self):
+        self._data: dict[str, tuple[Optional[float], Any]] = {}  ## key -> (expires at, value)
+        self._subscribers: dict[str, list[Subscriber]] = defaultdict(list)
+        self._lock = threading.Lock()
+        self._next_sweep = time.time() + settings.shared_state_sweep_interval
+
+    def _get(self, key: str, now: float) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= now:
+            del self._data[key]
+            return None
+        return value
+
+    def _set(self, key: str, value: Any, expires_at: Optional[float], now: float) -> None:
+        if now >= self._next_sweep:
+            self._data = {k: e for k, e in self._data.items() if e[0] is None or e[0] > now}
+            self._next_sweep = now + settings.shared_state_sweep_interval
+        self._data[key] = (expires_at, value)
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            return self._get(key, time.time())
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        now = time.time()
+        with self._lock:
+            self._set(key, value, now + ttl if ttl is not None else None, now)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def update_many(self, keys: Sequence[str], function: Callable[[List[Any]], List[Any]], ttls: Sequence[Optional[float]]) -> List[Any]:
+        now = time.time()
+        with self._lock:
+            values = function([self._get(key, now) for key in keys])
+            for key, value, ttl in zip(keys, values, ttls):
+                self._set(key, value, now + ttl if ttl is not None else None, now)
+            return values
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        now = time.time()
+        with self._lock:
+            value = self._get(key, now)
+            if value is None:
+                expires_at = now + ttl if ttl is not None else None
+            else:
+                expires_at = self._data[key][0]
+            value = (value or 0) + amount
+            self._set(key, value, expires_at, now)
+            return value
+
+    def publish(self, channel: str, message: str) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for callback in subscribers:
+            callback(message)
+
+    def subscribe(self, channel: str, callback: Subscriber) -> None:
+        with self._lock:
+            self._subscribers[channel].append(callback)
+
+    def unsubscribe(self, channel: str, callback: Subscriber) -> None:
+        with self._lock:
+            if callback in self._subscribers.get(channel, ()):
+                self._subscribers[channel].remove(callback)
+
+
+class SQLiteSharedState(SharedState):
+    """
+    A SQLite file shared by the workers of one host. Writes are single statements
+    (or BEGIN IMMEDIATE transactions) so they are atomic across processes; published
+    messages are rows that a thread of every subscribing process polls for.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or settings.shared_state_path
+        self._local = threading.local()
+        self._subscribers: dict[str, list[Subscriber]] = defaultdict(list)
+        self._lock = threading.Lock()
+        self._poller: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        with self._lock:
+            self._connection().executescript("""
+                CREATE TABLE IF NOT EXISTS shared_values (
+                    key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL
+                );
+                CREATE TABLE IF NOT EXISTS shared_messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL,
+                    message TEXT NOT NULL, created_at REAL NOT NULL
+                );
+            """)
+
+    def _connection(self) -> sqlite3.Connection:
+        ## one connection per thread, in autocommit mode
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, isolation_level=None, timeout=settings.sqlite_busy_timeout_ms / 1000)
+            connection.execute("PRAGMA journal_mode=WAL")
+            ## nothing here has to survive a crash of the host
+            connection.execute("PRAGMA synchronous=OFF")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key: str) -> Any:
+        row = self._connection().execute(
+            "SELECT value FROM shared_values WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self._connection().execute(
+            "INSERT OR REPLACE INTO shared_values (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), time.time() + ttl if ttl is not None else None),
+        )
+
+    def delete(self, key: str) -> None:
+        self._connection().execute("DELETE FROM shared_values WHERE key = ?", (key,))
+
+    def update_many(self, keys: Sequence[str], function: Callable[[List[Any]], List[Any]], ttls: Sequence[Optional[float]]) -> List[Any]:
+        connection = self._connection()
+        ## one transaction, with the write lock taken before reading so no other process updates in between
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            values = function([self.get(key) for key in keys])
+            for key, value, ttl in zip(keys, values, ttls):
+                self.set(key, value, ttl)
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return values
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        now = time.time()
+        row = self._connection().execute(
+            """
+            INSERT INTO shared_values (key, value, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET
+                value = CASE WHEN expires_at IS NULL OR expires_at > ? THEN value + excluded.value ELSE excluded.value END,
+                expires_at = CASE WHEN expires_at IS NULL OR expires_at > ? THEN expires_at ELSE excluded.expires_at END
+            RETURNING value
+            """,
+            (key, amount, now + ttl if ttl is not None else None, now, now),
+        ).fetchone()
+        return int(row[0])
+
+    def publish(self, channel: str, message: str) -> None:
+        self._connection().execute(
+            "INSERT INTO shared_messages (channel, message, created_at) VALUES (?, ?, ?)",
+            (channel, message, time.time()),
+        )
+
+    def subscribe(self, channel: str, callback: Subscriber) -> None:
+        with self._lock:
+            self._subscribers[channel].append(callback)
+            if self._poller is None:
+                ## messages published from now on, read before returning so none is missed
+                last_id = self._connection().execute("SELECT COALESCE(MAX(id), 0) FROM shared_messages").fetchone()[0]
+                self._stopping.clear()
+                self._poller = threading.Thread(target=self._poll, args=(last_id,), name="shared-state-poller", daemon=True)
+                self._poller.start()
+
+    def unsubscribe(self, channel: str, callback: Subscriber) -> None:
+        with self._lock:
+            if callback in self._subscribers.get(channel, ()):
+                self._subscribers[channel].remove(callback)
+
+    def _poll(self, last_id: int) -> None:
+        """Hand messages published after `last_id` to this process' subscribers"""
+        connection = self._connection()
+        next_sweep = 0.0
+        while not self._stopping.wait(settings.shared_state_poll_interval):
+            try:
+                rows = connection.execute(
+                    "SELECT id, channel, message FROM shared_messages WHERE id > ? ORDER BY id", (last_id,),
+                ).fetchall()
+                for message_id, channel, message in rows:
+                    last_id = message_id
+                    with self._lock:
+                        subscribers = list(self._subscribers.get(channel, ()))
+                    for callback in subscribers:
+                        try:
+                            callback(message)
+                        except Exception:
+                            logger.exception("Shared state subscriber of %r failed", channel)
+                now = time.time()
+                if now >= next_sweep:
+                    self._sweep(connection, now)
+                    next_sweep = now + settings.shared_state_sweep_interval
+            except sqlite3.OperationalError:
+                ## locked by another worker for longer than the busy timeout, try again on the next round
+                logger.warning("Shared state poll failed", exc_info=True)
+
+    def _sweep(self, connection: sqlite3.Connection, now: float) -> None:
+        ## every poller has long read messages this old
+        connection.execute("DELETE FROM shared_messages WHERE created_at < ?", (now - settings.shared_state_message_retention,))
+        connection.execute("DELETE FROM shared_values WHERE expires_at <= ?", (now,))
+
+    def close(self) -> None:
+        self._stopping.set()
+        if self._poller is not None:
+            self._poller.join()
+            self._poller = None
+
+
+def load_state(path: str) -> SharedState:
+    """Instantiate a shared state from a "module:Class" path"""
+    module_name, _, class_name = path.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+shared_state = load_state(settings.shared_state_backend)
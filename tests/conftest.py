@@ -0,0 +1,67 @@
+import itertools
+import os
+import tempfile
+
+import pytest
+
+## the app reads its settings when imported: a throwaway database, no log file,
+## and limits no test reaches unless it lowers them itself
+WORKDIR = tempfile.mkdtemp(prefix="kanban-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{WORKDIR}/test.db",
+    "ASYNC_ROUTERS": "false",
+    "LOG_FILE": "",
+    "LOG_LEVEL": "WARNING",
+    "LOG_ACCESS": "false",
+    "RATE_LIMIT_IP": "100000/second",
+    "RATE_LIMIT_USER": "100000/second",
+    "RATE_LIMIT_ROUTES": "{}",
+})
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ.pop("DATABASE_READ_URLS", None)
+
+from fastapi.testclient import TestClient
+
+import main
+import models
+from database import SessionLocal
+from routers.auth import create_access_token
+
+emails = itertools.count()
+
+
+@pytest.fixture(scope="session")
+def client():
+    """Anonymous client; entering it runs the app's lifespan (init_db, event hub) once for the session"""
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture
+def make_user(client):
+    """
+    Create a user straight in the database and return (user_id, client logged in as them).
+    The token is issued directly, password hashing is only exercised by the tests about it.
+    """
+
+    def make(name: str = "user"):
+        with SessionLocal() as db:
+            user = models.User(name=name, email=f"{name}{next(emails)}@test.local", password_hash="", password_salt="")
+            db.add(user)
+            db.commit()
+            user_id = user.id
+        user_client = TestClient(main.app)
+        user_client.cookies.set("access_token", create_access_token({"sub": str(user_id)}))
+        return user_id, user_client
+
+    return make
+
+
+def create_project(client: TestClient, name: str = "project", tasks: int = 0) -> int:
+    """Create a project (and tasks in it) through the API, returns its id"""
+    response = client.post("/projects/", json={"name": name, "description": "test"})
+    assert response.status_code == 200, response.text
+    project_id = max(project["id"] for project in client.get("/projects/?compact=true").json())
+    for i in range(tasks):
+        assert client.post(f"/projects/{project_id}/tasks", json={"title": f"task {i}"}).status_code == 200
+    return project_id
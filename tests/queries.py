@@ -0,0 +1,45 @@
+from contextlib import contextmanager
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import database
+
+
+class QueryCounter:
+    """Collects the SQL statements executed while it is attached to an engine"""
+
+    def __init__(self):
+        self.statements: list[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def assert_at_most(self, expected: int) -> None:
+        """Fail with the offending statements when more than `expected` queries ran"""
+        assert self.count <= expected, (
+            f"expected at most {expected} queries, got {self.count}:\n" + "\n".join(self.statements)
+        )
+
+
+@contextmanager
+def count_queries(bind: Optional[Engine] = None):
+    """
+    Count the SQL statements run on an engine inside the block, e.g. to catch N+1 regressions:
+
+        with count_queries() as queries:
+            client.get("/projects/")
+        queries.assert_at_most(4)
+    """
+    bind = bind if bind is not None else database.engine
+    counter = QueryCounter()
+    event.listen(bind, "before_cursor_execute", counter)
+    try:
+        yield counter
+    finally:
+        event.remove(bind, "before_cursor_execute", counter)
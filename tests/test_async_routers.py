@@ -0,0 +1,112 @@
+import inspect
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture(scope="module")
+def async_app(client):
+    """The API as built with ASYNC_ROUTERS=true, on the database the session client set up"""
+    app = FastAPI(exception_handlers=main.app.exception_handlers)
+    for router in main.api_routers(async_routers=True):
+        app.include_router(router)
+    return app
+
+
+@pytest.fixture
+def make_async_user(async_app, make_user):
+    """(user_id, client of the async app logged in as a new user)"""
+    clients = []
+
+    def make(name: str = "user"):
+        user_id, user = make_user(name)
+        async_client = TestClient(async_app)
+        async_client.cookies.set("access_token", user.cookies["access_token"])
+        clients.append(async_client.__enter__())
+        return user_id, async_client
+
+    yield make
+    for async_client in clients:
+        async_client.__exit__(None, None, None)
+
+
+def endpoint(app: FastAPI, method: str, path: str):
+    return next(route.endpoint for route in app.routes if route.path == path and method in route.methods)
+
+
+def test_async_routes_replace_sync_ones(async_app):
+    assert inspect.iscoroutinefunction(endpoint(async_app, "GET", "/projects/{project_id}"))
+    assert inspect.iscoroutinefunction(endpoint(async_app, "POST", "/auth/login"))
+    ## not ported, served by the sync router
+    assert not inspect.iscoroutinefunction(endpoint(async_app, "POST", "/projects/{project_id}/tasks/batch"))
+
+
+def test_project_and_task_crud(make_async_user):
+    _, user = make_async_user()
+    response = user.post("/projects/", json={"name": "async", "description": "test"})
+    assert response.status_code == 200, response.text
+    project_id = max(project["id"] for project in user.get("/projects/?compact=true").json())
+
+    response = user.post(f"/projects/{project_id}/tasks", json={"title": "first"})
+    assert response.status_code == 200, response.text
+    task_id = user.get(f"/projects/{project_id}/tasks").json()[0]["id"]
+    response = user.put(f"/projects/{project_id}/tasks/{task_id}", json={"title": "renamed", "status": "in_progress"})
+    assert response.status_code == 200, response.text
+    task = user.get(f"/projects/{project_id}/tasks/{task_id}").json()
+    assert (task["title"], task["status"]) == ("renamed", "in_progress")
+
+    assert user.put(f"/projects/{project_id}", json={"name": "renamed project"}).status_code == 200
+    assert user.get(f"/projects/{project_id}").json()["name"] == "renamed project"
+
+    assert user.delete(f"/projects/{project_id}/tasks/{task_id}").status_code == 200
+    assert user.get(f"/projects/{project_id}/tasks/{task_id}").status_code == 404
+    assert user.delete(f"/projects/{project_id}").status_code == 200
+    assert user.get(f"/projects/{project_id}").status_code == 404
+
+
+def test_membership_is_checked(make_async_user):
+    _, owner = make_async_user()
+    _, outsider = make_async_user()
+    owner.post("/projects/", json={"name": "private", "description": "test"})
+    project_id = max(project["id"] for project in owner.get("/projects/?compact=true").json())
+    owner.post(f"/projects/{project_id}/tasks", json={"title": "secret"})
+    task_id = owner.get(f"/projects/{project_id}/tasks").json()[0]["id"]
+
+    for response in (
+        outsider.get(f"/projects/{project_id}"),
+        outsider.get(f"/projects/{project_id}/tasks"),
+        outsider.get(f"/projects/{project_id}/tasks/{task_id}"),
+        outsider.post(f"/projects/{project_id}/tasks", json={"title": "intruder"}),
+        outsider.delete(f"/projects/{project_id}"),
+    ):
+        assert response.status_code == 403, response.text
+        assert response.json()["error"]["status_code"] == 403
+
+    ## the task exists, but not in the outsider's own project
+    outsider.post("/projects/", json={"name": "own", "description": "test"})
+    own_id = max(project["id"] for project in outsider.get("/projects/?compact=true").json())
+    assert outsider.get(f"/projects/{own_id}/tasks/{task_id}").status_code == 404
+    assert outsider.get("/projects/999999").status_code == 404
+
+    ## once added, the outsider gets in
+    email = outsider.get("/me/").json()["email"]
+    assert owner.post(f"/projects/{project_id}/users", json={"user_email": email}).status_code == 200
+    assert outsider.get(f"/projects/{project_id}").status_code == 200
+
+
+def test_login(async_app, client):
+    response = client.post("/users/", json={"name": "bob", "email": "bob@async.test", "password": "correct horse"})
+    assert response.status_code == 200, response.text
+
+    with TestClient(async_app) as user:
+        wrong = user.post("/auth/login", json={"email": "bob@async.test", "password": "wrong"})
+        assert wrong.status_code == 401
+        assert user.post("/auth/login", json={"email": "nobody@async.test", "password": "x"}).status_code == 401
+
+        response = user.post("/auth/login", json={"email": "bob@async.test", "password": "correct horse"})
+        assert response.status_code == 200, response.text
+        assert "access_token" in user.cookies
+        assert user.get("/projects/").status_code == 200
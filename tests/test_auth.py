@@ -0,0 +1,43 @@
+from fastapi.testclient import TestClient
+
+import main
+from routers.auth import INVALIDATIONS_CHANNEL, _token_cache_key, principal_cache
+from shared import shared_state
+
+
+def test_sign_up_and_log_in(client):
+    ## a client of its own, the session one stays anonymous
+    user = TestClient(main.app)
+    response = user.post("/users/", json={"name": "alice", "email": "alice@signup.test", "password": "correct horse"})
+    assert response.status_code == 200, response.text
+    user_id = response.json()["id"]
+
+    wrong = user.post("/auth/login", json={"email": "alice@signup.test", "password": "wrong"})
+    assert wrong.status_code == 401
+    assert "access_token" not in user.cookies
+
+    response = user.post("/auth/login", json={"email": "alice@signup.test", "password": "correct horse"})
+    assert response.status_code == 200, response.text
+    assert response.json()["user"]["id"] == user_id
+    assert "access_token" in user.cookies
+    assert user.get("/me/").status_code == 200
+
+
+def test_log_in_unknown_email(client):
+    response = client.post("/auth/login", json={"email": "nobody@signup.test", "password": "x"})
+    assert response.status_code == 401
+
+
+def test_invalidation_from_another_worker(make_user):
+    user_id, user = make_user()
+    assert user.get("/me/").status_code == 200
+    key = _token_cache_key(user.cookies["access_token"])
+    assert principal_cache.get(key) is not None
+
+    ## what a logout or user deletion served by another worker publishes
+    shared_state.publish(INVALIDATIONS_CHANNEL, f"user:{user_id}")
+    assert principal_cache.get(key) is None
+
+    assert user.get("/me/").status_code == 200
+    shared_state.publish(INVALIDATIONS_CHANNEL, f"token:{key}")
+    assert principal_cache.get(key) is None
@@ -0,0 +1,58 @@
+from config import settings
+from tests.conftest import create_project
+
+
+def tasks_by_id(client, project_id: int) -> dict:
+    return {task["id"]: task for task in client.get(f"/projects/{project_id}/tasks").json()}
+
+
+def test_batch_applies_every_kind_of_operation(make_user):
+    _, client = make_user()
+    project_id = create_project(client, tasks=3)
+    first, second, third = sorted(tasks_by_id(client, project_id))
+
+    response = client.post(f"/projects/{project_id}/tasks/batch", json={
+        "create": [{"title": "new 1"}, {"title": "new 2", "status": "completed"}],
+        "update": [{"id": first, "title": "renamed"}],
+        "move": [{"id": second, "status": "completed"}],
+        "delete": [third],
+    })
+    assert response.status_code == 200, response.text
+    results = response.json()
+    assert all(result["ok"] for result in results)
+    created = [result["id"] for result in results if result["op"] == "create"]
+    assert len(created) == 2
+
+    tasks = tasks_by_id(client, project_id)
+    assert set(tasks) == {first, second, *created}
+    assert tasks[first]["title"] == "renamed"
+    assert tasks[second]["status"] == "completed"
+    assert tasks[created[1]]["status"] == "completed"
+    ## creates run before moves, both append to the end of their column
+    board = client.get(f"/projects/{project_id}/board").json()
+    completed = next(column for column in board["columns"] if column["status"] == "completed")
+    assert [task["id"] for task in completed["tasks"]] == [created[1], second]
+
+
+def test_batch_reports_tasks_of_other_projects_as_failed(make_user):
+    _, client = make_user()
+    project_id = create_project(client, tasks=1)
+    other_project_id = create_project(client, tasks=1)
+    (task_id,) = tasks_by_id(client, project_id)
+    (foreign_id,) = tasks_by_id(client, other_project_id)
+
+    results = client.post(f"/projects/{project_id}/tasks/batch", json={
+        "update": [{"id": task_id, "title": "kept"}, {"id": foreign_id, "title": "not mine"}],
+        "delete": [foreign_id],
+    }).json()
+    failed = [(result["op"], result["id"]) for result in results if not result["ok"]]
+    assert failed == [("update", foreign_id), ("delete", foreign_id)]
+    assert tasks_by_id(client, project_id)[task_id]["title"] == "kept"
+    assert tasks_by_id(client, other_project_id)[foreign_id]["title"] != "not mine"
+
+
+def test_batch_size_is_limited(make_user):
+    _, client = make_user()
+    project_id = create_project(client)
+    too_many = {"delete": list(range(settings.max_batch_size + 1))}
+    assert client.post(f"/projects/{project_id}/tasks/batch", json=too_many).status_code == 400
@@ -0,0 +1,55 @@
+from routers.projects import response_cache
+from tests.conftest import create_project
+
+
+def test_task_pages_have_their_own_etags(make_user):
+    _, client = make_user()
+    project_id = create_project(client, tasks=5)
+    path = f"/projects/{project_id}/tasks"
+
+    first = client.get(path, params={"limit": 2})
+    assert first.status_code == 200
+    cursor = first.headers["X-Next-Cursor"]
+    second = client.get(path, params={"limit": 2, "after": cursor})
+    filtered = client.get(path, params={"status": "completed"})
+    etags = {response.headers["ETag"] for response in (first, second, filtered, client.get(path))}
+    assert len(etags) == 4
+
+    ## another page's ETag doesn't make this one 304
+    assert client.get(path, params={"limit": 2}, headers={"If-None-Match": second.headers["ETag"]}).status_code == 200
+
+
+def test_not_modified_carries_the_next_cursor(make_user):
+    _, client = make_user()
+    project_id = create_project(client, tasks=3)
+    path = f"/projects/{project_id}/tasks"
+
+    page = client.get(path, params={"limit": 2})
+    revalidated = client.get(path, params={"limit": 2}, headers={"If-None-Match": page.headers["ETag"]})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["X-Next-Cursor"] == page.headers["X-Next-Cursor"]
+
+
+def test_not_modified_cursor_without_cached_page(make_user):
+    _, client = make_user()
+    project_id = create_project(client, tasks=3)
+    path = f"/projects/{project_id}/tasks"
+    page = client.get(path, params={"limit": 2})
+    response_cache.invalidate_tag(("project", project_id))
+
+    revalidated = client.get(path, params={"limit": 2}, headers={"If-None-Match": page.headers["ETag"]})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["X-Next-Cursor"] == page.headers["X-Next-Cursor"]
+
+
+def test_write_changes_the_etag(make_user):
+    _, client = make_user()
+    project_id = create_project(client, tasks=1)
+    path = f"/projects/{project_id}/tasks"
+    etag = client.get(path).headers["ETag"]
+    assert client.get(path, headers={"If-None-Match": etag}).status_code == 304
+
+    assert client.post(path, json={"title": "another"}).status_code == 200
+    response = client.get(path, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert len(response.json()) == 2
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from events import SharedEventBackend
+
+from tests.conftest import create_project
+
+
+def as_user(user_client) -> dict:
+    """Headers carrying a user's token, for requests made through the session client"""
+    return {"cookie": f"access_token={user_client.cookies['access_token']}"}
+
+
+def test_removed_member_is_disconnected(client, make_user):
+    ## sockets go through the session client, whose event loop runs the event hub
+    _, owner = make_user()
+    member_id, member = make_user()
+    project_id = create_project(owner)
+    assert owner.post(f"/projects/{project_id}/users/bulk", json={"user_ids": [member_id]}).status_code == 200
+    path = f"/projects/{project_id}/events"
+
+    with client.websocket_connect(path, headers=as_user(owner)) as owner_socket, \
+            client.websocket_connect(path, headers=as_user(member)) as member_socket:
+        assert client.delete(f"/projects/{project_id}/users/{member_id}", headers=as_user(owner)).status_code == 200
+
+        assert member_socket.receive_json()["type"] == "members.removed"
+        with pytest.raises(WebSocketDisconnect) as closed:
+            member_socket.receive_json()
+        assert closed.value.code == 1008
+
+        ## the others stay subscribed
+        assert owner_socket.receive_json() == {"type": "members.removed", "project_id": project_id, "user_ids": [member_id]}
+        assert client.post(f"/projects/{project_id}/tasks", json={"title": "t"}, headers=as_user(owner)).status_code == 200
+        assert owner_socket.receive_json()["type"] == "task.created"
+
+
+def test_non_member_cannot_subscribe(client, make_user):
+    _, owner = make_user()
+    _, outsider = make_user()
+    project_id = create_project(owner)
+    with pytest.raises(WebSocketDisconnect) as closed:
+        with client.websocket_connect(f"/projects/{project_id}/events", headers=as_user(outsider)) as socket:
+            socket.receive_json()
+    assert closed.value.code == 1008
+
+
+def test_shared_backend_publishes_in_order_off_the_caller():
+    async def run():
+        received = []
+        backend = SharedEventBackend()
+        await backend.start(lambda project_id, event: received.append((project_id, event)))
+        for i in range(20):
+            backend.publish(1, str(i))
+        ## stopping sends what was published before
+        await backend.stop()
+        await asyncio.sleep(0)
+        return received
+
+    assert asyncio.run(run()) == [(1, str(i)) for i in range(20)]
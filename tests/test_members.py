@@ -0,0 +1,117 @@
+from sqlalchemy import exists, func, select
+from sqlalchemy.dialects import postgresql
+
+import main
+import routers.projects
+from changelog import MEMBER
+from database import SessionLocal, get_db
+from models import ChangeLog, project_user
+from routers.projects import add_members_statement
+from tests.conftest import create_project
+
+
+def test_remove_member(make_user):
+    _, client = make_user()
+    other_id, _ = make_user()
+    project_id = create_project(client)
+    assert client.post(f"/projects/{project_id}/users/bulk", json={"user_ids": [other_id]}).status_code == 200
+    etag = client.get(f"/projects/{project_id}").headers["ETag"]
+
+    response = client.delete(f"/projects/{project_id}/users/{other_id}")
+    assert response.status_code == 200
+    assert response.json() == {"user_ids": [other_id]}
+    ## the removal bumped the project's version
+    assert client.get(f"/projects/{project_id}", headers={"If-None-Match": etag}).status_code == 200
+    assert other_id not in [user["id"] for user in client.get(f"/projects/{project_id}/users").json()]
+
+
+def test_last_member_cannot_be_removed(make_user):
+    user_id, client = make_user()
+    project_id = create_project(client)
+    assert client.delete(f"/projects/{project_id}/users/{user_id}").status_code == 400
+    assert client.request("DELETE", f"/projects/{project_id}/users", json={"user_ids": [user_id]}).status_code == 400
+    assert [user["id"] for user in client.get(f"/projects/{project_id}/users").json()] == [user_id]
+
+
+def last_change_id() -> int:
+    with SessionLocal() as db:
+        return db.scalar(select(func.max(ChangeLog.id))) or 0
+
+
+def member_changes(project_id: int, after: int) -> list:
+    """(user id, op) of the membership changes logged after a change log id"""
+    with SessionLocal() as db:
+        return db.execute(
+            select(ChangeLog.entity_id, ChangeLog.op)
+            .where(ChangeLog.id > after, ChangeLog.project_id == project_id, ChangeLog.entity == MEMBER)
+            .order_by(ChangeLog.id)
+        ).all()
+
+
+def test_bulk_membership_changes_log_only_affected_users(make_user):
+    user_id, client = make_user()
+    member_id, _ = make_user()
+    outsider_id, _ = make_user()
+    project_id = create_project(client)
+    assert client.post(f"/projects/{project_id}/users/bulk", json={"user_ids": [member_id]}).status_code == 200
+    after = last_change_id()
+
+    ## the owner and the member already belong to the project
+    assert client.post(f"/projects/{project_id}/users/bulk", json={"user_ids": [user_id, member_id, outsider_id]}).status_code == 200
+    assert member_changes(project_id, after) == [(outsider_id, "upsert")]
+    after = last_change_id()
+
+    ## the removed outsider is the only one of these who was a member
+    response = client.request("DELETE", f"/projects/{project_id}/users", json={"user_ids": [outsider_id, 999999]})
+    assert response.status_code == 200
+    assert member_changes(project_id, after) == [(outsider_id, "delete")]
+
+    ## a no-op leaves the project's version alone
+    etag = client.get(f"/projects/{project_id}").headers["ETag"]
+    assert client.post(f"/projects/{project_id}/users/bulk", json={"user_ids": [member_id]}).status_code == 200
+    assert client.get(f"/projects/{project_id}", headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_read_routes_check_membership_on_their_read_session(make_user):
+    _, owner = make_user()
+    project_id = create_project(owner, tasks=1)
+    task_id = owner.get(f"/projects/{project_id}/tasks").json()[0]["id"]
+    _, outsider = make_user()
+
+    def no_primary_session():
+        raise AssertionError("a read route opened a primary session")
+        yield
+
+    main.app.dependency_overrides[get_db] = no_primary_session
+    try:
+        for path in ("users", "tasks", f"tasks/{task_id}", "board"):
+            assert owner.get(f"/projects/{project_id}/{path}").status_code == 200, path
+            assert outsider.get(f"/projects/{project_id}/{path}").status_code == 403, path
+    finally:
+        del main.app.dependency_overrides[get_db]
+
+
+def test_concurrent_adds_of_the_same_member(make_user, monkeypatch):
+    _, owner = make_user()
+    member_id, _ = make_user()
+    new_id, _ = make_user()
+    project_id = create_project(owner)
+    assert owner.post(f"/projects/{project_id}/users/bulk", json={"user_ids": [member_id]}).status_code == 200
+
+    ## a concurrent add committed after this statement's NOT EXISTS looked: the filter lets the member through
+    monkeypatch.setattr(routers.projects, "is_member_clause", lambda project_id, user_id: exists().where(project_user.c.project_id == -1))
+    statement = add_members_statement("sqlite", project_id, [member_id, new_id])
+    monkeypatch.undo()
+    with SessionLocal() as db:
+        assert db.scalars(statement).all() == [new_id]
+        db.commit()
+    assert "ON CONFLICT DO NOTHING" in str(
+        add_members_statement("postgresql", project_id, [new_id]).compile(dialect=postgresql.dialect())
+    )
+
+    ## adding members again is not an error for the bulk route, a 400 for the single one
+    response = owner.post(f"/projects/{project_id}/users/bulk", json={"user_ids": [member_id, new_id]})
+    assert response.status_code == 200
+    email = owner.get(f"/projects/{project_id}/users/{member_id}").json()["email"]
+    response = owner.post(f"/projects/{project_id}/users", json={"user_email": email})
+    assert response.status_code == 400
@@ -0,0 +1,64 @@
+import time
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+import metrics
+from hashing import HashingPool
+from metrics import Counter, Metric
+from tests.conftest import create_project
+
+
+def test_metrics_render_requests_pool_and_startup(client, make_user):
+    _, user = make_user()
+    create_project(user)
+    body = client.get("/metrics").text
+
+    assert 'http_requests_total{method="POST",route="/projects/",status="200"}' in body
+    assert 'db_pool_checkout_wait_seconds_count{engine="sync"}' in body
+    assert 'app_startup_phase_seconds{phase="init_db"}' in body
+
+
+def test_metric_needs_render():
+    with pytest.raises(TypeError):
+        Metric("incomplete", "A metric that can't render")
+    assert Counter("complete", "A counter").render()[0] == "# HELP complete A counter"
+
+
+def test_password_hashing_metrics(client):
+    rejected = metrics.hashes_rejected.values.get((), 0)
+    response = client.post("/users/", json={"name": "hasher", "email": "hasher@metrics.test", "password": "pw"})
+    assert response.status_code == 200, response.text
+    body = client.get("/metrics").text
+    assert "password_hash_queue_wait_seconds_count " in body
+    assert "password_hash_duration_seconds_count " in body
+    assert "password_hashes_in_flight 0" in body
+
+    ## every slot taken: the next hash is refused and counted
+    pool = HashingPool(workers=1, max_queue=0)
+    assert pool._slots.acquire(blocking=False)
+    with pytest.raises(HTTPException) as refused:
+        pool.submit("pw", "salt")
+    assert refused.value.status_code == 503
+    assert metrics.hashes_rejected.values[()] == rejected + 1
+
+
+def test_failed_statement_leaves_no_timing_behind():
+    engine = create_engine("sqlite://")
+    metrics.instrument_engine(engine)
+    queries = metrics.RequestQueries()
+    token = metrics.current_queries.set(queries)
+    try:
+        with engine.connect() as connection:
+            with pytest.raises(OperationalError):
+                connection.execute(text("SELECT * FROM missing"))
+            time.sleep(0.2)
+            connection.execute(text("SELECT 1"))
+            assert not connection.info.get("metrics_started")
+    finally:
+        metrics.current_queries.reset(token)
+    ## only the statement that ran is counted, timed from its own start
+    assert queries.count == 1
+    assert queries.seconds < 0.2
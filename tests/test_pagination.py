@@ -0,0 +1,74 @@
+from tests.conftest import create_project
+
+NEXT_CURSOR = "X-Next-Cursor"
+
+
+def walk(client, path: str, limit: int, **params) -> list:
+    """Every page of a listing following X-Next-Cursor, returns the ids in the order served"""
+    ids, after = [], None
+    for _ in range(100):
+        page_params = {"limit": limit, **params}
+        if after is not None:
+            page_params["after"] = after
+        response = client.get(path, params=page_params)
+        assert response.status_code == 200, response.text
+        page = [item["id"] for item in response.json()]
+        assert len(page) <= limit
+        ids.extend(page)
+        after = response.headers.get(NEXT_CURSOR)
+        if after is None:
+            return ids
+        assert page, "a cursor was handed out with an empty page"
+    raise AssertionError("pagination never ended")
+
+
+def test_task_pages_cover_every_task_once(make_user):
+    _, user = make_user()
+    project_id = create_project(user)
+    ## identical tasks: nothing but the id tells them apart
+    for _ in range(7):
+        assert user.post(f"/projects/{project_id}/tasks", json={"title": "same"}).status_code == 200
+    everything = [task["id"] for task in user.get(f"/projects/{project_id}/tasks").json()]
+    assert len(everything) == 7
+
+    for limit in (1, 2, 3, 7, 50):
+        assert walk(user, f"/projects/{project_id}/tasks", limit) == everything, limit
+    assert walk(user, f"/projects/{project_id}/tasks", 2, status="pending") == everything
+    assert walk(user, f"/projects/{project_id}/tasks", 2, status="completed") == []
+
+
+def test_project_pages_cover_every_project_once(make_user):
+    _, user = make_user()
+    created = sorted(create_project(user, name="same") for _ in range(5))
+    assert walk(user, "/projects/", 2, compact="true") == created
+    assert walk(user, "/projects/", 2) == created
+
+
+def test_search_pages_with_equal_scores(make_user):
+    _, user = make_user()
+    project_id = create_project(user)
+    for _ in range(5):
+        user.post(f"/projects/{project_id}/tasks", json={"title": "Quokkaword"})
+    ids = walk(user, "/search/tasks", 2, q="quokkaword")
+    assert len(ids) == len(set(ids)) == 5
+
+
+def test_malformed_cursors_are_client_errors(make_user):
+    _, user = make_user()
+    project_id = create_project(user, tasks=2)
+    for path, params in [
+        (f"/projects/{project_id}/tasks", {"after": "abc"}),
+        (f"/projects/{project_id}/tasks", {"after": "1.5"}),
+        (f"/projects/{project_id}/tasks", {"limit": 0}),
+        ("/projects/", {"after": "not-a-cursor"}),
+        ("/search/tasks", {"q": "task", "after": "-1"}),
+        ("/search/tasks", {"q": "task", "after": "abc"}),
+    ]:
+        response = user.get(path, params=params)
+        assert response.status_code == 422, (path, params, response.text)
+        assert response.json()["error"]["type"] == "validation_error"
+
+    ## a cursor past the end is an empty last page
+    response = user.get(f"/projects/{project_id}/tasks", params={"limit": 2, "after": 10**9})
+    assert response.status_code == 200
+    assert response.json() == [] and NEXT_CURSOR not in response.headers
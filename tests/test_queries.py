@@ -0,0 +1,54 @@
+from tests.conftest import create_project
+from tests.queries import count_queries
+
+
+def project_reads(make_user, projects: int, members: int = 2, tasks: int = 3):
+    """A user with `projects` projects of `tasks` tasks and `members` members each"""
+    user_id, client = make_user()
+    others = [make_user()[0] for _ in range(members - 1)]
+    project_ids = []
+    for i in range(projects):
+        project_id = create_project(client, f"p{i}", tasks=tasks)
+        if others:
+            assert client.post(f"/projects/{project_id}/users/bulk", json={"user_ids": others}).status_code == 200
+        project_ids.append(project_id)
+    return client, project_ids
+
+
+def queries_of(client, path: str) -> int:
+    with count_queries() as queries:
+        assert client.get(path).status_code == 200
+    return queries.count
+
+
+def test_project_list_queries_do_not_grow_with_projects(make_user):
+    small, _ = project_reads(make_user, projects=1)
+    large, _ = project_reads(make_user, projects=6)
+    assert queries_of(large, "/projects/") == queries_of(small, "/projects/")
+
+
+def test_project_list_query_count(make_user):
+    client, _ = project_reads(make_user, projects=3)
+    with count_queries() as queries:
+        client.get("/projects/")
+    queries.assert_at_most(4)
+
+
+def test_me_queries_do_not_grow_with_projects(make_user):
+    small, _ = project_reads(make_user, projects=1)
+    large, _ = project_reads(make_user, projects=6)
+    assert queries_of(large, "/me/") == queries_of(small, "/me/")
+
+
+def test_me_query_count(make_user):
+    client, _ = project_reads(make_user, projects=3)
+    with count_queries() as queries:
+        client.get("/me/")
+    queries.assert_at_most(4)
+
+
+def test_project_query_count(make_user):
+    client, (project_id,) = project_reads(make_user, projects=1, members=4, tasks=10)
+    with count_queries() as queries:
+        client.get(f"/projects/{project_id}")
+    queries.assert_at_most(4)
@@ -0,0 +1,100 @@
+import random
+
+import pytest
+
+from config import settings
+from ranking import DIGITS, rank_between, spread_ranks
+from tests.conftest import create_project
+
+
+def test_rank_between_sorts_between_its_bounds():
+    generator = random.Random(0)
+    ranks = [rank_between(None, None)]
+    for _ in range(2000):
+        index = generator.randrange(len(ranks) + 1)
+        before = ranks[index - 1] if index > 0 else None
+        after = ranks[index] if index < len(ranks) else None
+        rank = rank_between(before, after)
+        assert (before is None or before < rank) and (after is None or rank < after)
+        assert set(rank) <= set(DIGITS) and not rank.endswith(DIGITS[0])
+        ranks.insert(index, rank)
+    assert ranks == sorted(ranks)
+
+
+def test_repeated_inserts_at_one_spot_grow_slowly():
+    ## always moving a task right after the same one: one more digit every few moves
+    before, after = "i", "j"
+    for _ in range(100):
+        after = rank_between(before, after)
+    assert len(after) <= 25
+
+
+def test_appending_keeps_ranks_short():
+    rank = None
+    for _ in range(10000):
+        rank = rank_between(rank, None)
+    assert len(rank) <= 4
+
+
+def test_rank_between_rejects_misordered_bounds():
+    with pytest.raises(ValueError):
+        rank_between("b", "a")
+
+
+def test_spread_ranks_are_increasing_and_spaced():
+    for count in (1, 2, 35, 36, 1000):
+        ranks = spread_ranks(count)
+        assert len(ranks) == count
+        assert ranks == sorted(set(ranks))
+        for before, after in zip([None, *ranks], [*ranks, None]):
+            rank_between(before, after)
+
+
+def column(client, project_id: int, status: str = "pending") -> list:
+    board = client.get(f"/projects/{project_id}/board", params={"per_column": 100}).json()
+    return [task["id"] for task in next(c for c in board["columns"] if c["status"] == status)["tasks"]]
+
+
+def test_move_between_tasks(make_user):
+    _, client = make_user()
+    project_id = create_project(client, tasks=4)
+    a, b, c, d = column(client, project_id)
+
+    moved = client.post(f"/projects/{project_id}/tasks/{d}/move", json={"after_id": a, "before_id": b})
+    assert moved.status_code == 200, moved.text
+    assert column(client, project_id) == [a, d, b, c]
+
+    assert client.post(f"/projects/{project_id}/tasks/{a}/move", json={}).status_code == 200
+    assert column(client, project_id) == [d, b, c, a]
+
+    assert client.post(f"/projects/{project_id}/tasks/{b}/move", json={"status": "completed"}).status_code == 200
+    assert column(client, project_id) == [d, c, a]
+    assert column(client, project_id, "completed") == [b]
+
+
+def test_move_rejects_bad_neighbours(make_user):
+    _, client = make_user()
+    project_id = create_project(client, tasks=3)
+    a, b, c = column(client, project_id)
+    move = f"/projects/{project_id}/tasks/{a}/move"
+    assert client.post(move, json={"after_id": a}).status_code == 400
+    assert client.post(move, json={"after_id": c, "before_id": b}).status_code == 400
+    assert client.post(move, json={"after_id": 999999}).status_code == 404
+    assert client.post(move, json={"status": "completed", "after_id": b}).status_code == 400
+
+
+def test_long_ranks_rebalance_the_column(make_user, monkeypatch):
+    monkeypatch.setattr(settings, "task_rank_max_length", 3)
+    _, client = make_user()
+    project_id = create_project(client, tasks=3)
+    a, b, c = column(client, project_id)
+
+    ## keep squeezing c right after a until ranks need rebalancing
+    order = [a, b, c]
+    for _ in range(10):
+        first, second, last = order
+        assert client.post(f"/projects/{project_id}/tasks/{last}/move", json={"after_id": first, "before_id": second}).status_code == 200
+        order = [first, last, second]
+        assert column(client, project_id) == order
+    ranks = [task["rank"] for task in client.get(f"/projects/{project_id}/tasks").json()]
+    assert all(len(rank) <= 3 for rank in ranks)
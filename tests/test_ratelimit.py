@@ -0,0 +1,60 @@
+import pytest
+from starlette.requests import Request
+
+from config import settings
+from ratelimit import Limit, MemoryRateLimitBackend, RateLimiter, SharedRateLimitBackend, client_ip, rate_limiter
+
+
+@pytest.fixture(params=[MemoryRateLimitBackend, SharedRateLimitBackend])
+def limiter(request):
+    limiter = RateLimiter(request.param())
+    limiter.ip_limit = Limit(rate=0.001, burst=10)
+    limiter.user_limit = Limit(rate=0.001, burst=2)
+    ## a fresh user id per test, the shared backend keeps its buckets in the shared state
+    limiter.user_id = id(limiter)
+    return limiter
+
+
+def test_refused_request_takes_no_tokens(limiter):
+    assert limiter.check("10.0.0.1", limiter.user_id, None) == 0
+    assert limiter.check("10.0.0.1", limiter.user_id, None) == 0
+    ## the user's bucket is empty: refused, and the IP's bucket keeps its tokens
+    for _ in range(20):
+        assert limiter.check("10.0.0.1", limiter.user_id, None) > 0
+    for _ in range(8):
+        assert limiter.check("10.0.0.1", None, None) == 0
+    assert limiter.check("10.0.0.1", None, None) > 0
+    assert limiter.stats()["rejected"] == 21
+
+
+def connection(forwarded_for=None, peer="203.0.113.9") -> Request:
+    headers = [(b"x-forwarded-for", forwarded_for.encode())] if forwarded_for is not None else []
+    return Request({"type": "http", "headers": headers, "client": (peer, 1234)})
+
+
+def test_client_ip_from_trusted_proxies(monkeypatch):
+    assert client_ip(connection("198.51.100.1")) == "203.0.113.9"
+
+    monkeypatch.setattr(settings, "rate_limit_trust_forwarded", True)
+    ## the client sent the first entry itself, the proxy appended the real one
+    assert client_ip(connection("1.2.3.4, 198.51.100.1")) == "198.51.100.1"
+    monkeypatch.setattr(settings, "rate_limit_forwarded_hops", 2)
+    assert client_ip(connection("1.2.3.4, 198.51.100.1, 10.0.0.2")) == "198.51.100.1"
+    ## fewer entries than proxies: the header didn't come through them
+    assert client_ip(connection("10.0.0.2")) == "203.0.113.9"
+    assert client_ip(connection()) == "203.0.113.9"
+
+
+def test_too_many_requests(client, make_user, monkeypatch):
+    monkeypatch.setattr(rate_limiter, "backend", MemoryRateLimitBackend())
+    monkeypatch.setattr(rate_limiter, "route_limits", {"GET /projects/": Limit(rate=0.01, burst=2)})
+    _, user = make_user()
+
+    assert user.get("/projects/").status_code == 200
+    assert user.get("/projects/").status_code == 200
+    response = user.get("/projects/")
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert response.json()["error"]["type"] == "rate_limit_error"
+    ## other routes keep working
+    assert user.get("/me/").status_code == 200
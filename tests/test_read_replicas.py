@@ -0,0 +1,49 @@
+from sqlalchemy import create_engine
+from starlette.requests import Request
+
+import database
+import shared
+from cache import TTLCache
+from logs import RequestContext, request_context
+from routers.auth import create_access_token
+from shared import SQLiteSharedState
+
+
+def read_bind(user_id: int):
+    """Engine get_read_db picks for a request of the user"""
+    token = create_access_token({"sub": str(user_id)})
+    request = Request({"type": "http", "headers": [(b"cookie", f"access_token={token}".encode())]})
+    sessions = database.get_read_db(request)
+    db = next(sessions)
+    try:
+        return db.info["read_bind"]
+    finally:
+        sessions.close()
+
+
+def test_read_your_writes_across_workers(tmp_path, monkeypatch):
+    state = SQLiteSharedState(str(tmp_path / "shared.db"))
+    replica = create_engine(f"sqlite:///{tmp_path}/replica.db")
+    monkeypatch.setattr(shared, "shared_state", state)
+    monkeypatch.setattr(database, "read_engines", [replica])
+    monkeypatch.setattr(database, "recent_writes", TTLCache(maxsize=10, ttl=60))
+
+    ## a commit that wrote, in a request of user 1
+    context = RequestContext("request", {}, sampled=True)
+    context.user_id = 1
+    token = request_context.set(context)
+    try:
+        with database.SessionLocal() as db:
+            db.info["wrote"] = True
+            database.remember_write(db)
+    finally:
+        request_context.reset(token)
+    assert read_bind(1) is database.engine
+    assert read_bind(2) is replica
+
+    ## another worker only knows of it through the shared state, written from a thread
+    database.recent_write_publisher.submit(lambda: None).result()
+    monkeypatch.setattr(database, "recent_writes", TTLCache(maxsize=10, ttl=60))
+    assert read_bind(1) is database.engine
+    assert read_bind(2) is replica
+    state.close()
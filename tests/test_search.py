@@ -0,0 +1,64 @@
+from tests.conftest import create_project
+
+
+def add_task(client, project_id: int, title: str, description: str = "") -> int:
+    response = client.post(f"/projects/{project_id}/tasks", json={"title": title, "description": description})
+    assert response.status_code == 200, response.text
+    return max(task["id"] for task in client.get(f"/projects/{project_id}/tasks").json())
+
+
+def search(client, q: str, **params) -> list:
+    response = client.get("/search/tasks", params={"q": q, **params})
+    assert response.status_code == 200, response.text
+    return [task["id"] for task in response.json()]
+
+
+def test_search_matches_prefixes_and_follows_edits(make_user):
+    _, user = make_user()
+    project_id = create_project(user)
+    in_description = add_task(user, project_id, "Plain task", "mentions quasarfix somewhere")
+    in_title = add_task(user, project_id, "Quasarfix the login", "")
+    add_task(user, project_id, "Unrelated", "nothing here")
+
+    ## prefix match, title matches ranked first
+    assert search(user, "quasar") == [in_title, in_description]
+    assert search(user, "quasarfix login") == [in_title]
+
+    ## the triggers keep the index in step with updates and deletes
+    assert user.put(f"/projects/{project_id}/tasks/{in_title}", json={"title": "Nebulafix the login"}).status_code == 200
+    assert search(user, "quasarfix") == [in_description]
+    assert search(user, "nebulafix") == [in_title]
+    assert user.delete(f"/projects/{project_id}/tasks/{in_description}").status_code == 200
+    assert search(user, "quasarfix") == []
+
+
+def test_search_is_scoped_to_the_users_projects(make_user):
+    _, user = make_user()
+    _, other = make_user()
+    own_project = create_project(user)
+    other_project = create_project(other)
+    own_task = add_task(user, own_project, "Pulsarword review")
+    other_task = add_task(other, other_project, "Pulsarword review")
+
+    assert search(user, "pulsarword") == [own_task]
+    assert search(other, "pulsarword") == [other_task]
+    assert search(user, "pulsarword", project_id=other_project) == []
+    assert search(user, "pulsarword", project_id=own_project) == [own_task]
+
+
+def test_search_ignores_fts_syntax(make_user):
+    _, user = make_user()
+    project_id = create_project(user)
+    task_id = add_task(user, project_id, "Cometword deploy")
+
+    for q in ['"cometword', "cometword*", "-cometword ^deploy", "(cometword)", "cometword: {deploy}"]:
+        assert search(user, q) == [task_id], q
+    ## operator words are plain words that have to match too
+    assert search(user, "cometword OR deploy") == []
+    assert search(user, "NOT cometword") == []
+    assert search(user, "NEAR(cometword deploy)") == []
+    assert search(user, "title:cometword") == []
+    ## nothing left once operators are dropped
+    for q in ['"', "*", "()", ":-^"]:
+        response = user.get("/search/tasks", params={"q": q})
+        assert response.status_code == 400, (q, response.text)
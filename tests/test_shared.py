@@ -0,0 +1,42 @@
+import time
+
+import pytest
+
+from shared import SQLiteSharedState
+
+
+@pytest.fixture
+def states(tmp_path):
+    """Two handles on one SQLite file, like two workers of a host"""
+    path = str(tmp_path / "shared.db")
+    first, second = SQLiteSharedState(path), SQLiteSharedState(path)
+    yield first, second
+    first.close()
+    second.close()
+
+
+def test_update_many_is_one_transaction(states):
+    first, second = states
+    assert first.update_many(["a", "b"], lambda values: [(value or 0) + 1 for value in values], [None, 60]) == [1, 1]
+    assert second.update_many(["a", "b"], lambda values: [value + 1 for value in values], [None, 60]) == [2, 2]
+
+    def fail(values):
+        second.set("a", 100)  ## not committed either
+        raise RuntimeError
+
+    with pytest.raises(RuntimeError):
+        second.update_many(["a", "b"], fail, [None, None])
+    assert [first.get("a"), first.get("b")] == [2, 2]
+    assert first.update("a", lambda value: value * 10) == 20
+
+
+def test_messages_reach_other_processes(states):
+    first, second = states
+    received = []
+    second.subscribe("principals", received.append)
+    first.publish("principals", "user:1")
+    first.publish("principals", "user:2")
+    deadline = time.monotonic() + 5
+    while len(received) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert received == ["user:1", "user:2"]
@@ -0,0 +1,26 @@
+import os
+import subprocess
+import sys
+
+## modules a plain `import main` must not load, they come with the first request that needs them
+DEFERRED_MODULES = ["jose", "pyargon2", "aiosqlite", "asyncpg", "routers.async_auth", "routers.async_projects"]
+
+CHECK = """
+import sys, threading
+import main
+print(",".join(name for name in {modules!r} if name in sys.modules))
+print(",".join(thread.name for thread in threading.enumerate() if thread is not threading.main_thread()))
+"""
+
+
+def test_import_defers_heavy_modules(tmp_path):
+    env = {**os.environ, "ASYNC_ROUTERS": "false", "DATABASE_URL": f"sqlite:///{tmp_path}/startup.db"}
+    result = subprocess.run(
+        [sys.executable, "-c", CHECK.format(modules=DEFERRED_MODULES)],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env=env, capture_output=True, text=True, check=True,
+    )
+    loaded, threads = result.stdout.splitlines()
+    assert loaded == ""
+    ## no log listener or pool thread either
+    assert threads == ""
@@ -0,0 +1,56 @@
+from tests.conftest import create_project
+
+
+def test_full_then_incremental_sync(make_user):
+    user_id, client = make_user()
+    project_id = create_project(client, tasks=2)
+
+    full = client.get("/sync/").json()
+    assert full["reset"] is True
+    assert [project["id"] for project in full["projects"]] == [project_id]
+    assert len(full["tasks"]) == 2
+    cursor = full["cursor"]
+
+    ## nothing changed
+    empty = client.get("/sync/", params={"since": cursor}).json()
+    assert empty["reset"] is False
+    assert empty["cursor"] == cursor
+    assert empty["tasks"] == [] and empty["deleted_tasks"] == []
+
+    kept, deleted = sorted(task["id"] for task in full["tasks"])
+    assert client.put(f"/projects/{project_id}/tasks/{kept}", json={"title": "renamed"}).status_code == 200
+    assert client.delete(f"/projects/{project_id}/tasks/{deleted}").status_code == 200
+
+    delta = client.get("/sync/", params={"since": cursor}).json()
+    assert delta["reset"] is False
+    assert delta["cursor"] > cursor
+    assert [(task["id"], task["title"]) for task in delta["tasks"]] == [(kept, "renamed")]
+    assert delta["deleted_tasks"] == [deleted]
+
+
+def test_sync_of_joined_and_lost_projects(make_user):
+    owner_id, owner = make_user()
+    user_id, client = make_user()
+    project_id = create_project(owner, tasks=1)
+    cursor = client.get("/sync/").json()["cursor"]
+
+    assert owner.post(f"/projects/{project_id}/users/bulk", json={"user_ids": [user_id]}).status_code == 200
+    joined = client.get("/sync/", params={"since": cursor}).json()
+    assert [project["id"] for project in joined["projects"]] == [project_id]
+    assert len(joined["tasks"]) == 1
+    assert {member["user"]["id"] for member in joined["members"]} == {owner_id, user_id}
+    cursor = joined["cursor"]
+
+    assert owner.delete(f"/projects/{project_id}/users/{user_id}").status_code == 200
+    lost = client.get("/sync/", params={"since": cursor}).json()
+    assert lost["deleted_projects"] == [project_id]
+    assert lost["tasks"] == []
+
+
+def test_unknown_cursor_resets(make_user):
+    _, client = make_user()
+    create_project(client)
+    cursor = client.get("/sync/").json()["cursor"]
+    response = client.get("/sync/", params={"since": cursor + 1000}).json()
+    assert response["reset"] is True
+    assert response["cursor"] == cursor
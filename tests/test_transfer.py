@@ -0,0 +1,58 @@
+import json
+
+from config import settings
+from tests.conftest import create_project
+
+NDJSON = {"Content-Type": "application/x-ndjson"}
+
+
+def project_ids(client) -> set:
+    return {project["id"] for project in client.get("/projects/?compact=true").json()}
+
+
+def test_export_import_round_trip(make_user):
+    _, client = make_user()
+    project_id = create_project(client, "exported", tasks=3)
+    export = client.get(f"/projects/{project_id}/export")
+    assert export.status_code == 200
+
+    response = client.post("/projects/import", content=export.content, headers=NDJSON)
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert (result["members"], result["tasks"], result["unknown_members"]) == (1, 3, 0)
+    titles = lambda pid: [task["title"] for task in client.get(f"/projects/{pid}/tasks").json()]
+    assert titles(result["project_id"]) == titles(project_id)
+
+
+def test_import_in_small_chunks(make_user):
+    _, client = make_user()
+    lines = [{"type": "project", "name": "chunked"}] + [{"type": "task", "title": f"task {i}"} for i in range(50)]
+    body = "".join(json.dumps(line) + "\n" for line in lines).encode()
+    ## a body split mid-line, without a final newline
+    chunks = (body[i:i + 7] for i in range(0, len(body) - 1, 7))
+    response = client.post("/projects/import", content=chunks, headers=NDJSON)
+    assert response.status_code == 200, response.text
+    assert response.json()["tasks"] == 50
+
+
+def test_invalid_import_writes_nothing(make_user):
+    _, client = make_user()
+    before = project_ids(client)
+    body = b'{"type": "project", "name": "p"}\n{"type": "task", "title": "ok"}\n{"type": "task"}\n'
+    response = client.post("/projects/import", content=body, headers=NDJSON)
+    assert response.status_code == 400
+    assert response.json()["error"]["message"].startswith("Line 3:")
+    assert client.post("/projects/import", content=b'{"type": "task", "title": "t"}\n', headers=NDJSON).status_code == 400
+    assert client.post("/projects/import", content=b"\n\n", headers=NDJSON).status_code == 400
+    assert project_ids(client) == before
+
+
+def test_import_rejects_long_lines(make_user, monkeypatch):
+    monkeypatch.setattr(settings, "transfer_max_line_bytes", 100)
+    _, client = make_user()
+    before = project_ids(client)
+    body = b'{"type": "project", "name": "p"}\n{"type": "task", "title": "' + b"x" * 200 + b'"}\n'
+    assert client.post("/projects/import", content=body, headers=NDJSON).status_code == 413
+    ## without any newline at all
+    assert client.post("/projects/import", content=b"x" * 300, headers=NDJSON).status_code == 413
+    assert project_ids(client) == before
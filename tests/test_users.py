@@ -0,0 +1,35 @@
+from sqlalchemy import delete, func, select
+
+from database import SessionLocal
+from models import Project, Task, project_user
+from routers.projects import purge_orphaned_projects
+from tests.conftest import create_project
+
+
+def test_delete_user_requires_being_that_user(client, make_user):
+    user_id, user = make_user()
+    _, other = make_user()
+
+    assert client.delete(f"/users/{user_id}").status_code == 401
+    assert other.delete(f"/users/{user_id}").status_code == 403
+    assert user.get(f"/users/{user_id}").status_code == 200
+
+    assert user.delete(f"/users/{user_id}").status_code == 200
+    assert other.get(f"/users/{user_id}").status_code == 404
+
+
+def test_startup_purges_projects_left_without_members(make_user):
+    _, user = make_user()
+    kept = create_project(user, tasks=1)
+    orphaned = create_project(user, tasks=2)
+    ## what a large project's deletion leaves behind when the process exits before its purge job runs
+    with SessionLocal() as db:
+        db.execute(delete(project_user).where(project_user.c.project_id == orphaned))
+        db.commit()
+
+    assert orphaned in purge_orphaned_projects()
+    with SessionLocal() as db:
+        assert db.get(Project, orphaned) is None
+        assert db.scalar(select(func.count()).select_from(Task).where(Task.project_id == orphaned)) == 0
+        assert db.get(Project, kept) is not None
+    assert user.get(f"/projects/{kept}/tasks").status_code == 200
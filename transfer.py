@@ -0,0 +1,217 @@
+import asyncio
+import json
+import tempfile
+from typing import IO, AsyncIterator, Iterator, List
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from changelog import MEMBER, PROJECT, changes_statement
+from config import settings
+from database import SessionLocal
+from models import Project, Task, User, project_user
+from ranking import ColumnEnds
+from serialization import get_adapter
+
+from schemas.transfer import ExportedMember, ExportedProject, ExportedTask, ExportLine, ProjectImportResult
+
+## Project export and import as NDJSON. Neither side holds more than
+## settings.transfer_chunk_size rows in memory, whatever the size of the project.
+## An import is validated into a spool file while it uploads, and only then written
+## to the database, so a slow client doesn't keep the write transaction open.
+
+class InvalidExport(ValueError):
+    """An import stream that isn't a project export"""
+
+class ExportLineTooLong(InvalidExport):
+    """An import line longer than settings.transfer_max_line_bytes"""
+
+def ndjson_line(record: dict) -> bytes:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode() + b"\n"
+
+def export_project_lines(project_id: int) -> Iterator[bytes]:
+    """
+    The project, its members and its tasks, one JSON object per line. Rows are
+    fetched in chunks (server-side cursors where the driver has them), each
+    chunk becoming one piece of the response body.
+    """
+    with SessionLocal() as db:
+        project = db.execute(select(Project.name, Project.description).where(Project.id == project_id)).one_or_none()
+        if project is None:
+            return
+        yield ndjson_line({"type": "project", "name": project.name, "description": project.description})
+
+        members = (
+            select(User.email, User.name)
+            .join(project_user, project_user.c.user_id == User.id)
+            .where(project_user.c.project_id == project_id)
+            .order_by(User.id)
+        )
+        tasks = (
+            select(Task.title, Task.description, Task.status, Task.rank)
+            .where(Task.project_id == project_id)
+            .order_by(Task.id)
+        )
+        for statement, line_type in ((members, "member"), (tasks, "task")):
+            result = db.execute(statement.execution_options(yield_per=settings.transfer_chunk_size))
+            for rows in result.partitions():
+                yield b"".join(ndjson_line({"type": line_type, **row._asdict()}) for row in rows)
+
+async def ndjson_lines(chunks: AsyncIterator[bytes], max_line_bytes: int) -> AsyncIterator[bytes]:
+    """Non-blank lines of a byte stream, each byte is scanned once"""
+    pending: List[bytes] = []  ## pieces of a line spread over several chunks
+    pending_size = 0
+    async for chunk in chunks:
+        start = 0
+        while (end := chunk.find(b"\n", start)) != -1:
+            if pending_size + end - start > max_line_bytes:
+                raise ExportLineTooLong(f"Lines can't be longer than {max_line_bytes} bytes")
+            line = b"".join(pending) + chunk[start:end] if pending else chunk[start:end]
+            pending, pending_size = [], 0
+            if line.strip():
+                yield line
+            start = end + 1
+        if start < len(chunk):
+            pending_size += len(chunk) - start
+            if pending_size > max_line_bytes:
+                raise ExportLineTooLong(f"Lines can't be longer than {max_line_bytes} bytes")
+            pending.append(chunk[start:])
+    line = b"".join(pending)
+    if line.strip():
+        yield line
+
+def parse_line(adapter, line_number: int, line: bytes):
+    try:
+        return adapter.validate_json(line)
+    except ValidationError as exc:
+        error = exc.errors(include_url=False)[0]
+        location = ".".join(str(part) for part in error["loc"])
+        raise InvalidExport(f"Line {line_number}: {error['msg']}" + (f" ({location})" if location else "")) from exc
+
+async def spool_export(chunks: AsyncIterator[bytes]) -> IO[bytes]:
+    """
+    Validate an export stream into a temporary file (in memory while small) and return it
+    rewound. Nothing touches the database, a bad line is reported before anything is written.
+    """
+    adapter = get_adapter(ExportLine)
+    spool = tempfile.SpooledTemporaryFile(max_size=settings.transfer_spool_memory_bytes)
+    line_number = 0
+    try:
+        async for line in ndjson_lines(chunks, settings.transfer_max_line_bytes):
+            line_number += 1
+            is_project = isinstance(parse_line(adapter, line_number, line), ExportedProject)
+            if line_number == 1 and not is_project:
+                raise InvalidExport(f"Line {line_number}: an export starts with its project")
+            if line_number > 1 and is_project:
+                raise InvalidExport(f"Line {line_number}: an export holds a single project")
+            spool.write(line + b"\n")
+        if line_number == 0:
+            raise InvalidExport("The export is empty")
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+async def spooled_lines(spool: IO[bytes]) -> AsyncIterator[bytes]:
+    """Lines of a spool file, read off the event loop about a chunk at a time"""
+    while lines := await asyncio.to_thread(spool.readlines, settings.transfer_max_line_bytes):
+        for line in lines:
+            yield line
+
+class ProjectImport:
+    """Creates a project from export lines, inserting members and tasks in chunks on the caller's transaction"""
+
+    def __init__(self, db: AsyncSession, user_id: int):
+        self.db = db
+        self.user_id = user_id
+        self.project_id = None
+        self.member_ids = {user_id}
+        self.member_emails: List[str] = []
+        self.tasks: List[dict] = []
+        self.task_count = 0
+        self.unknown_members = 0
+        ## tasks exported without a rank go after the ranked ones of their column
+        self.column_ends = ColumnEnds({})
+
+    async def add(self, line_number: int, record) -> None:
+        if isinstance(record, ExportedProject):
+            if self.project_id is not None:
+                raise InvalidExport(f"Line {line_number}: an export holds a single project")
+            await self.create_project(record)
+            return
+        if self.project_id is None:
+            raise InvalidExport(f"Line {line_number}: an export starts with its project")
+
+        if isinstance(record, ExportedMember):
+            self.member_emails.append(record.email)
+            if len(self.member_emails) >= settings.transfer_chunk_size:
+                await self.flush_members()
+        elif isinstance(record, ExportedTask):
+            status = record.status.value
+            if record.rank is None:
+                rank = self.column_ends.next_rank(status)
+            else:
+                rank = record.rank
+                self.column_ends.note_rank(status, rank)
+            self.tasks.append({
+                "title": record.title,
+                "description": record.description,
+                "status": status,
+                "rank": rank,
+                "project_id": self.project_id,
+            })
+            if len(self.tasks) >= settings.transfer_chunk_size:
+                await self.flush_tasks()
+
+    async def create_project(self, record: ExportedProject) -> None:
+        db_project = Project(name=record.name, description=record.description)
+        self.db.add(db_project)
+        await self.db.flush()
+        self.project_id = db_project.id
+        ## the importing user becomes a member first
+        await self.db.execute(insert(project_user).values(project_id=self.project_id, user_id=self.user_id))
+        await self.db.execute(changes_statement(self.project_id, PROJECT, [self.project_id]))
+        await self.db.execute(changes_statement(self.project_id, MEMBER, [self.user_id]))
+
+    async def flush_members(self) -> None:
+        emails, self.member_emails = self.member_emails, []
+        if not emails:
+            return
+        found = dict((await self.db.execute(select(User.email, User.id).where(User.email.in_(emails)))).all())
+        self.unknown_members += sum(1 for email in emails if email not in found)
+        new_ids = [user_id for user_id in dict.fromkeys(found.values()) if user_id not in self.member_ids]
+        if not new_ids:
+            return
+        self.member_ids.update(new_ids)
+        await self.db.execute(insert(project_user), [{"project_id": self.project_id, "user_id": user_id} for user_id in new_ids])
+        await self.db.execute(changes_statement(self.project_id, MEMBER, new_ids))
+
+    async def flush_tasks(self) -> None:
+        rows, self.tasks = self.tasks, []
+        if rows:
+            await self.db.execute(insert(Task), rows)
+            self.task_count += len(rows)
+
+    async def finish(self) -> ProjectImportResult:
+        if self.project_id is None:
+            raise InvalidExport("The export is empty")
+        await self.flush_members()
+        await self.flush_tasks()
+        return ProjectImportResult(
+            project_id=self.project_id,
+            members=len(self.member_ids),
+            tasks=self.task_count,
+            unknown_members=self.unknown_members,
+        )
+
+async def import_project(db: AsyncSession, user_id: int, spool: IO[bytes]) -> ProjectImportResult:
+    """Create a project from an export validated by spool_export, nothing is committed"""
+    adapter = get_adapter(ExportLine)
+    project_import = ProjectImport(db, user_id)
+    line_number = 0
+    async for line in spooled_lines(spool):
+        line_number += 1
+        await project_import.add(line_number, parse_line(adapter, line_number, line))
+    return await project_import.finish()